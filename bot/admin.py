@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, AvitoAccount, UserAvitoAccount, AvitoAccountDailyStats
+from .models import User, AvitoAccount, UserAvitoAccount, AvitoAccountDailyStats, AvitoAccountWeeklyStats, AvitoAccountMonthlyStats, AvitoBalanceSnapshot
 
 class UserAdmin(admin.ModelAdmin):
     list_display = ('user_name',)  # Удалены недопустимые поля
@@ -17,6 +17,8 @@ class AvitoAccountAdmin(admin.ModelAdmin):
     list_display = ('name', 'client_id', 'last_balance', 'daily_expense', 'weekly_expense')
     search_fields = ('name',)
     list_filter = ('name',)
+    exclude = ('access_token',)
+    readonly_fields = ('access_token_expires_at',)
 
 class UserAvitoAccountAdmin(admin.ModelAdmin):
     list_display = ('user', 'avito_account')
@@ -30,7 +32,23 @@ class AvitoAccountDailyStatsAdmin(admin.ModelAdmin):
     date_hierarchy = 'date'
     ordering = ('-date',)
 
+class AvitoAccountStatsRollupAdmin(admin.ModelAdmin):
+    list_display = ('avito_account', 'period_start', 'days_count', 'total_calls', 'total_chats', 'views', 'contacts', 'daily_expense')
+    list_filter = ('avito_account',)
+    search_fields = ('avito_account__name',)
+    ordering = ('-period_start',)
+
+class AvitoBalanceSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('avito_account', 'ts', 'real', 'bonus', 'advance', 'resolution')
+    list_filter = ('avito_account', 'resolution')
+    search_fields = ('avito_account__name',)
+    date_hierarchy = 'ts'
+    ordering = ('-ts',)
+
 admin.site.register(User, UserAdmin)
 admin.site.register(AvitoAccount, AvitoAccountAdmin)
 admin.site.register(UserAvitoAccount, UserAvitoAccountAdmin)
 admin.site.register(AvitoAccountDailyStats, AvitoAccountDailyStatsAdmin)
+admin.site.register(AvitoAccountWeeklyStats, AvitoAccountStatsRollupAdmin)
+admin.site.register(AvitoAccountMonthlyStats, AvitoAccountStatsRollupAdmin)
+admin.site.register(AvitoBalanceSnapshot, AvitoBalanceSnapshotAdmin)
@@ -0,0 +1,582 @@
+"""
+Асинхронные версии запросов к API Авито.
+
+Запросы строятся и ответы разбираются теми же функциями, что и в
+bot.services, отличается только транспорт: вместо пула потоков и
+requests используются asyncio и httpx. Кэши отчетов и счетчик ошибок
+429 общие с синхронными функциями.
+
+Этим движком собираются отчеты по кнопкам в боте (get_daily_report,
+get_weekly_report - в общем цикле отчетов) и предварительный сбор
+дневной статистики в cron.
+"""
+import asyncio
+import collections
+import contextvars
+import datetime
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from bot.avito_client import get_async_avito_client, close_async_avito_client, report_budget, async_walk_pages
+from bot import services
+from bot.calls_store import CallsPages, calls_summary
+from bot.chat_index import ChatsPages, count_chats
+from bot.collectors import CollectorContext, CollectorFailed, async_run_plan, async_synced_count, failed_result
+from bot.operations_ledger import OperationsPages, expense_breakdown
+from bot.reviews_store import ReviewsPages, count_reviews, total_reviews
+from bot.single_flight import statistics_flight
+from bot.services import (
+    read_json, default_period, day_start,
+    balance_request, advance_request, parse_balance_info,
+    phones_request,
+    items_request, parse_item_ids, add_counts, item_info_request, has_xl_promotion, promotion_summary,
+    ITEMS_STATS_BATCH,
+    cached_xl_promotions, store_xl_promotions,
+    items_statistics_request, sum_items_statistics,
+    rating_request,
+    profile_period, offers_request, read_offers_sum, profile_stats_request, read_profile_statistics,
+    get_cached_profile_statistics, daily_stats_cache, weekly_stats_cache, period_stats_cache,
+    daily_period, weekly_period, range_period,
+    get_cached_statistics, store_cached_statistics, statistics_cache_key, report_statistics,
+    STATISTICS_COLLECTORS, REPORT_KINDS, report_header, assemble_statistics, empty_statistics,
+    collection_plan, window_context, merge_completions,
+    skip_unavailable, note_unavailable, note_failed, fresh_collected, store_collected,
+    DAILY_METRICS, WEEKLY_METRICS, PROFILE_METRICS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def async_get_calls_summary(access_token, user_id, date_from=None, date_to=None):
+    """Количество звонков за период: всего, отвеченных и пропущенных"""
+    if date_from is None or date_to is None:
+        date_from, date_to = default_period()
+
+    return await async_synced_count(
+        lambda: statistics_flight.do_async(
+            ("calls", user_id, date_from, date_to),
+            lambda: async_walk_pages(CallsPages(access_token, user_id, date_from, date_to))
+        ),
+        lambda: sync_to_async(calls_summary)(user_id, date_from, date_to),
+        f"звонков пользователя {user_id}",
+    )
+
+
+async def async_calls_count(summary_key, access_token, user_id, date_from, date_to):
+    try:
+        return (await async_get_calls_summary(access_token, user_id, date_from, date_to))[summary_key]
+    except CollectorFailed as e:
+        raise CollectorFailed(str(e), fallback=e.fallback[summary_key]) from e
+
+
+async def async_get_total_calls(access_token, user_id, date_from=None, date_to=None):
+    """Подсчет общего количества звонков за период"""
+    return await async_calls_count("total_calls", access_token, user_id, date_from, date_to)
+
+
+async def async_get_missed_calls(access_token, user_id, date_from=None, date_to=None):
+    """Подсчет пропущенных звонков за период"""
+    return await async_calls_count("missed_calls", access_token, user_id, date_from, date_to)
+
+
+async def async_get_user_balance_info(access_token, user_id):
+    """Реальный баланс, бонусы и авансы пользователя; при ошибке запроса выбрасывает исключение"""
+    client = get_async_avito_client()
+    # Баланс кошелька и авансы запрашиваем одновременно
+    balance_response, advance_response = await asyncio.gather(
+        client.request(**balance_request(access_token, user_id)),
+        client.request(**advance_request(access_token)),
+    )
+    balance_response.raise_for_status()
+    advance_response.raise_for_status()
+    return parse_balance_info(balance_response.json(), advance_response.json())
+
+
+async def async_get_user_chats(access_token, user_id, date_from=None, date_to=None):
+    """Количество чатов пользователя с последним сообщением за период (по локальному индексу чатов)"""
+    return await async_synced_count(
+        lambda: statistics_flight.do_async(("chats", user_id), lambda: async_walk_pages(ChatsPages(access_token, user_id))),
+        lambda: sync_to_async(count_chats)(user_id, date_from, date_to),
+        f"чатов пользователя {user_id}",
+    )
+
+
+async def async_get_chats_by_time(access_token, user_id, date_from=None):
+    """Получение новых чатов после указанной даты"""
+    return await async_get_user_chats(
+        access_token=access_token,
+        user_id=user_id,
+        date_from=day_start(date_from)
+    )
+
+
+async def async_get_all_numbers(access_token, date_from=None, date_to=None):
+    """Получение статистики показов телефона за указанный период; при ошибке запроса выбрасывает исключение"""
+    date_from, date_to = default_period(date_from, date_to)
+
+    logger.info(f"Запрос статистики показов телефона с {date_from} по {date_to}")
+
+    phones_response = await get_async_avito_client().request(**phones_request(access_token, date_from, date_to))
+    phones_result = read_json(phones_response, {}, "показов телефона")
+    return phones_result.get('total', 0)
+
+
+async def async_fetch_items_page(access_token, status, per_page, page):
+    response = await get_async_avito_client().request(**items_request(access_token, status, per_page, page))
+    return parse_item_ids(read_json(response, {}, "объявлений"))
+
+
+async def async_iter_user_items(access_token, user_id, status="active", per_page=None, page=1, prefetch=None):
+    """Асинхронная версия services.iter_user_items: следующие страницы запрашиваются заранее задачами"""
+    per_page = per_page or settings.AVITO_ITEMS_PAGE_SIZE
+    prefetch = settings.AVITO_ITEMS_PREFETCH_PAGES if prefetch is None else prefetch
+    pending = collections.deque()
+    next_page = page
+    total = 0
+
+    def request_next_page():
+        nonlocal next_page
+        task = asyncio.ensure_future(async_fetch_items_page(access_token, status, per_page, next_page))
+        pending.append((next_page, task))
+        next_page += 1
+
+    try:
+        request_next_page()
+        while pending:
+            page_number, task = pending.popleft()
+            try:
+                item_ids = await task
+            except Exception as e:
+                logger.error(f"Ошибка при получении страницы {page_number} объявлений: {e}")
+                raise
+
+            has_more = len(item_ids) >= per_page
+            while has_more and len(pending) < prefetch:
+                request_next_page()
+
+            total += len(item_ids)
+            for item_id in item_ids:
+                yield item_id
+
+            if has_more and not pending:
+                request_next_page()
+    finally:
+        for _, task in pending:
+            task.cancel()
+        logger.info(f"Получено {total} идентификаторов объявлений")
+
+
+async def async_iter_chunks(aiterable, size):
+    """Разбивает асинхронный итератор на списки не длиннее size"""
+    chunk = []
+    async for value in aiterable:
+        chunk.append(value)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def _async_has_xl_promotion(access_token, user_id, item_id, semaphore):
+    try:
+        async with semaphore:
+            item_response = await get_async_avito_client().request(**item_info_request(access_token, user_id, item_id))
+        return has_xl_promotion(read_json(item_response, {}, "объявления"))
+    except Exception as e:
+        logger.error(f"Ошибка при получении информации о продвижении объявления {item_id}: {e}")
+        return None
+
+
+async def async_get_item_promotion_info(access_token, user_id, item_ids):
+    """Получает информацию о продвижении всех объявлений, проверяя их одновременно (кэш общий с services)"""
+    if not item_ids:
+        logger.info("Нет объявлений для анализа продвижения")
+        return {"total_items": 0, "xl_promotion_count": 0}
+
+    checks = await sync_to_async(cached_xl_promotions)(user_id, item_ids)
+    missing_ids = [item_id for item_id, has_xl in checks.items() if has_xl is None]
+
+    semaphore = asyncio.Semaphore(settings.AVITO_PROMOTION_WORKERS)
+    results = await asyncio.gather(*(
+        _async_has_xl_promotion(access_token, user_id, item_id, semaphore) for item_id in missing_ids
+    ))
+    fetched = dict(zip(missing_ids, results))
+    checks.update(fetched)
+    await sync_to_async(store_xl_promotions)(user_id, fetched)
+
+    failed = sum(1 for has_xl in checks.values() if has_xl is None)
+    xl_promotion_count = sum(1 for has_xl in checks.values() if has_xl)
+    return promotion_summary(item_ids, xl_promotion_count, len(item_ids) - len(missing_ids), failed)
+
+
+async def async_get_items_statistics(access_token, user_id, item_ids, date_from=None, date_to=None, period_grouping="day"):
+    """Получает статистику по объявлениям: просмотры, контакты, избранное; при ошибке запроса выбрасывает исключение"""
+    empty_stats = {
+        "total_views": 0,
+        "total_contacts": 0,
+        "total_favorites": 0
+    }
+    if not item_ids:
+        logger.info("Нет объявлений для получения статистики")
+        return empty_stats
+
+    date_from, date_to = default_period(date_from, date_to)
+    request_ids = item_ids[:ITEMS_STATS_BATCH]  # API ограничение
+
+    stats_response = await get_async_avito_client().request(
+        **items_statistics_request(access_token, user_id, request_ids, date_from, date_to, period_grouping)
+    )
+    stats_result = read_json(stats_response, None, "статистики объявлений")
+    if stats_result is None:
+        return empty_stats
+
+    return sum_items_statistics(stats_result, request_ids, item_ids)
+
+
+async def async_get_items_info(access_token, user_id, date_from, date_to):
+    """
+    Получает статистику и информацию о продвижении объявлений за период
+
+    Returns:
+        tuple: (статистика объявлений, информация о продвижении)
+    """
+    items_stats = {"total_views": 0, "total_contacts": 0, "total_favorites": 0}
+    promotion_info = {"total_items": 0, "xl_promotion_count": 0}
+
+    async for item_ids in async_iter_chunks(async_iter_user_items(access_token, user_id), ITEMS_STATS_BATCH):
+        chunk_stats, chunk_promotion = await asyncio.gather(
+            async_get_items_statistics(access_token, user_id, item_ids, date_from=date_from, date_to=date_to),
+            async_get_item_promotion_info(access_token, user_id, item_ids),
+        )
+        add_counts(items_stats, chunk_stats)
+        add_counts(promotion_info, chunk_promotion)
+
+    return items_stats, promotion_info
+
+
+async def async_get_user_rating_info(access_token):
+    """Получение рейтинга пользователя; при ошибке запроса выбрасывает исключение"""
+    response = await get_async_avito_client().request(**rating_request(access_token))
+    result = read_json(response, {}, "рейтинга")
+    return result.get('rating', {}).get('score', 0)
+
+
+async def async_get_user_reviews(access_token, user_id, date_from=None, date_to=None):
+    """Общее число отзывов и число отзывов за период (по локальной таблице отзывов)"""
+    try:
+        total = await statistics_flight.do_async(
+            ("reviews", user_id), lambda: async_walk_pages(ReviewsPages(access_token, user_id))
+        )
+    except Exception as e:
+        raise CollectorFailed(
+            f"Ошибка при загрузке отзывов пользователя {user_id}: {e}",
+            fallback={
+                "total_reviews": await sync_to_async(total_reviews)(user_id),
+                "period_reviews": await sync_to_async(count_reviews)(user_id, date_from, date_to),
+            },
+        ) from e
+
+    return {
+        "total_reviews": total,
+        "period_reviews": await sync_to_async(count_reviews)(user_id, date_from, date_to)
+    }
+
+
+async def async_get_operations_history(access_token, user_id, date_from, date_to):
+    """Получает историю операций за период и возвращает детализацию расходов по журналу операций"""
+    logger.info(f"Запрос истории операций с {date_from} по {date_to}")
+
+    return await async_synced_count(
+        lambda: statistics_flight.do_async(
+            ("operations", user_id, date_from, date_to),
+            lambda: async_walk_pages(OperationsPages(access_token, user_id, date_from, date_to))
+        ),
+        lambda: sync_to_async(expense_breakdown)(user_id, date_from, date_to),
+        f"операций пользователя {user_id}",
+    )
+
+
+async def async_get_profile_statistics(access_token, user_id, date_from=None, date_to=None, grouping="totals"):
+    """Асинхронная версия services.get_profile_statistics с общим кэшем"""
+    return await statistics_flight.do_async(
+        ("profile", user_id, date_from, date_to, grouping, tuple(PROFILE_METRICS)),
+        lambda: _async_fetch_profile_statistics(access_token, user_id, date_from, date_to, grouping)
+    )
+
+
+async def _async_fetch_profile_statistics(access_token, user_id, date_from=None, date_to=None, grouping="totals"):
+    """Асинхронная версия services._fetch_profile_statistics"""
+    cache_key = (user_id, date_from, date_to, grouping)
+    cached = await sync_to_async(get_cached_profile_statistics)(cache_key)
+    if cached is not None:
+        return cached
+
+    date_from, date_to = profile_period(date_from, date_to, grouping)
+
+    logger.info(f"Запрос расширенной статистики профиля за период {date_from} - {date_to}, группировка: {grouping}")
+
+    client = get_async_avito_client()
+    # Расходы на продажи нужны только для общих значений
+    offers_sum = 0
+    if grouping == "totals":
+        offers_response, response = await asyncio.gather(
+            client.request(**offers_request(access_token, date_from, date_to)),
+            client.request(**profile_stats_request(access_token, user_id, date_from, date_to, grouping)),
+        )
+        offers_sum = read_offers_sum(offers_response)
+        if offers_sum is None:
+            raise CollectorFailed("Превышен лимит запросов к API спецпредложений")
+    else:
+        response = await client.request(**profile_stats_request(access_token, user_id, date_from, date_to, grouping))
+
+    return await sync_to_async(read_profile_statistics)(response, grouping, offers_sum, cache_key)
+
+
+async def _async_run_collector(name, collector, timeout, failed=None):
+    default = collector[1]
+    collector_timeout = collector[2] if len(collector) > 2 else timeout
+    try:
+        return await asyncio.wait_for(collector[0](), collector_timeout)
+    except asyncio.TimeoutError:
+        logger.error(f"Сборщик {name} не уложился в {collector_timeout} с, используется значение по умолчанию")
+    except Exception as e:
+        logger.error(f"Ошибка в сборщике {name}: {e}")
+        default = failed_result(e, default)
+    if failed is not None:
+        failed.append(name)
+    return default
+
+
+async def async_run_collectors(collectors, timeout=None, failed=None):
+    """
+    Одновременно выполняет независимые асинхронные сборщики данных
+
+    Args:
+        collectors: Словарь {имя: (функция, возвращающая корутину, значение по умолчанию[, таймаут])}
+        timeout: Таймаут сборщика в секундах, если он не указан для сборщика явно
+        failed: Список, в который добавляются имена сборщиков, замененных значением по умолчанию
+
+    Returns:
+        dict: {имя: результат} с теми же правилами замены, что и services.run_collectors
+    """
+    if not collectors:
+        return {}
+
+    timeout = timeout or settings.AVITO_COLLECTOR_TIMEOUT
+    started_at = time.monotonic()
+    results = await asyncio.gather(*(
+        _async_run_collector(name, collector, timeout, failed) for name, collector in collectors.items()
+    ))
+    logger.info(f"Выполнено {len(collectors)} асинхронных сборщиков за {time.monotonic() - started_at:.2f} с")
+    return dict(zip(collectors, results))
+
+
+async def async_run_available_collectors(collectors, unavailable, user_id=None, period=None):
+    """
+    Асинхронная версия services.run_available_collectors (кэш сборщиков общий)
+
+    Хранилище кэша может работать с БД или файлами, поэтому обращения к нему
+    выполняются в потоке через sync_to_async, как и запросы к БД.
+    """
+    cached = {}
+    if user_id is not None:
+        collectors, cached = await sync_to_async(fresh_collected)(collectors, user_id, period)
+    active, results = skip_unavailable(collectors, unavailable)
+    failed = []
+    collected = await async_run_collectors(active, failed=failed)
+    note_unavailable(active, unavailable)
+    note_failed(failed, unavailable)
+    if user_id is not None:
+        await sync_to_async(store_collected)(collected, unavailable, user_id, period)
+    results.update(collected)
+    results.update(cached)
+    return results
+
+
+async def _async_credentials(client_id, client_secret):
+    """Токен и ID пользователя берутся из общего хранилища в отдельном потоке, т.к. оно работает с БД"""
+    access_token = await sync_to_async(services.get_access_token)(client_id, client_secret)
+    if not access_token:
+        logger.error("Не удалось получить токен доступа")
+        raise Exception("Не удалось получить токен доступа")
+
+    user_id = await sync_to_async(services.resolve_avito_user_id)(client_id, client_secret)
+    if not user_id:
+        logger.error("Не удалось получить ID пользователя")
+        raise Exception("Не удалось получить ID пользователя")
+    return access_token, user_id
+
+
+# Сборщики отчетов за период с асинхронными функциями получения данных
+ASYNC_STATISTICS_COLLECTORS = STATISTICS_COLLECTORS.with_fetchers({
+    "missed_calls": lambda ctx: async_get_missed_calls(ctx.access_token, ctx.user_id, ctx.start, ctx.end),
+    "new_chats": lambda ctx: async_get_chats_by_time(ctx.access_token, ctx.user_id, ctx.start),
+    "total_phones": lambda ctx: async_get_all_numbers(ctx.access_token, ctx.start, ctx.end),
+    "balance_info": lambda ctx: async_get_user_balance_info(ctx.access_token, ctx.user_id),
+    "rating": lambda ctx: async_get_user_rating_info(ctx.access_token),
+    "reviews_info": lambda ctx: async_get_user_reviews(ctx.access_token, ctx.user_id, ctx.start, ctx.end),
+    "profile_stats": lambda ctx: async_get_profile_statistics(
+        ctx.access_token, ctx.user_id, date_from=ctx.period["date_from"], date_to=ctx.period["date_to"]
+    ),
+    "total_calls": lambda ctx: async_get_total_calls(ctx.access_token, ctx.user_id, ctx.start, ctx.end),
+    "total_chats": lambda ctx: async_get_user_chats(ctx.access_token, ctx.user_id, ctx.start, ctx.end),
+    "items_info": lambda ctx: async_get_items_info(ctx.access_token, ctx.user_id, ctx.start, ctx.end),
+    "expenses_info": lambda ctx: async_get_operations_history(ctx.access_token, ctx.user_id, ctx.start, ctx.end),
+})
+
+
+async def async_complete_stored(source_plan, context, unavailable):
+    """Асинхронная версия services.complete_stored"""
+    for first_day, last_day in source_plan.windows:
+        window = window_context(context, first_day, last_day)
+        results = await async_run_available_collectors(
+            {name: ASYNC_STATISTICS_COLLECTORS[name].task(window) for name in source_plan.completions},
+            unavailable, context.user_id, window.period,
+        )
+        merge_completions(source_plan.values, source_plan.completions, results)
+
+
+@report_budget
+async def async_build_period_statistics(client_id, client_secret, period, kind, metrics, cache, report_format=None):
+    """Асинхронная версия services.build_period_statistics, кэш общий"""
+    reviews_key, label = REPORT_KINDS[kind]
+    try:
+        logger.info(f"Запрос {label} статистики с {period['date_from']} по {period['date_to']}")
+
+        access_token, user_id = await _async_credentials(client_id, client_secret)
+        context = CollectorContext(access_token, user_id, period)
+
+        cache_key = statistics_cache_key(user_id, period, metrics, report_format)
+        cached = await sync_to_async(get_cached_statistics)(cache, cache_key, label)
+        if cached is not None:
+            return cached
+
+        source_plan = await sync_to_async(collection_plan)(metrics, report_format, context)
+        unavailable = []
+        await async_complete_stored(source_plan, context, unavailable)
+        collected = {**source_plan.values, **await async_run_plan(
+            ASYNC_STATISTICS_COLLECTORS.plan(source_plan.metrics), context,
+            lambda tasks, unavailable: async_run_available_collectors(tasks, unavailable, user_id, period),
+            unavailable,
+        )}
+        result = assemble_statistics(collected, unavailable, period, kind, source_plan.skipped)
+        if not unavailable:
+            await sync_to_async(store_cached_statistics)(cache, cache_key, result)
+
+        logger.info(f"Статистика ({label}) успешно получена")
+        return result
+
+    except Exception as e:
+        logger.error(f"Ошибка при получении {label} статистики: {e}")
+        return {**report_header(period, kind), **empty_statistics(reviews_key)}
+
+
+async def async_get_daily_statistics(client_id, client_secret, *, report_format=None):
+    """Асинхронная версия services.get_daily_statistics, результат совпадает по формату"""
+    period = daily_period(datetime.datetime.now())
+    return await statistics_flight.do_async(
+        ("daily", client_id, period["date_from"], DAILY_METRICS, report_format),
+        lambda: async_build_period_statistics(
+            client_id, client_secret, period, "day", DAILY_METRICS, daily_stats_cache, report_format
+        )
+    )
+
+
+async def async_get_weekly_statistics(client_id, client_secret, *, report_format=None):
+    """Асинхронная версия services.get_weekly_statistics, результат совпадает по формату"""
+    period = weekly_period(datetime.datetime.now())
+    return await statistics_flight.do_async(
+        ("weekly", client_id, period["date_from"], period["date_to"], WEEKLY_METRICS, report_format),
+        lambda: async_build_period_statistics(
+            client_id, client_secret, period, "week", WEEKLY_METRICS, weekly_stats_cache, report_format
+        )
+    )
+
+
+async def async_get_period_statistics(client_id, client_secret, first_day, last_day, kind="range", metrics=DAILY_METRICS):
+    """Асинхронная версия services.get_period_statistics"""
+    period = range_period(first_day, last_day, datetime.datetime.now())
+    metrics = tuple(sorted(metrics))
+    return await statistics_flight.do_async(
+        (kind, client_id, period["date_from"], period["date_to"], metrics),
+        lambda: async_build_period_statistics(client_id, client_secret, period, kind, metrics, period_stats_cache)
+    )
+
+
+_report_loop = None
+_report_loop_lock = threading.Lock()
+
+
+def report_loop():
+    """
+    Цикл событий для сборки отчетов из синхронного кода (обработчики бота)
+
+    Работает в фоновом потоке все время жизни процесса, поэтому соединения
+    асинхронного клиента переиспользуются между нажатиями кнопок.
+    """
+    global _report_loop
+    with _report_loop_lock:
+        if _report_loop is None:
+            _report_loop = asyncio.new_event_loop()
+            threading.Thread(target=_report_loop.run_forever, name="avito-report-loop", daemon=True).start()
+        return _report_loop
+
+
+def run_report(build):
+    """Выполняет корутину build() в цикле отчетов и ждет результат"""
+    # Пустой контекст: иначе sync_to_async внутри сборки взял бы контекстные
+    # переменные asgiref вызывающего потока и ждал бы поток, который сам ждет отчет
+    return contextvars.Context().run(asyncio.run_coroutine_threadsafe, build(), report_loop()).result()
+
+
+def get_daily_report(client_id, client_secret, *, allow_stale=False, report_format=None):
+    """
+    services.get_daily_statistics для обработчиков бота: отчет собирается в цикле отчетов
+
+    Ключ объединения запросов тот же, поэтому кнопка и cron по одному
+    аккаунту собирают отчет один раз.
+    """
+    period = daily_period(datetime.datetime.now())
+    flight_key = ("daily", client_id, period["date_from"], DAILY_METRICS, report_format)
+    build = lambda: run_report(lambda: async_build_period_statistics(
+        client_id, client_secret, period, "day", DAILY_METRICS, daily_stats_cache, report_format
+    ))
+    return report_statistics(
+        daily_stats_cache, client_id, client_secret, period, DAILY_METRICS, flight_key, build, allow_stale, report_format
+    )
+
+
+def get_weekly_report(client_id, client_secret, *, allow_stale=False, report_format=None):
+    """services.get_weekly_statistics для обработчиков бота: отчет собирается в цикле отчетов"""
+    period = weekly_period(datetime.datetime.now())
+    flight_key = ("weekly", client_id, period["date_from"], period["date_to"], WEEKLY_METRICS, report_format)
+    build = lambda: run_report(lambda: async_build_period_statistics(
+        client_id, client_secret, period, "week", WEEKLY_METRICS, weekly_stats_cache, report_format
+    ))
+    return report_statistics(
+        weekly_stats_cache, client_id, client_secret, period, WEEKLY_METRICS, flight_key, build, allow_stale, report_format
+    )
+
+
+async def async_prefetch_daily_statistics(credentials):
+    """
+    Одновременно собирает дневную статистику для нескольких аккаунтов
+
+    Args:
+        credentials: Список пар (client_id, client_secret)
+
+    Returns:
+        list: Отчеты в том же порядке. Они же попадают в кэш get_daily_statistics
+    """
+    try:
+        return await asyncio.gather(*(
+            async_get_daily_statistics(client_id, client_secret) for client_id, client_secret in credentials
+        ))
+    finally:
+        logger.info(f"Соединения с API Авито (async): {get_async_avito_client().get_connection_stats()}")
+        await close_async_avito_client()
@@ -0,0 +1,490 @@
+import abc
+import asyncio
+import contextvars
+import functools
+import inspect
+import logging
+import random
+import threading
+import time
+import weakref
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from bot.circuit_breaker import circuit_breakers
+from bot.rate_limiter import rate_limiter, parse_retry_after, endpoint_family
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionStats:
+    """Счетчики запросов и новых соединений по хостам"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._connections = {}
+
+    def record_request(self, host):
+        with self._lock:
+            self._requests[host] = self._requests.get(host, 0) + 1
+
+    def record_connection(self, host):
+        with self._lock:
+            self._connections[host] = self._connections.get(host, 0) + 1
+
+    def snapshot(self):
+        """
+        Возвращает статистику переиспользования соединений
+
+        Returns:
+            dict: {хост: {"requests": ..., "connections": ..., "reused": ..., "reuse_ratio": ...}}
+        """
+        with self._lock:
+            result = {}
+            for host in set(self._requests) | set(self._connections):
+                requests_count = self._requests.get(host, 0)
+                connections_count = self._connections.get(host, 0)
+                reused = max(requests_count - connections_count, 0)
+                result[host] = {
+                    "requests": requests_count,
+                    "connections": connections_count,
+                    "reused": reused,
+                    "reuse_ratio": round(reused / requests_count, 3) if requests_count else 0,
+                }
+            return result
+
+
+def _counting_pool_class(base, stats):
+    """Создает класс пула urllib3, который учитывает открытие новых соединений"""
+    def _new_conn(self):
+        stats.record_connection(self.host)
+        return base._new_conn(self)
+
+    return type(f"Counting{base.__name__}", (base,), {"_new_conn": _new_conn})
+
+
+class _CountingHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter, пулы которого сообщают о каждом новом TCP/TLS соединении"""
+
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _counting_pool_class(HTTPConnectionPool, self.stats),
+            "https": _counting_pool_class(HTTPSConnectionPool, self.stats),
+        }
+
+
+# Момент (time.monotonic), после которого повторы запросов текущего отчета не выполняются
+_report_deadline = contextvars.ContextVar("avito_report_deadline", default=None)
+
+
+def report_budget(func):
+    """
+    Ограничивает общее время повторов запросов внутри отчета
+
+    Работает и с обычными, и с асинхронными функциями. Бюджет берется из
+    settings.AVITO_REPORT_TIME_BUDGET; вложенный вызов не продлевает внешний.
+    """
+    def start():
+        deadline = time.monotonic() + settings.AVITO_REPORT_TIME_BUDGET
+        current = _report_deadline.get()
+        return _report_deadline.set(min(deadline, current) if current else deadline)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            token = start()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _report_deadline.reset(token)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = start()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _report_deadline.reset(token)
+    return wrapper
+
+
+class RetryPolicy:
+    """
+    Повторы запросов к API Авито с экспоненциальной задержкой и случайным разбросом.
+
+    Повторяются ответы 429 и 5xx и сетевые ошибки. Неидемпотентные запросы
+    повторяются только если соединение не было установлено, т.е. запрос
+    точно не дошел до сервера. Retry-After имеет приоритет над расчетной
+    задержкой. Повтор не выполняется, если он не укладывается в бюджет отчета.
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+    def __init__(self, attempts=None, backoff=None, max_backoff=None):
+        self.attempts = attempts or settings.AVITO_RETRY_ATTEMPTS
+        self.backoff = backoff if backoff is not None else settings.AVITO_RETRY_BACKOFF
+        self.max_backoff = max_backoff if max_backoff is not None else settings.AVITO_RETRY_MAX_BACKOFF
+
+    def is_idempotent(self, method, idempotent=None):
+        if idempotent is not None:
+            return idempotent
+        return method.upper() in self.IDEMPOTENT_METHODS
+
+    def backoff_delay(self, attempt):
+        # Полный разброс: случайная задержка от 0 до экспоненциальной границы
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+
+    def next_delay(self, attempt, retry_after=None):
+        """Задержка перед следующей попыткой или None, если повторять нельзя"""
+        if attempt >= self.attempts:
+            return None
+
+        delay = parse_retry_after(retry_after, None)
+        if delay is None:
+            delay = self.backoff_delay(attempt)
+
+        deadline = _report_deadline.get()
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            logger.warning("Повтор запроса не укладывается в бюджет времени отчета")
+            return None
+        return delay
+
+    def delay_for_response(self, response, attempt, idempotent):
+        if response.status_code not in self.RETRY_STATUSES or not idempotent:
+            return None
+        retry_after = response.headers.get("Retry-After")
+        if response.status_code == 429 and retry_after is None:
+            # rate_limiter приостановил группу методов на это же время
+            retry_after = settings.AVITO_RATE_LIMIT_PENALTY
+        return self.next_delay(attempt, retry_after)
+
+    def delay_for_error(self, error, attempt, idempotent):
+        not_sent = isinstance(error, (requests.exceptions.ConnectTimeout, httpx.ConnectError, httpx.ConnectTimeout))
+        transient = isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, httpx.TransportError))
+        if not_sent or (idempotent and transient):
+            return self.next_delay(attempt)
+        return None
+
+
+def _breaker_for(url):
+    family = endpoint_family(url)
+    return circuit_breakers.get(family) if family else None
+
+
+def _record_outcome(breaker, status_code):
+    # 5xx говорит о сбое API; 4xx, в т.ч. 429, - о том, что сервер работает
+    if breaker is None:
+        return
+    if status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+
+
+def renewed_authorization(headers):
+    """
+    Заголовки с новым токеном вместо отклоненного API (ответ 401)
+
+    Returns:
+        dict: Заголовки запроса или None, если токен обновить нельзя
+    """
+    authorization = (headers or {}).get("Authorization", "")
+    if not authorization.startswith("Bearer "):
+        return None
+    # Импорт внутри функции: token_store сам использует HTTP-клиент
+    from bot.token_store import token_store
+    token = token_store.renew_rejected(authorization[len("Bearer "):])
+    if not token:
+        return None
+    return {**headers, "Authorization": f"Bearer {token}"}
+
+
+class AvitoClient:
+    """
+    HTTP-клиент API Авито с общей сессией и пулом keep-alive соединений.
+
+    Все запросы к api.avito.ru идут через одну requests.Session, поэтому
+    TLS-рукопожатие выполняется один раз на соединение пула, а не на каждый вызов.
+    """
+
+    def __init__(self, pool_connections=None, pool_maxsize=None, connect_timeout=None, read_timeout=None):
+        self.pool_connections = pool_connections or settings.AVITO_POOL_CONNECTIONS
+        self.pool_maxsize = pool_maxsize or settings.AVITO_POOL_MAXSIZE
+        self.timeout = (
+            connect_timeout or settings.AVITO_CONNECT_TIMEOUT,
+            read_timeout or settings.AVITO_READ_TIMEOUT,
+        )
+        self.stats = ConnectionStats()
+        self.retry = RetryPolicy()
+
+        self.session = requests.Session()
+        adapter = _CountingHTTPAdapter(
+            self.stats,
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method, url, idempotent=None, **kwargs):
+        """
+        Выполняет запрос через общую сессию с таймаутом по умолчанию, с учетом
+        лимитов и с повторами временных ошибок
+
+        Ответ 401 на запрос с токеном из token_store означает, что токен
+        отозван: токен сбрасывается, и запрос один раз повторяется с новым.
+
+        Args:
+            idempotent: Можно ли повторять запрос, дошедший до сервера. По умолчанию
+                        определяется по методу; POST-запросы на чтение помечают явно
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        headers = kwargs.get("headers")
+        idempotent = self.retry.is_idempotent(method, idempotent)
+        breaker = _breaker_for(url)
+        attempt = 0
+        renewed = False
+        while True:
+            attempt += 1
+            rate_limiter.acquire(url, headers)
+            if breaker:
+                breaker.before_request()
+            self.stats.record_request(urlsplit(url).hostname)
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                if breaker:
+                    breaker.record_failure()
+                delay = self.retry.delay_for_error(e, attempt, idempotent)
+                if delay is None:
+                    raise
+                logger.warning(f"Ошибка запроса {method} {url}: {e}, повтор {attempt} через {delay:.2f} с")
+                time.sleep(delay)
+                continue
+
+            _record_outcome(breaker, response.status_code)
+            rate_limiter.record_response(url, headers, response.status_code, response.headers.get("Retry-After"))
+            if response.status_code == 401 and not renewed:
+                renewed = True
+                renewed_headers = renewed_authorization(headers)
+                if renewed_headers is not None:
+                    response.close()
+                    headers = kwargs["headers"] = renewed_headers
+                    continue
+            delay = self.retry.delay_for_response(response, attempt, idempotent)
+            if delay is None:
+                return response
+            logger.warning(f"Ответ {response.status_code} на {method} {url}, повтор {attempt} через {delay:.2f} с")
+            response.close()
+            time.sleep(delay)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def get_connection_stats(self):
+        """Статистика переиспользования соединений по хостам"""
+        return self.stats.snapshot()
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_avito_client():
+    """Возвращает общий для процесса экземпляр AvitoClient"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = AvitoClient()
+                logger.info(
+                    f"Создан HTTP-клиент API Авито: пулов {_client.pool_connections}, "
+                    f"соединений в пуле {_client.pool_maxsize}, таймауты {_client.timeout}"
+                )
+    return _client
+
+
+class AsyncAvitoClient:
+    """
+    Асинхронный HTTP-клиент API Авито на httpx.AsyncClient.
+
+    Принимает те же описания запросов (method, url, headers, json, params),
+    что и AvitoClient, поэтому синхронный и асинхронный код используют
+    общие построители запросов и разбор ответов из bot.services.
+    """
+
+    def __init__(self, pool_maxsize=None, connect_timeout=None, read_timeout=None, stats=None):
+        self.pool_maxsize = pool_maxsize or settings.AVITO_POOL_MAXSIZE
+        self.timeout = httpx.Timeout(
+            read_timeout or settings.AVITO_READ_TIMEOUT,
+            connect=connect_timeout or settings.AVITO_CONNECT_TIMEOUT,
+        )
+        self.stats = stats or ConnectionStats()
+        self.retry = RetryPolicy()
+        self.client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.pool_maxsize,
+                max_keepalive_connections=self.pool_maxsize,
+            ),
+        )
+
+    async def request(self, method, url, idempotent=None, **kwargs):
+        """Асинхронный аналог AvitoClient.request: лимиты, повторы, обновление отозванного токена и общий пул соединений цикла событий"""
+        host = urlsplit(url).hostname
+
+        async def trace(event_name, info):
+            # httpcore сообщает об открытии каждого нового TCP-соединения
+            if event_name == "connection.connect_tcp.complete":
+                self.stats.record_connection(host)
+
+        headers = kwargs.get("headers")
+        idempotent = self.retry.is_idempotent(method, idempotent)
+        extensions = kwargs.pop("extensions", None) or {}
+        extensions.setdefault("trace", trace)
+        breaker = _breaker_for(url)
+        attempt = 0
+        renewed = False
+        while True:
+            attempt += 1
+            await rate_limiter.acquire_async(url, headers)
+            if breaker:
+                breaker.before_request()
+            self.stats.record_request(host)
+            try:
+                response = await self.client.request(method, url, extensions=extensions, **kwargs)
+            except httpx.HTTPError as e:
+                if breaker:
+                    breaker.record_failure()
+                delay = self.retry.delay_for_error(e, attempt, idempotent)
+                if delay is None:
+                    raise
+                logger.warning(f"Ошибка запроса {method} {url}: {e}, повтор {attempt} через {delay:.2f} с")
+                await asyncio.sleep(delay)
+                continue
+
+            _record_outcome(breaker, response.status_code)
+            rate_limiter.record_response(url, headers, response.status_code, response.headers.get("Retry-After"))
+            if response.status_code == 401 and not renewed:
+                renewed = True
+                renewed_headers = await sync_to_async(renewed_authorization)(headers)
+                if renewed_headers is not None:
+                    await response.aclose()
+                    headers = kwargs["headers"] = renewed_headers
+                    continue
+            delay = self.retry.delay_for_response(response, attempt, idempotent)
+            if delay is None:
+                return response
+            logger.warning(f"Ответ {response.status_code} на {method} {url}, повтор {attempt} через {delay:.2f} с")
+            await response.aclose()
+            await asyncio.sleep(delay)
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    def get_connection_stats(self):
+        """Статистика переиспользования соединений по хостам"""
+        return self.stats.snapshot()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+# Соединения httpx привязаны к циклу событий, поэтому клиент свой для каждого цикла
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_avito_client():
+    """Возвращает экземпляр AsyncAvitoClient для текущего цикла событий"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncAvitoClient()
+        _async_clients[loop] = client
+        logger.info(f"Создан асинхронный HTTP-клиент API Авито: соединений {client.pool_maxsize}")
+    return client
+
+
+async def close_async_avito_client():
+    """Закрывает клиент текущего цикла событий, например перед завершением asyncio.run"""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+class PageWalk(abc.ABC):
+    """
+    Постраничная загрузка списка API без привязки к транспорту
+
+    Загрузка сама решает, какую страницу запросить следующей, и разбирает
+    ответы, а запросы выполняет walk_pages (синхронно) или async_walk_pages
+    (в цикле событий). Так синхронная и асинхронная загрузки обходят
+    страницы одним кодом. begin, handle и finish могут работать с БД.
+    """
+
+    def begin(self):
+        """Подготовка перед первым запросом"""
+
+    @abc.abstractmethod
+    def next_request(self):
+        """Параметры запроса следующей страницы для AvitoClient.request или None, если страниц больше нет"""
+
+    @abc.abstractmethod
+    def handle(self, payload):
+        """Разбирает и сохраняет JSON ответа на последний запрос"""
+
+    def finish(self):
+        """Вызывается после обхода, в том числе прерванного ошибкой"""
+
+    @abc.abstractmethod
+    def result(self):
+        """Результат завершенного обхода"""
+
+
+def walk_pages(walk):
+    """Обходит страницы загрузки walk синхронным клиентом"""
+    walk.begin()
+    try:
+        while (request := walk.next_request()) is not None:
+            response = get_avito_client().request(**request)
+            response.raise_for_status()
+            walk.handle(response.json())
+    finally:
+        walk.finish()
+    return walk.result()
+
+
+async def async_walk_pages(walk):
+    """Обходит страницы загрузки walk асинхронным клиентом; работа с БД выполняется в потоке"""
+    await sync_to_async(walk.begin)()
+    try:
+        while (request := walk.next_request()) is not None:
+            response = await get_async_avito_client().request(**request)
+            response.raise_for_status()
+            await sync_to_async(walk.handle)(response.json())
+    finally:
+        await sync_to_async(walk.finish)()
+    return walk.result()
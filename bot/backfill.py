@@ -0,0 +1,151 @@
+"""
+Заполнение исторической статистики аккаунтов.
+
+Показатели профиля за период запрашиваются одним запросом stats/v2 с
+группировкой по дням (частями не длиннее AVITO_BACKFILL_CHUNK_DAYS дней),
+и строки AvitoAccountDailyStats каждой части записываются одной пачкой.
+Дни, за которые полная статистика уже сохранена, не запрашиваются, поэтому
+прерванное заполнение можно просто запустить снова. Строки, посчитанные
+без свежих звонков или отзывов, сохраняются неполными (complete=False)
+и перезаписываются следующим запуском. Частоту запросов ограничивает
+rate_limiter клиента API, пауз между днями нет.
+"""
+import logging
+
+from django.conf import settings
+
+from bot.calls_store import ingest_calls, calls_summary
+from bot.models import AvitoAccountDailyStats
+from bot.reviews_store import sync_reviews, daily_review_counts, total_reviews
+from bot.services import get_access_token, resolve_avito_user_id, get_profile_statistics, parse_profile_days
+from bot.stored_stats import day_windows, period_days
+
+logger = logging.getLogger(__name__)
+
+# Поля, которые заполняются по исторической статистике
+BACKFILL_FIELDS = [
+    'total_calls', 'answered_calls', 'missed_calls', 'total_chats',
+    'total_reviews', 'daily_reviews', 'total_items',
+    'views', 'contacts', 'favorites', 'impressions', 'impressionsToViewsConversion',
+    'daily_expense', 'complete',
+]
+
+
+def missing_days(account, first_day, last_day):
+    """Дни периода, за которые у аккаунта еще нет полной статистики"""
+    stored = set(AvitoAccountDailyStats.objects.filter(
+        avito_account=account, date__range=(first_day, last_day), complete=True
+    ).values_list('date', flat=True))
+    return [day for day in period_days(first_day, last_day) if day not in stored]
+
+
+def day_bounds(day):
+    """Начало и конец дня в формате RFC3339, как в отчетах"""
+    return f"{day.isoformat()}T00:00:00Z", f"{day.isoformat()}T23:59:59Z"
+
+
+def daily_stats_row(account, user_id, day, metrics, reviews, reviews_total, complete):
+    missed_calls = calls_summary(user_id, *day_bounds(day))["missed_calls"]
+    total_calls = metrics.get('calls', 0)
+    missed_calls = missed_calls if total_calls > 0 else 0
+    return AvitoAccountDailyStats(
+        avito_account=account,
+        date=day,
+        total_calls=total_calls,
+        answered_calls=total_calls - missed_calls,
+        missed_calls=missed_calls,
+        total_chats=metrics.get('chats', 0),
+        total_reviews=reviews_total,
+        daily_reviews=reviews,
+        total_items=metrics.get('active_items', 0),
+        views=metrics.get('views', 0),
+        contacts=metrics.get('contacts', 0),
+        favorites=metrics.get('favorites', 0),
+        impressions=metrics.get('impressions', 0),
+        impressionsToViewsConversion=int(metrics.get('impressionsToViewsConversion', 0)),
+        daily_expense=metrics.get('spending', {}).get('total', 0),
+        complete=complete,
+    )
+
+
+def store_daily_stats(rows):
+    if rows:
+        AvitoAccountDailyStats.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['avito_account', 'date'],
+            update_fields=BACKFILL_FIELDS + ['updated_at'],
+        )
+    return len(rows)
+
+
+def backfill_window(account, access_token, user_id, start, end, days, reviews_synced):
+    """
+    Запрашивает и сохраняет статистику за непрерывный отрезок дней
+
+    Строки полные, только если отзывы (reviews_synced) и звонки отрезка загружены.
+    """
+    try:
+        result = get_profile_statistics(access_token, user_id, start.isoformat(), end.isoformat(), grouping="day")
+    except Exception as e:
+        logger.error(f"Ошибка при получении статистики профиля пользователя {user_id} с {start} по {end}: {e}")
+        return None
+    if not result:
+        return None
+    days_metrics = parse_profile_days(result)
+
+    complete = reviews_synced
+    try:
+        ingest_calls(access_token, user_id, day_bounds(start)[0], day_bounds(end)[1])
+    except Exception as e:
+        # Пропущенные звонки посчитаем по уже загруженным
+        logger.error(f"Ошибка при загрузке звонков пользователя {user_id}: {e}")
+        complete = False
+
+    review_counts = daily_review_counts(user_id, start, end)
+    reviews_total = total_reviews(user_id, before=start)
+    rows = []
+    for day in sorted(days_metrics):
+        reviews = review_counts.get(day, 0)
+        reviews_total += reviews
+        if start <= day <= end and day in days:
+            rows.append(daily_stats_row(account, user_id, day, days_metrics[day], reviews, reviews_total, complete))
+    return store_daily_stats(rows)
+
+
+def backfill_account(account, first_day, last_day):
+    """
+    Заполняет статистику аккаунта за дни с first_day по last_day включительно
+
+    Returns:
+        int: Сколько дней сохранено
+    """
+    days = missing_days(account, first_day, last_day)
+    if not days:
+        logger.info(f"Статистика аккаунта {account.name} с {first_day} по {last_day} уже заполнена")
+        return 0
+
+    access_token = get_access_token(account.client_id, account.client_secret)
+    user_id = resolve_avito_user_id(account.client_id, account.client_secret)
+    if not access_token or not user_id:
+        logger.error(f"Не удалось получить токен или ID пользователя для аккаунта {account.name}")
+        return 0
+
+    reviews_synced = True
+    try:
+        sync_reviews(access_token, user_id)
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке отзывов пользователя {user_id}: {e}")
+        reviews_synced = False
+
+    stored = 0
+    missing = set(days)
+    for start, end in day_windows(days, settings.AVITO_BACKFILL_CHUNK_DAYS):
+        saved = backfill_window(account, access_token, user_id, start, end, missing, reviews_synced)
+        if saved is None:
+            # Лимит или ошибка API - остальное дозаполнит следующий запуск
+            logger.warning(f"Заполнение аккаунта {account.name} остановлено на {start}, сохранено дней: {stored}")
+            break
+        stored += saved
+        logger.info(f"Аккаунт {account.name}: сохранена статистика с {start} по {end} ({saved} дней)")
+    return stored
@@ -0,0 +1,171 @@
+"""
+Показания баланса аккаунтов во времени.
+
+Минутная задача cron записывает показания всех аккаунтов одним bulk_create
+(record_snapshots). Старые показания прореживаются (downsample_snapshots):
+поминутные хранятся 2 дня, затем от каждого часа остается последнее
+показание; почасовые хранятся 90 дней, затем от каждого дня остается
+последнее. Дневные показания хранятся без ограничения срока.
+
+balance_history читает показания за период в самом подробном разрешении,
+которое сохранилось на начало периода, и возвращает их массивами NumPy:
+по ним можно построить кривую расходов за день или пересчитать расход
+после ошибочного показания.
+"""
+import datetime
+import logging
+
+import numpy as np
+from django.utils import timezone
+
+from bot.models import AvitoBalanceSnapshot
+
+logger = logging.getLogger(__name__)
+
+MINUTE = 60
+HOUR = 60 * 60
+DAY = 24 * 60 * 60
+
+# (разрешение, сколько хранится, до какого разрешения прореживается)
+RETENTION = (
+    (MINUTE, datetime.timedelta(days=2), HOUR),
+    (HOUR, datetime.timedelta(days=90), DAY),
+)
+
+# Сколько строк обновлять одним запросом при прореживании
+DOWNSAMPLE_BATCH = 1000
+
+
+def bucket_start(ts, resolution):
+    """Начало отрезка длиной resolution (по местному времени), в который попадает ts"""
+    local = timezone.localtime(ts)
+    if resolution == DAY:
+        return local.replace(hour=0, minute=0, second=0, microsecond=0)
+    if resolution == HOUR:
+        return local.replace(minute=0, second=0, microsecond=0)
+    return local.replace(second=0, microsecond=0)
+
+
+def record_snapshots(observations):
+    """
+    Записывает показания баланса одним запросом
+
+    Args:
+        observations: Список (ID аккаунта, время, словарь баланса из get_user_balance_info)
+    """
+    if not observations:
+        return
+    AvitoBalanceSnapshot.objects.bulk_create([
+        AvitoBalanceSnapshot(
+            avito_account_id=account_id,
+            ts=ts,
+            real=balance_info["balance_real"],
+            bonus=balance_info["balance_bonus"],
+            advance=balance_info["advance"],
+            resolution=MINUTE,
+        )
+        for account_id, ts, balance_info in observations
+    ])
+
+
+def downsample_snapshots(now=None):
+    """
+    Прореживает показания, которые хранятся дольше своего разрешения
+
+    Прореживаются только отрезки, целиком оказавшиеся старше срока хранения:
+    последнее показание отрезка получает более грубое разрешение, остальные
+    удаляются.
+
+    Returns:
+        int: Сколько показаний удалено
+    """
+    now = now or timezone.now()
+    removed = 0
+    for resolution, keep_for, coarser in RETENTION:
+        boundary = bucket_start(now - keep_for, coarser)
+        expired = AvitoBalanceSnapshot.objects.filter(resolution=resolution, ts__lt=boundary)
+        last_in_bucket = {}
+        for snapshot_id, account_id, ts in expired.order_by('ts').values_list('id', 'avito_account_id', 'ts'):
+            last_in_bucket[(account_id, bucket_start(ts, coarser))] = snapshot_id
+        if not last_in_bucket:
+            continue
+        kept = list(last_in_bucket.values())
+        for offset in range(0, len(kept), DOWNSAMPLE_BATCH):
+            AvitoBalanceSnapshot.objects.filter(id__in=kept[offset:offset + DOWNSAMPLE_BATCH]).update(resolution=coarser)
+        # Оставшиеся строки с прежним разрешением - не последние в своих отрезках
+        count, _ = expired.delete()
+        removed += count
+        logger.info(f"Показания баланса старше {boundary}: {len(kept)} переведены в разрешение {coarser} с, {count} удалено")
+    return removed
+
+
+def resolution_at(ts, now=None):
+    """Самое подробное разрешение, в котором хранятся показания на время ts"""
+    now = now or timezone.now()
+    for resolution, keep_for, coarser in RETENTION:
+        if ts >= bucket_start(now - keep_for, coarser):
+            return resolution
+    return DAY
+
+
+class BalanceSeries:
+    """
+    Показания баланса аккаунта за период
+
+    Attributes:
+        resolution: Разрешение показаний в секундах
+        ts: Время показаний (datetime64[s], UTC)
+        real, bonus, advance: Реальный баланс, бонусы и аванс
+    """
+
+    def __init__(self, resolution, ts, real, bonus, advance):
+        self.resolution = resolution
+        self.ts = ts
+        self.real = real
+        self.bonus = bonus
+        self.advance = advance
+
+    def __len__(self):
+        return len(self.ts)
+
+    @property
+    def total(self):
+        """Баланс с бонусами и авансом, как в track_user_expenses"""
+        return self.real + self.bonus + self.advance
+
+    def spending(self):
+        """Расход между соседними показаниями (уменьшение баланса; пополнения не учитываются)"""
+        if len(self) < 2:
+            return np.zeros(0)
+        return np.clip(-np.diff(self.total), 0, None)
+
+    def spent(self):
+        """Расход за период"""
+        return float(self.spending().sum())
+
+
+def balance_history(account_id, start, end, resolution=None, now=None):
+    """
+    Показания баланса аккаунта с start по end
+
+    Args:
+        resolution: Разрешение в секундах; по умолчанию самое подробное,
+                    которое сохранилось на время start
+
+    Returns:
+        BalanceSeries: Последнее показание каждого отрезка длиной resolution
+    """
+    resolution = resolution or resolution_at(start, now)
+    rows = list(AvitoBalanceSnapshot.objects.filter(
+        avito_account_id=account_id, ts__range=(start, end)
+    ).order_by('ts').values_list('ts', 'real', 'bonus', 'advance'))
+    if not rows:
+        return BalanceSeries(resolution, np.array([], dtype='datetime64[s]'), *np.zeros((3, 0)))
+
+    times, real, bonus, advance = zip(*rows)
+    buckets = np.array([bucket_start(ts, resolution).timestamp() for ts in times])
+    # Более свежие показания читаются в более подробном разрешении: оставляем последнее в отрезке
+    last = np.append(buckets[1:] != buckets[:-1], True)
+    ts = np.array([int(ts.timestamp()) for ts in times], dtype='datetime64[s]')
+    values = np.array([real, bonus, advance], dtype=float)[:, last]
+    return BalanceSeries(resolution, ts[last], *values)
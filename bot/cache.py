@@ -0,0 +1,248 @@
+"""
+Кэш данных API Авито.
+
+Записи разделены по пространствам имен (дневные и недельные отчеты,
+статистика профиля, услуги объявлений), у каждого пространства свое время
+жизни записей и свои счетчики попаданий и промахов. Хранилище выбирается
+настройкой AVITO_CACHE_BACKEND:
+
+- local: словарь процесса с вытеснением давно не использованных записей
+  по числу записей (AVITO_CACHE_MAX_ENTRIES) и объему (AVITO_CACHE_MAX_BYTES);
+- django: кэш Django с псевдонимом AVITO_CACHE_DJANGO_ALIAS, общий для
+  воркеров, если он общий (Redis, Memcached, база данных);
+- file: файлы в каталоге AVITO_CACHE_DIR, общие для процессов на сервере.
+"""
+import hashlib
+import logging
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def entry_size(entry):
+    """Примерный объем записи в байтах"""
+    try:
+        return len(pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(entry)
+
+
+class LocalCacheBackend:
+    """Кэш в памяти процесса с LRU-вытеснением по числу записей и объему"""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # ключ -> (пространство, истекает, объем, запись)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = {}
+
+    def _remove(self, key):
+        namespace, _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+        return namespace
+
+    def get(self, namespace, key):
+        with self._lock:
+            stored = self._entries.get(key)
+            if stored is None:
+                return None
+            if stored[1] <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return stored[3]
+
+    def set(self, namespace, key, entry, ttl):
+        size = entry_size(entry)
+        if size > self.max_bytes:
+            logger.warning(f"Запись кэша {namespace} ({size} байт) больше допустимого объема, не сохраняем")
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (namespace, time.monotonic() + ttl, size, entry)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                evicted, _ = next(iter(self._entries.items()))
+                evicted_namespace = self._remove(evicted)
+                self.evictions[evicted_namespace] = self.evictions.get(evicted_namespace, 0) + 1
+
+    def delete(self, namespace, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "backend": "local",
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "evictions": dict(self.evictions),
+            }
+
+
+class DjangoCacheBackend:
+    """Кэш Django: время жизни и вытеснение обеспечивает сам кэш"""
+
+    name = "django"
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    @staticmethod
+    def cache_key(key):
+        # Ключи memcached ограничены по длине и символам
+        return "avito:" + hashlib.sha1(key.encode()).hexdigest()
+
+    def get(self, namespace, key):
+        return self.cache.get(self.cache_key(key))
+
+    def set(self, namespace, key, entry, ttl):
+        self.cache.set(self.cache_key(key), entry, timeout=ttl)
+
+    def delete(self, namespace, key):
+        self.cache.delete(self.cache_key(key))
+
+    def snapshot(self):
+        return {"backend": self.name}
+
+
+class FileCacheBackend(DjangoCacheBackend):
+    """Кэш в файлах каталога, общий для всех процессов на сервере"""
+
+    name = "file"
+
+    def __init__(self, directory, max_entries):
+        from django.core.cache.backends.filebased import FileBasedCache
+        super().__init__(FileBasedCache(str(directory), {'OPTIONS': {'MAX_ENTRIES': max_entries}}))
+
+
+def create_backend():
+    """Хранилище кэша по настройке AVITO_CACHE_BACKEND"""
+    backend = settings.AVITO_CACHE_BACKEND
+    if backend == 'django':
+        from django.core.cache import caches
+        return DjangoCacheBackend(caches[settings.AVITO_CACHE_DJANGO_ALIAS])
+    if backend == 'file':
+        return FileCacheBackend(settings.AVITO_CACHE_DIR, settings.AVITO_CACHE_MAX_ENTRIES)
+    if backend != 'local':
+        logger.warning(f"Неизвестное хранилище кэша {backend}, используется local")
+    return LocalCacheBackend(settings.AVITO_CACHE_MAX_ENTRIES, settings.AVITO_CACHE_MAX_BYTES)
+
+
+class CacheNamespace:
+    """
+    Пространство имен кэша со своим временем жизни записей
+
+    Если задан grace, устаревшие записи хранятся еще grace секунд и доступны
+    через get_stale_entry (для выдачи устаревших данных, пока идет обновление).
+    """
+
+    def __init__(self, registry, name, ttl, grace=0):
+        self.registry = registry
+        self.name = name
+        self.ttl = ttl
+        self.grace = grace
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.sets = 0
+
+    def full_key(self, key):
+        return f"{self.name}:{key!r}"
+
+    def get_stale_entry(self, key):
+        """
+        Запись из кэша, в том числе устаревшая
+
+        Returns:
+            tuple: (значение, возраст в секундах, свежая ли запись) или None
+        """
+        entry = self.registry.backend.get(self.name, self.full_key(key))
+        if entry is None:
+            self.misses += 1
+            return None
+        stored_at, ttl, value = entry
+        age = time.time() - stored_at
+        if age < ttl:
+            self.hits += 1
+            return value, age, True
+        self.stale_hits += 1
+        return value, age, False
+
+    def get_entry(self, key):
+        """
+        Запись из кэша
+
+        Returns:
+            tuple: (значение, возраст в секундах) или None, если записи нет или она устарела
+        """
+        entry = self.get_stale_entry(key)
+        if entry is None or not entry[2]:
+            return None
+        return entry[0], entry[1]
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None else None
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl or self.ttl
+        self.sets += 1
+        self.registry.backend.set(self.name, self.full_key(key), (time.time(), ttl, value), ttl + self.grace)
+
+    def delete(self, key):
+        self.registry.backend.delete(self.name, self.full_key(key))
+
+    def snapshot(self):
+        return {
+            "ttl": self.ttl,
+            "grace": self.grace,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "sets": self.sets,
+        }
+
+
+class CacheRegistry:
+    """Пространства имен кэша и общее для них хранилище (создается при первом обращении)"""
+
+    def __init__(self):
+        self._namespaces = {}
+        self._backend = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = create_backend()
+        return self._backend
+
+    def namespace(self, name, ttl, grace=0):
+        with self._lock:
+            if name not in self._namespaces:
+                self._namespaces[name] = CacheNamespace(self, name, ttl, grace)
+            return self._namespaces[name]
+
+    def snapshot(self):
+        return {
+            "storage": self.backend.snapshot(),
+            "namespaces": {name: namespace.snapshot() for name, namespace in self._namespaces.items()},
+        }
+
+
+avito_cache = CacheRegistry()
@@ -0,0 +1,132 @@
+"""
+Локальная копия звонков calltracking.
+
+Звонки аккаунта загружаются постранично и сохраняются в AvitoCall.
+Загрузка продолжается с отметки синхронизации (см. bot.sync_state), так
+что для каждого отчета запрашиваются только еще не загруженные отрезки.
+Количество всех, отвеченных и пропущенных звонков за период считается
+одним агрегирующим запросом к базе.
+"""
+import logging
+
+from django.db.models import Count, Q
+
+from bot.avito_client import PageWalk, walk_pages
+from bot.models import AvitoCall
+from bot.sync_state import PlannedRanges, parse_time, format_time
+
+logger = logging.getLogger(__name__)
+
+SOURCE = 'calls'
+
+# Размер страницы списка звонков
+CALLS_PAGE_SIZE = 100
+
+
+def calls_request(access_token, date_from, date_to, limit=CALLS_PAGE_SIZE, offset=0):
+    return {
+        'method': 'POST',
+        'idempotent': True,  # POST только читает данные
+        'url': 'https://api.avito.ru/calltracking/v1/getCalls/',
+        'headers': {
+            'Authorization': f'Bearer {access_token}',
+            'Content-Type': 'application/json'
+        },
+        'json': {
+            'dateTimeFrom': date_from,
+            'dateTimeTo': date_to,
+            'limit': limit,
+            'offset': offset
+        }
+    }
+
+
+def parse_calls_page(user_id, calls):
+    """Строки AvitoCall для звонков страницы (звонки без ID или времени пропускаются)"""
+    rows = []
+    for call in calls:
+        call_id = call.get('callId', call.get('id'))
+        call_time = parse_time(call.get('callTime') or call.get('createTime'))
+        if call_id is None or call_time is None:
+            continue
+        rows.append(AvitoCall(
+            user_id=user_id,
+            call_id=str(call_id),
+            call_time=call_time,
+            talk_duration=call.get('talkDuration') or 0,
+        ))
+    return rows
+
+
+def store_calls(rows):
+    if rows:
+        AvitoCall.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['user_id', 'call_id'],
+            update_fields=['call_time', 'talk_duration'],
+        )
+    return len(rows)
+
+
+class CallsPages(PageWalk):
+    """Страницы звонков за не загруженные отрезки периода (RFC3339)"""
+
+    def __init__(self, access_token, user_id, date_from, date_to):
+        self.access_token = access_token
+        self.user_id = user_id
+        self.ranges = PlannedRanges(user_id, SOURCE, date_from, date_to)
+        self.offset = 0
+        self.ingested = 0
+
+    def begin(self):
+        self.ranges.load()
+
+    def next_request(self):
+        if self.ranges.current is None:
+            return None
+        start, end = self.ranges.current
+        return calls_request(self.access_token, format_time(start), format_time(end), offset=self.offset)
+
+    def handle(self, payload):
+        calls = payload.get('calls', [])
+        self.ingested += store_calls(parse_calls_page(self.user_id, calls))
+        if len(calls) < CALLS_PAGE_SIZE:
+            self.ranges.complete_current()
+            self.offset = 0
+        else:
+            self.offset += CALLS_PAGE_SIZE
+
+    def result(self):
+        logger.info(
+            f"Звонки пользователя {self.user_id} с {self.ranges.date_from} по {self.ranges.date_to}: "
+            f"загружено {self.ingested}"
+        )
+        return self.ingested
+
+
+def ingest_calls(access_token, user_id, date_from, date_to):
+    """
+    Догружает звонки за период (RFC3339) в локальную таблицу
+
+    Returns:
+        int: Сколько звонков загружено
+    """
+    return walk_pages(CallsPages(access_token, user_id, date_from, date_to))
+
+
+def calls_summary(user_id, date_from, date_to):
+    """Количество всех, отвеченных и пропущенных звонков за период по локальной таблице"""
+    totals = AvitoCall.objects.filter(
+        user_id=user_id,
+        call_time__gte=parse_time(date_from),
+        call_time__lte=parse_time(date_to),
+    ).aggregate(
+        total=Count('id'),
+        missed=Count('id', filter=Q(talk_duration=0)),
+    )
+    return {
+        "total_calls": totals['total'],
+        "answered_calls": totals['total'] - totals['missed'],
+        "missed_calls": totals['missed'],
+    }
@@ -0,0 +1,171 @@
+"""
+Локальный индекс чатов Авито.
+
+Чаты аккаунта (ID, время создания и последнего сообщения) хранятся в
+AvitoChat и обновляются инкрементально: API отдает чаты начиная с самых
+свежих, поэтому обновление останавливается на первой странице, где
+встречаются чаты старше отметки синхронизации (см. bot.sync_state.PagedSync).
+Проход, прерванный ошибкой или ограничением AVITO_CHATS_MAX_PAGES,
+продолжается следующей синхронизацией.
+Количество чатов за период считается запросом к базе по индексу.
+"""
+import logging
+
+from django.conf import settings
+
+from bot.avito_client import PageWalk, walk_pages
+from bot.models import AvitoChat
+from bot.sync_state import begin_paged_sync, finish_paged_sync, parse_time
+
+logger = logging.getLogger(__name__)
+
+SOURCE = 'chats'
+
+# Размер страницы списка чатов (API принимает максимум 100)
+CHATS_PAGE_SIZE = 100
+
+
+def chats_params(unread_only=False, chat_types=None, limit=100, offset=0):
+    # Параметры запроса (API принимает максимум 100)
+    params = {
+        'limit': min(limit, 100),  # Ограничиваем до 100
+        'offset': offset
+    }
+
+    # Не передаем даты в параметры URL - они не поддерживаются API
+    # Будем фильтровать чаты по датам в коде после получения
+
+    # Добавляем необязательные параметры, если они указаны
+    if unread_only:
+        params['unread_only'] = 'true'
+
+    if chat_types:
+        if isinstance(chat_types, list):
+            params['chat_types'] = ','.join(chat_types)
+        else:
+            params['chat_types'] = 'u2i'  # По умолчанию только чаты по объявлениям
+    return params
+
+
+def chats_request(access_token, user_id, params):
+    return {
+        'method': 'GET',
+        'url': f'https://api.avito.ru/messenger/v2/accounts/{user_id}/chats',
+        'headers': {
+            'Authorization': f'Bearer {access_token}'
+        },
+        'params': dict(params)
+    }
+
+
+def chat_times(chat):
+    """Время создания чата и последнего сообщения в нем"""
+    last_message_time = parse_time(
+        chat.get('lastMessageTime')
+        or chat.get('last_message', {}).get('created')
+        or chat.get('updated')
+    )
+    return parse_time(chat.get('created')), last_message_time
+
+
+def parse_chats_page(user_id, chats, mark):
+    """
+    Разбирает страницу чатов
+
+    Returns:
+        tuple: (строки AvitoChat, достигнута ли отметка синхронизации)
+    """
+    rows = []
+    reached_mark = False
+    for chat in chats:
+        if 'id' not in chat:
+            continue
+        created, last_message_time = chat_times(chat)
+        if last_message_time is None:
+            continue
+        if mark is not None and last_message_time < mark:
+            reached_mark = True
+            continue
+        rows.append(AvitoChat(
+            user_id=user_id,
+            chat_id=str(chat['id']),
+            created=created,
+            last_message_time=last_message_time,
+        ))
+    return rows, reached_mark
+
+
+def store_chats(rows):
+    """Добавляет новые чаты и обновляет время последнего сообщения у известных"""
+    if rows:
+        AvitoChat.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['user_id', 'chat_id'],
+            update_fields=['last_message_time'],
+        )
+    return len(rows)
+
+
+class ChatsPages(PageWalk):
+    """Страницы чатов от новых к старым до отметки синхронизации (не больше AVITO_CHATS_MAX_PAGES)"""
+
+    def __init__(self, access_token, user_id):
+        self.access_token = access_token
+        self.user_id = user_id
+        self.params = chats_params(chat_types='u2i', limit=CHATS_PAGE_SIZE)
+        self.paged_sync = None
+        self.pages = 0
+        self.synced = 0
+
+    def begin(self):
+        self.paged_sync = begin_paged_sync(self.user_id, SOURCE)
+
+    def next_request(self):
+        if self.paged_sync.complete or self.pages >= settings.AVITO_CHATS_MAX_PAGES:
+            return None
+        self.pages += 1
+        self.params['offset'] = self.paged_sync.offset
+        return chats_request(self.access_token, self.user_id, self.params)
+
+    def handle(self, payload):
+        chats = payload.get('chats', [])
+        rows, reached_mark = parse_chats_page(self.user_id, chats, self.paged_sync.mark)
+        self.synced += store_chats(rows)
+        self.paged_sync.advance(len(chats), (row.last_message_time for row in rows))
+        if reached_mark or len(chats) < CHATS_PAGE_SIZE:
+            self.paged_sync.complete = True
+
+    def finish(self):
+        if self.paged_sync is not None:
+            finish_paged_sync(self.paged_sync)
+
+    def result(self):
+        if self.paged_sync.complete:
+            logger.info(f"Индекс чатов пользователя {self.user_id}: обновлено {self.synced} чатов (отметка {self.paged_sync.mark})")
+        else:
+            logger.warning(
+                f"Индекс чатов пользователя {self.user_id}: обновлено {self.synced} чатов, загружены не все страницы, "
+                f"следующая синхронизация продолжит со смещения {self.paged_sync.offset}"
+            )
+        return self.synced
+
+
+def sync_chats(access_token, user_id):
+    """
+    Догружает в индекс чаты, изменившиеся после последней синхронизации
+
+    Returns:
+        int: Сколько чатов добавлено или обновлено
+    """
+    return walk_pages(ChatsPages(access_token, user_id))
+
+
+def count_chats(user_id, date_from=None, date_to=None):
+    """Количество чатов с последним сообщением в периоде (RFC3339)"""
+    chats = AvitoChat.objects.filter(user_id=user_id)
+    if date_from:
+        chats = chats.filter(last_message_time__gte=parse_time(date_from))
+    if date_to:
+        chats = chats.filter(last_message_time__lte=parse_time(date_to))
+    return chats.count()
@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Запрос не выполнен: группа методов API временно отключена"""
+
+    def __init__(self, family):
+        self.family = family
+        super().__init__(f"API Авито {family} временно недоступно (circuit breaker открыт)")
+
+
+class CircuitBreaker:
+    """
+    Предохранитель для группы методов API Авито.
+
+    После failure_threshold ошибок подряд предохранитель открывается, и
+    запросы к группе сразу завершаются CircuitOpenError, не дожидаясь
+    таймаутов. Через reset_timeout секунд пропускается пробный запрос
+    (полуоткрытое состояние): успех закрывает предохранитель, ошибка снова
+    открывает его.
+    """
+
+    def __init__(self, family, failure_threshold=None, reset_timeout=None):
+        self.family = family
+        self.failure_threshold = failure_threshold or settings.AVITO_BREAKER_FAILURES
+        self.reset_timeout = reset_timeout or settings.AVITO_BREAKER_RESET_TIMEOUT
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.opened_count = 0
+        self.rejected = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state):
+        if state == self.state:
+            return
+        logger.warning(f"Предохранитель API {self.family}: {self.state} -> {state}")
+        self.state = state
+
+    def allow_request(self):
+        """Проверяет, можно ли выполнить запрос; в полуоткрытом состоянии пропускает один пробный"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._set_state(HALF_OPEN)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def before_request(self):
+        if not self.allow_request():
+            raise CircuitOpenError(self.family)
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probe_in_flight = False
+            self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.opened_count += 1
+                self.opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    def is_open(self):
+        """Открыт ли предохранитель сейчас (без учета пробных запросов)"""
+        with self._lock:
+            return self.state == OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "opened_count": self.opened_count,
+                "rejected": self.rejected,
+                "open_for": round(time.monotonic() - self.opened_at, 1) if self.state == OPEN else 0,
+            }
+
+
+class CircuitBreakerRegistry:
+    """Предохранители по группам методов API (см. bot.rate_limiter.endpoint_family)"""
+
+    def __init__(self):
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, family):
+        breaker = self._breakers.get(family)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(family, CircuitBreaker(family))
+        return breaker
+
+    def is_open(self, family):
+        breaker = self._breakers.get(family)
+        return breaker is not None and breaker.is_open()
+
+    def open_families(self, families):
+        """Группы из families, предохранители которых сейчас открыты"""
+        return [family for family in families if self.is_open(family)]
+
+    def snapshot(self):
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {family: breaker.snapshot() for family, breaker in breakers.items()}
+
+
+circuit_breakers = CircuitBreakerRegistry()
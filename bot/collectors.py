@@ -0,0 +1,295 @@
+"""
+Сборщики данных для отчетов за период.
+
+Каждый показатель отчета получает зарегистрированный сборщик. Сборщик
+объявляет, какие входные данные ему нужны (токен, ID пользователя, период),
+примерную стоимость (число запросов к API), группы методов API и время
+жизни результата. По набору показателей отчета реестр строит план: волны
+сборщиков, в каждой волне сборщики выполняются параллельно. Резервный
+сборщик (fallback_for) запускается во второй волне и только если основной
+недоступен (предохранитель открыт или сборщик завершился ошибкой), а если
+основного в плане нет - в первой, как обычный (так старые методы API
+заменяют статистику профиля).
+
+Каждый сборщик перечисляет поля отчета, которые он заполняет (provides).
+По полям, которые показывает формат отчета, choose_sources выбирает самые
+дешевые источники: кэш, сохраненную статистику или запрос к API.
+
+Сами запросы выполняет переданная функция запуска волны (синхронная в
+bot.services, асинхронная в bot.async_services): она отвечает за кэш,
+предохранители и значения по умолчанию. Функции сборщиков сообщают об
+ошибке исключением (см. CollectorFailed), поэтому значение по умолчанию
+вместо данных не попадает в кэш.
+"""
+import copy
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Входные данные сборщиков
+INPUTS = frozenset(("access_token", "user_id", "period"))
+
+
+class CollectorFailed(Exception):
+    """
+    Сборщик не получил свежие данные
+
+    Функции сборщиков выбрасывают исключение при ошибке, чтобы функция
+    запуска волны подставила значение по умолчанию и не кэшировала его.
+    Если есть запасное значение (например, подсчет по уже сохраненным
+    данным), оно передается в fallback и используется в отчете вместо
+    значения по умолчанию, но тоже не кэшируется.
+    """
+
+    def __init__(self, message, fallback=None):
+        super().__init__(message)
+        self.fallback = fallback
+
+
+def failed_result(error, default):
+    """Значение сборщика, завершившегося ошибкой error"""
+    if isinstance(error, CollectorFailed) and error.fallback is not None:
+        return error.fallback
+    return default
+
+
+def synced_count(sync, count, source):
+    """
+    Подсчет count() по локальной копии данных после синхронизации sync()
+
+    Если синхронизация не удалась, выбрасывает CollectorFailed с подсчетом
+    по уже сохраненным данным.
+    """
+    try:
+        sync()
+    except Exception as e:
+        raise CollectorFailed(f"Ошибка при загрузке {source}: {e}", fallback=count()) from e
+    return count()
+
+
+async def async_synced_count(sync, count, source):
+    """Асинхронная версия synced_count: sync и count возвращают корутины"""
+    try:
+        await sync()
+    except Exception as e:
+        raise CollectorFailed(f"Ошибка при загрузке {source}: {e}", fallback=await count()) from e
+    return await count()
+
+
+class CollectorContext:
+    """Входные данные сборщиков одного отчета"""
+
+    def __init__(self, access_token, user_id, period):
+        self.access_token = access_token
+        self.user_id = user_id
+        self.period = period
+
+    @property
+    def start(self):
+        return self.period["start"]
+
+    @property
+    def end(self):
+        return self.period["end"]
+
+
+class Collector:
+    """
+    Сборщик одного показателя
+
+    Args:
+        name: Имя результата
+        fetch: Функция от CollectorContext, возвращающая результат (или корутину)
+        default: Значение при ошибке (копируется для каждого отчета)
+        inputs: Какие входные данные используются; без 'period' результат не зависит от периода
+        cost: Примерное число запросов к API
+        families: Группы методов API (см. bot.rate_limiter.endpoint_family)
+        ttl: Сколько секунд результат остается свежим
+        provides: Поля отчета, которые заполняет результат
+        fallback_for: Сборщик, который этот заменяет, когда тот недоступен
+    """
+
+    def __init__(self, name, fetch, default=0, inputs=INPUTS, cost=1, families=(), ttl=15 * 60,
+                 provides=(), fallback_for=None):
+        unknown = set(inputs) - INPUTS
+        if unknown:
+            raise ValueError(f"Неизвестные входные данные сборщика {name}: {', '.join(sorted(unknown))}")
+        self.name = name
+        self.fetch = fetch
+        self.default = default
+        self.inputs = frozenset(inputs)
+        self.cost = cost
+        self.families = tuple(families)
+        self.ttl = ttl
+        self.provides = frozenset(provides)
+        self.fallback_for = fallback_for
+
+    @property
+    def point_in_time(self):
+        return "period" not in self.inputs
+
+    def default_value(self):
+        return copy.deepcopy(self.default)
+
+    def with_fetch(self, fetch):
+        """Тот же сборщик с другой функцией получения данных (например, асинхронной)"""
+        collector = copy.copy(self)
+        collector.fetch = fetch
+        return collector
+
+    def task(self, context):
+        """Запись для run_collectors: (функция без аргументов, значение по умолчанию)"""
+        return (lambda: self.fetch(context), self.default_value())
+
+
+class CollectorRegistry:
+    """Набор сборщиков, из которого строятся планы отчетов"""
+
+    def __init__(self, collectors=()):
+        self._collectors = {}
+        for collector in collectors:
+            self.register(collector)
+
+    def register(self, collector):
+        if collector.name in self._collectors:
+            raise ValueError(f"Сборщик {collector.name} уже зарегистрирован")
+        self._collectors[collector.name] = collector
+        return collector
+
+    def __getitem__(self, name):
+        return self._collectors[name]
+
+    def __iter__(self):
+        return iter(self._collectors.values())
+
+    def names(self):
+        return tuple(self._collectors)
+
+    def with_fetchers(self, fetchers):
+        """Копия реестра, в которой функции получения данных заменены на fetchers {имя: функция}"""
+        return CollectorRegistry(
+            collector.with_fetch(fetchers[collector.name]) if collector.name in fetchers else collector
+            for collector in self
+        )
+
+    def plan(self, metrics):
+        """
+        План сбора показателей metrics
+
+        Returns:
+            list: Волны сборщиков: основные, затем резервные для основных из плана
+        """
+        unknown = [name for name in metrics if name not in self._collectors]
+        if unknown:
+            raise KeyError(f"Нет сборщика {', '.join(unknown)}")
+        needed = [self._collectors[name] for name in dict.fromkeys(metrics)]
+        planned = {collector.name for collector in needed}
+
+        # Резервный сборщик ждет основной, если тот есть в плане
+        fallbacks = [collector for collector in needed if collector.fallback_for in planned]
+        primary = [collector for collector in needed if collector.fallback_for not in planned]
+        waves = []
+        for wave in (primary, fallbacks):
+            if wave:
+                # Дорогие сборщики запускаем первыми, чтобы они не ждали свободного потока
+                waves.append(sorted(wave, key=lambda collector: -collector.cost))
+        return waves
+
+
+def plan_cost(waves):
+    return sum(collector.cost for wave in waves for collector in wave)
+
+
+def should_run(collector, planned, unavailable):
+    return collector.fallback_for not in planned or collector.fallback_for in unavailable
+
+
+def wave_tasks(wave, planned, context, unavailable):
+    """Сборщики волны, которые нужно запустить, в формате run_collectors"""
+    return {
+        collector.name: collector.task(context)
+        for collector in wave
+        if should_run(collector, planned, unavailable)
+    }
+
+
+def planned_names(waves):
+    return {collector.name for wave in waves for collector in wave}
+
+
+def run_plan(waves, context, run_wave, unavailable):
+    """
+    Выполняет план сбора
+
+    Args:
+        waves: План из CollectorRegistry.plan
+        context: CollectorContext отчета
+        run_wave: Функция (задачи, unavailable) -> {имя: результат}
+        unavailable: Список, в который добавляются недоступные сборщики
+
+    Returns:
+        dict: {имя: результат} запущенных сборщиков
+    """
+    started_at = time.monotonic()
+    planned = planned_names(waves)
+    results = {}
+    for wave in waves:
+        tasks = wave_tasks(wave, planned, context, unavailable)
+        if tasks:
+            results.update(run_wave(tasks, unavailable))
+    logger.info(f"План сбора ({plan_cost(waves)} запросов, {len(waves)} волн) выполнен за {time.monotonic() - started_at:.2f} с")
+    return results
+
+
+async def async_run_plan(waves, context, run_wave, unavailable):
+    """Асинхронная версия run_plan: run_wave возвращает корутину"""
+    started_at = time.monotonic()
+    planned = planned_names(waves)
+    results = {}
+    for wave in waves:
+        tasks = wave_tasks(wave, planned, context, unavailable)
+        if tasks:
+            results.update(await run_wave(tasks, unavailable))
+    logger.info(f"План сбора ({plan_cost(waves)} запросов, {len(waves)} волн) выполнен за {time.monotonic() - started_at:.2f} с")
+    return results
+
+
+class SourceCandidate:
+    """Возможный источник данных сборщика: кэш, сохраненная статистика или API"""
+
+    def __init__(self, name, source, cost, fields, value=None):
+        self.name = name
+        self.source = source
+        self.cost = cost
+        self.fields = frozenset(fields)
+        self.value = value
+
+
+def choose_sources(fields, candidates):
+    """
+    Выбирает источники, покрывающие поля отчета, с наименьшей оценкой стоимости
+
+    На каждом шаге берется источник с наименьшей стоимостью на еще не
+    покрытое поле. Если для сборщика выбран запрос к API, он заменяет
+    выбранный ранее частичный источник того же сборщика.
+
+    Returns:
+        tuple: ({имя сборщика: SourceCandidate}, поля, которые нечем заполнить)
+    """
+    chosen = {}
+    remaining = set(fields)
+    while remaining:
+        options = [
+            candidate for candidate in candidates
+            if candidate.fields & remaining
+            and (candidate.name not in chosen or chosen[candidate.name].cost < candidate.cost)
+        ]
+        if not options:
+            break
+        best = min(options, key=lambda candidate: (
+            candidate.cost / len(candidate.fields & remaining), -len(candidate.fields & remaining)
+        ))
+        chosen[best.name] = best
+        remaining -= best.fields
+    return chosen, remaining
@@ -1,3 +1,4 @@
+import asyncio
 import datetime
 import logging
 from django.conf import settings
@@ -5,7 +6,11 @@ from django.utils import timezone
 from bot.models import User, AvitoAccount, AvitoAccountDailyStats
 from bot.handlers.common import send_daily_report, send_weekly_report
 from django.db.models import Q
-from bot.services import get_access_token, get_user_balance_info, get_daily_statistics
+from bot.services import get_access_token, get_user_balance_info, get_daily_statistics, resolve_avito_user_id, COLLECTOR_FAMILIES
+from bot.circuit_breaker import circuit_breakers
+from bot.async_services import async_prefetch_daily_statistics
+from bot.backfill import backfill_account
+from bot.balance_history import downsample_snapshots, record_snapshots
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +24,9 @@ def send_daily_reports_to_all_users():
     
     logger.info(f'Найдено аккаунтов для ежедневных отчетов: {accounts.count()}')
     
+    # Статистику всех аккаунтов собираем одновременно, отчеты ниже берут ее из кэша
+    prefetch_daily_statistics(account for account in accounts if account.daily_report_tg_id)
+    
     for account in accounts:
         try:
             # Отправляем дневной отчет в указанный telegram_id
@@ -31,6 +39,19 @@ def send_daily_reports_to_all_users():
             logger.error(f"Ошибка при отправке ежедневного отчета для аккаунта {account.name}: {e}")
 
 
+def prefetch_daily_statistics(accounts):
+    """Асинхронно собирает дневную статистику сразу для всех аккаунтов"""
+    credentials = list({(account.client_id, account.client_secret) for account in accounts})
+    if not credentials:
+        return
+    
+    try:
+        asyncio.run(async_prefetch_daily_statistics(credentials))
+        logger.info(f"Дневная статистика собрана заранее для {len(credentials)} аккаунтов")
+    except Exception as e:
+        logger.error(f"Ошибка при предварительном сборе дневной статистики: {e}")
+
+
 def send_weekly_reports_to_all_users():
     """Отправка еженедельных отчетов всем пользователям"""
     accounts = AvitoAccount.objects.filter(
@@ -54,12 +75,20 @@ def send_weekly_reports_to_all_users():
 
 def track_user_expenses():
     """Отслеживание расходов аккаунтов на основе изменения баланса"""
+    # Пока API баланса отключено предохранителем, не ждем таймаутов по каждому аккаунту
+    open_families = circuit_breakers.open_families(COLLECTOR_FAMILIES["balance_info"])
+    if open_families:
+        logger.warning(f"Отслеживание расходов пропущено: API {', '.join(open_families)} временно недоступно")
+        return
+
     accounts = AvitoAccount.objects.filter(
         client_id__isnull=False, 
         client_secret__isnull=False
     ).exclude(client_id="none")
     
     current_time = datetime.datetime.now()
+    # Показания баланса записываются одним запросом после обхода аккаунтов
+    snapshots = []
     
     for account in accounts:
         try:
@@ -69,8 +98,16 @@ def track_user_expenses():
                 logger.error(f"Не удалось получить токен доступа для аккаунта {account.name}")
                 continue
                 
-            # Получаем текущий баланс аккаунта
-            balance_info = get_user_balance_info(access_token)
+            user_id = resolve_avito_user_id(account.client_id, account.client_secret)
+            if not user_id:
+                logger.error(f"Не удалось получить ID пользователя Авито для аккаунта {account.name}")
+                continue
+                
+            # Получаем текущий баланс аккаунта. Если запрос не удался, исключение
+            # пропускает и показание, и расчет расхода: нулевой баланс был бы принят за расход
+            balance_info = get_user_balance_info(access_token, user_id)
+            
+            snapshots.append((account.id, timezone.now(), balance_info))
             
             # Используем сумму реального баланса, бонусов и авансовых платежей
             current_balance = balance_info["balance_real"] + balance_info["balance_bonus"] + balance_info["advance"]
@@ -104,6 +141,11 @@ def track_user_expenses():
             
         except Exception as e:
             logger.error(f"Ошибка при отслеживании расходов аккаунта {account.name}: {e}")
+    
+    try:
+        record_snapshots(snapshots)
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении показаний баланса: {e}")
 
 
 def reset_daily_expenses():
@@ -196,13 +238,14 @@ def store_daily_statistics():
 
 
 def clean_old_statistics():
-    """Удаление статистики старше 30 дней"""
+    """Удаление статистики старше AVITO_DAILY_STATS_RETENTION_DAYS дней"""
     try:
-        threshold_date = timezone.now().date() - datetime.timedelta(days=30)
+        threshold_date = timezone.now().date() - datetime.timedelta(days=settings.AVITO_DAILY_STATS_RETENTION_DAYS)
         old_stats = AvitoAccountDailyStats.objects.filter(date__lt=threshold_date)
         count = old_stats.count()
         
         if count > 0:
+            # delete() запроса дневной статистики пересчитывает итоги затронутых недель и месяцев
             old_stats.delete()
             logger.info(f"Удалено {count} записей статистики старше {threshold_date}")
         else:
@@ -365,30 +408,14 @@ def populate_historical_data(days=30):
             try:
                 logger.info(f"Заполнение данных для аккаунта {account.name}")
                 
-                # Проходим по каждому дню
-                for day_offset in range(days, 0, -1):
-                    date = today - datetime.timedelta(days=day_offset)
-                    
-                    # Проверяем, есть ли уже запись за этот день
-                    stat_exists = AvitoAccountDailyStats.objects.filter(
-                        avito_account=account,
-                        date=date
-                    ).exists()
-                    
-                    if stat_exists:
-                        logger.info(f"Запись для {date} уже существует, пропускаем")
-                        continue
-                    
-                    logger.info(f"Создание записи за {date} для аккаунта {account.name}")
-                    
-                    # Создаем запись
-                    store_account_daily_stats(account, date)
-                    
-                    # Делаем небольшую паузу, чтобы не перегружать API
-                    import time
-                    time.sleep(1)
+                # Пропущенные дни запрашиваются одним запросом с группировкой по дням
+                stored = backfill_account(
+                    account,
+                    today - datetime.timedelta(days=days),
+                    today - datetime.timedelta(days=1),
+                )
                 
-                logger.info(f"Заполнение данных для аккаунта {account.name} завершено")
+                logger.info(f"Заполнение данных для аккаунта {account.name} завершено, сохранено дней: {stored}")
                 
             except Exception as e:
                 logger.error(f"Ошибка при заполнении данных для аккаунта {account.name}: {e}")
@@ -402,4 +429,10 @@ def populate_historical_data(days=30):
 def minutely_task():
     """Задача для запуска каждую минуту через cron"""
     track_user_expenses()
+    
+    # Прореживаем устаревшие показания баланса
+    try:
+        downsample_snapshots()
+    except Exception as e:
+        logger.error(f"Ошибка при прореживании показаний баланса: {e}")
 
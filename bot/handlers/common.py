@@ -1,11 +1,14 @@
 from bot import bot
-from bot.models import User, AvitoAccount, UserAvitoAccount, AvitoAccountDailyStats, Settings
+from bot.models import User, AvitoAccount, UserAvitoAccount, AvitoAccountDailyStats, AvitoAccountWeeklyStats, Settings
 from bot.keyboards import main_markup
 from bot.texts import MAIN_TEXT
 from bot.services import get_daily_statistics, get_weekly_statistics
+from bot.async_services import get_daily_report, get_weekly_report
+from bot.stats_history import load_history
 import telebot
 from django.db import models
 import datetime
+import math
 from django.utils import timezone
 
 import logging
@@ -26,6 +29,61 @@ def menu_m(message):
         reply_markup=main_markup
     )
 
+# Названия данных отчета, которые могут быть недоступны из-за сбоя API Авито
+UNAVAILABLE_LABELS = {
+    "missed_calls": "пропущенные звонки",
+    "total_calls": "звонки",
+    "new_chats": "новые чаты",
+    "total_chats": "чаты",
+    "total_phones": "показы телефона",
+    "balance_info": "баланс",
+    "rating": "рейтинг",
+    "reviews_info": "отзывы",
+    "profile_stats": "статистика профиля",
+    "items_info": "объявления",
+    "expenses_info": "расходы",
+}
+
+# Поля AvitoAccountDailyStats, которые заполняются данными сборщика
+UNAVAILABLE_FIELDS = {
+    "missed_calls": ("missed_calls", "answered_calls"),
+    "total_calls": ("total_calls", "missed_calls", "answered_calls"),
+    "new_chats": ("new_chats",),
+    "total_chats": ("total_chats",),
+    "total_phones": ("phones_received",),
+    "balance_info": ("balance_real", "balance_bonus", "advance"),
+    "rating": ("rating",),
+    "reviews_info": ("total_reviews", "daily_reviews"),
+    # Без статистики профиля остальное берется из старых методов, у них свои отметки
+    "profile_stats": ("impressions", "impressionsToViewsConversion"),
+    "items_info": ("total_items", "xl_promotion_count", "views", "contacts", "favorites"),
+    "expenses_info": ("daily_expense",),
+}
+
+def format_unavailable_notice(response):
+    """Предупреждение о данных, которые не удалось получить из-за сбоя API"""
+    unavailable = response.get('unavailable') or []
+    if not unavailable:
+        return ""
+    labels = [UNAVAILABLE_LABELS.get(name, name) for name in unavailable]
+    return f"\n\n⚠️ Временно недоступны данные: {', '.join(labels)}"
+
+def format_stale_notice(response):
+    """Пометка для отчета, выданного из кэша, пока он обновляется в фоне"""
+    stale_age = response.get('stale_age')
+    if stale_age is None:
+        return ""
+    minutes = int(stale_age // 60)
+    age = f"{minutes} мин." if minutes < 60 else f"{minutes // 60} ч. {minutes % 60} мин."
+    return f"\n\n🕒 Данные получены {age} назад, обновляем в фоне - запросите отчет еще раз через минуту"
+
+def available_stats_defaults(response, defaults):
+    """Убирает из полей статистики недоступные и не запрошенные данные, чтобы не затирать их нулями"""
+    for name in (response.get('unavailable') or []) + (response.get('skipped') or []):
+        for field in UNAVAILABLE_FIELDS.get(name, ()):
+            defaults.pop(field, None)
+    return defaults
+
 def format_expenses_message(expenses):
     """Форматирует сообщение о расходах"""
     if not expenses:
@@ -203,52 +261,15 @@ def get_previous_day_stats(account_id, current_date):
         return None
 
 def get_previous_week_stats(account_id, current_date):
-    """Получает статистику за предыдущую неделю (суммарно)"""
+    """
+    Получает итоги статистики за предыдущую неделю
+
+    Берется календарная неделя, на которую приходится большая часть недели
+    перед отчетным периодом (с current_date - 14 дней по current_date - 8
+    дней), для понедельничного отчета они совпадают.
+    """
     try:
-        # Получаем начало предыдущей недели
-        week_start = current_date - datetime.timedelta(days=14)
-        week_end = current_date - datetime.timedelta(days=7)
-        
-        # Получаем все записи за предыдущую неделю
-        previous_week_stats = AvitoAccountDailyStats.objects.filter(
-            avito_account_id=account_id,
-            date__gte=week_start,
-            date__lt=week_end
-        )
-        
-        # Если нет данных, возвращаем None
-        if not previous_week_stats.exists():
-            return None
-            
-        # Суммируем данные
-        total_calls = sum(stats.total_calls for stats in previous_week_stats)
-        answered_calls = sum(stats.answered_calls for stats in previous_week_stats)
-        missed_calls = sum(stats.missed_calls for stats in previous_week_stats)
-        total_chats = sum(stats.total_chats for stats in previous_week_stats)
-        new_chats = sum(stats.new_chats for stats in previous_week_stats)
-        phones_received = sum(stats.phones_received for stats in previous_week_stats)
-        views = sum(stats.views for stats in previous_week_stats)
-        contacts = sum(stats.contacts for stats in previous_week_stats)
-        favorites = sum(stats.favorites for stats in previous_week_stats)
-        daily_reviews = sum(stats.daily_reviews for stats in previous_week_stats)
-        daily_expense = sum(stats.daily_expense for stats in previous_week_stats)
-        
-        # Создаем объект с суммарными данными
-        class WeeklySummary:
-            def __init__(self):
-                self.total_calls = total_calls
-                self.answered_calls = answered_calls
-                self.missed_calls = missed_calls
-                self.total_chats = total_chats
-                self.new_chats = new_chats
-                self.phones_received = phones_received
-                self.views = views
-                self.contacts = contacts
-                self.favorites = favorites
-                self.daily_reviews = daily_reviews
-                self.daily_expense = daily_expense
-                
-        return WeeklySummary()
+        return AvitoAccountWeeklyStats.for_day(account_id, current_date - datetime.timedelta(days=11))
     except Exception as e:
         logger.error(f"Ошибка при получении статистики за предыдущую неделю: {e}")
         return None
@@ -262,7 +283,9 @@ def daily_report_for_account(chat_id, account_id):
         account = AvitoAccount.objects.get(id=account_id)
         client_id = account.client_id
         client_secret = account.client_secret
-        response = get_daily_statistics(client_id, client_secret)
+        # Запрашиваем только данные, которые показывает формат отчета
+        report_format = Settings.get_value("report_format", "new")
+        response = get_daily_report(client_id, client_secret, allow_stale=True, report_format=report_format)
 
         # Удаляем сообщение о загрузке после получения данных
         bot.delete_message(chat_id, loading_message.message_id)
@@ -279,10 +302,10 @@ def daily_report_for_account(chat_id, account_id):
         # Иначе берем расход из аккаунта
         else:
             expenses_total = getattr(account, 'daily_expense', 0)
-        AvitoAccountDailyStats.objects.update_or_create(
-            avito_account_id=account_id,
-            date=today_date,
-            defaults={
+        # Устаревший отчет из кэша не сохраняем: свежий сохранится при следующем запросе.
+        # Отчет с недоступными данными тоже: вместо них в нем нули
+        if 'stale_age' not in response and not response.get('unavailable'):
+            defaults = available_stats_defaults(response, {
                 'total_calls': response.get('calls', {}).get('total', 0),
                 'answered_calls': response.get('calls', {}).get('answered', 0),
                 'missed_calls': response.get('calls', {}).get('missed', 0),
@@ -303,21 +326,27 @@ def daily_report_for_account(chat_id, account_id):
                 'balance_bonus': response.get('balance_bonus', 0),
                 'advance': response.get('advance', 0),
                 'daily_expense': expenses_total
-            }
-        )
+            })
+            # Отчет урезанного формата заполняет не все показатели
+            if not response.get('skipped'):
+                defaults['complete'] = True
+            AvitoAccountDailyStats.objects.update_or_create(
+                avito_account_id=account_id,
+                date=today_date,
+                defaults=defaults
+            )
         
         # Получаем статистику за предыдущий день
         previous_stats = get_previous_day_stats(account_id, today_date)
         
-        # Проверяем текущий формат отчета
-        report_format = Settings.get_value("report_format", "new")
-        
         # Используем соответствующий формат отчета
         if report_format == "new":
             message_text = format_daily_report_new(account, response, previous_stats)
         else:
             message_text = format_daily_report_standard(account, response, previous_stats)
         
+        message_text += format_unavailable_notice(response)
+        message_text += format_stale_notice(response)
         bot.send_message(chat_id, message_text, parse_mode="Markdown")
         
     except AvitoAccount.DoesNotExist:
@@ -342,7 +371,9 @@ def weekly_report_for_account(chat_id, account_id):
         account = AvitoAccount.objects.get(id=account_id)
         client_id = account.client_id
         client_secret = account.client_secret
-        response = get_weekly_statistics(client_id, client_secret)
+        # Запрашиваем только данные, которые показывает формат отчета
+        report_format = Settings.get_value("report_format", "new")
+        response = get_weekly_report(client_id, client_secret, allow_stale=True, report_format=report_format)
         
         # Удаляем сообщение о загрузке после получения данных
         bot.delete_message(chat_id, loading_message.message_id)
@@ -353,9 +384,6 @@ def weekly_report_for_account(chat_id, account_id):
         # Получаем статистику за предыдущую неделю
         previous_week_stats = get_previous_week_stats(account_id, current_date)
         
-        # Проверяем текущий формат отчета
-        report_format = Settings.get_value("report_format", "new")
-        
         # Используем соответствующий формат отчета
         if report_format == "new":
             message_text = format_weekly_report_new(account, response, previous_week_stats)
@@ -456,6 +484,8 @@ def weekly_report_for_account(chat_id, account_id):
                 percentage = calculate_percentage_change(account.weekly_expense, previous_week_stats.daily_expense)
                 message_text += f"\n*Изменение расходов: {format_percentage_change(percentage)}*"
         
+        message_text += format_unavailable_notice(response)
+        message_text += format_stale_notice(response)
         bot.send_message(chat_id, message_text, parse_mode="Markdown")
         
     except AvitoAccount.DoesNotExist:
@@ -589,6 +619,7 @@ def send_weekly_report(telegram_id, account_id):
                 message_text += f"\n*Изменение расходов: {format_percentage_change(percentage)}*"
         
         # Отправляем отчет на указанный ID для недельных отчетов
+        message_text += format_unavailable_notice(response)
         bot.send_message(telegram_id, message_text, parse_mode="Markdown")
         
     except AvitoAccount.DoesNotExist:
@@ -621,6 +652,7 @@ def send_daily_report(telegram_id, account_id):
         else:
             message_text = format_daily_report_standard(account, response, previous_stats)
         
+        message_text += format_unavailable_notice(response)
         bot.send_message(telegram_id, message_text, parse_mode="Markdown")
         
     except AvitoAccount.DoesNotExist:
@@ -683,141 +715,61 @@ def get_historical_stats(account_id, days=7):
         days: Количество дней для выборки (по умолчанию 7)
         
     Returns:
-        dict: Словарь со статистикой по дням
+        dict: Словарь с итогами за период и историей по дням (StatsHistory)
     """
     try:
         # Проверяем существование аккаунта
         account = AvitoAccount.objects.get(id=account_id)
         
-        # Получаем текущую дату
+        # Период заканчивается вчерашним днем
         today = timezone.now().date()
         start_date = today - datetime.timedelta(days=days)
+        end_date = today - datetime.timedelta(days=1)
         
-        # Получаем все записи статистики для данного аккаунта за указанный период
-        stats = AvitoAccountDailyStats.objects.filter(
-            avito_account=account,
-            date__gte=start_date,
-            date__lt=today
-        ).order_by('date')
+        # Все нужные столбцы за период одним запросом
+        history = load_history(account.id, start_date, end_date)
         
         # Если нет данных статистики, возвращаем пустой словарь
-        if not stats.exists():
-            # Попробуем получить хотя бы последние доступные данные
-            last_stats = AvitoAccountDailyStats.objects.filter(
-                avito_account=account
-            ).order_by('-date').first()
-            
-            if last_stats:
-                logger.info(f"Нет данных за последние {days} дней, но найдены данные за {last_stats.date} для аккаунта {account.name}")
-            else:
-                logger.info(f"Нет исторической статистики для аккаунта {account.name}")
-            
-            # В любом случае возвращаем пустой словарь
+        if not history.days_with_data:
+            logger.info(f"Нет исторической статистики для аккаунта {account.name} за последние {days} дней")
             return {}
         
-        # Сначала подготовим полный список всех дат в запрошенном периоде
-        all_dates = []
-        current_date = start_date
-        while current_date < today:
-            all_dates.append(current_date)
-            current_date = current_date + datetime.timedelta(days=1)
-            
-        # Создадим словарь {дата: данные} для быстрого доступа
-        stats_by_date = {stat.date: stat for stat in stats}
+        totals = history.totals()
+        averages = history.averages()
         
-        # Формируем результат
         result = {
             "account_name": account.name,
-            "period": f"{start_date} - {today - datetime.timedelta(days=1)}",
-            "days_count": days,
-            "days": [],
-            "days_with_data": stats.count(),
-            "days_missing": days - stats.count()
-        }
-        
-        # Добавляем статистику по всем дням в периоде
-        # (включая дни без данных, чтобы сохранить хронологию)
-        for date in all_dates:
-            if date in stats_by_date:
-                stat = stats_by_date[date]
-                day_stats = {
-                    "date": date.strftime("%Y-%m-%d"),
-                    "has_data": True,
-                    "calls": {
-                        "total": stat.total_calls,
-                        "answered": stat.answered_calls,
-                        "missed": stat.missed_calls
-                    },
-                    "chats": {
-                        "total": stat.total_chats,
-                        "new": stat.new_chats
-                    },
-                    "phones_received": stat.phones_received,
-                    "rating": stat.rating,
-                    "reviews": {
-                        "total": stat.total_reviews,
-                        "daily": stat.daily_reviews
-                    },
-                    "items": {
-                        "total": stat.total_items,
-                        "with_xl_promotion": stat.xl_promotion_count
-                    },
-                    "statistics": {
-                        "views": stat.views,
-                        "contacts": stat.contacts,
-                        "favorites": stat.favorites
-                    },
-                    "finance": {
-                        "balance_real": stat.balance_real,
-                        "balance_bonus": stat.balance_bonus,
-                        "advance": stat.advance,
-                        "expense": stat.daily_expense
-                    },
-                    "expenses_details": stat.get_expenses_details()
-                }
-            else:
-                # Если данных за этот день нет, добавляем заглушку
-                day_stats = {
-                    "date": date.strftime("%Y-%m-%d"),
-                    "has_data": False
-                }
-            
-            result["days"].append(day_stats)
-        
-        # Добавляем суммарную статистику за весь период
-        # Учитываем только дни, для которых есть данные
-        days_with_data = [day for day in result["days"] if day.get("has_data", False)]
-        
-        if days_with_data:
-            total_stats = {
+            "period": f"{start_date} - {end_date}",
+            "days_count": history.days_count,
+            "days_with_data": history.days_with_data,
+            "days_missing": history.days_missing,
+            "history": history,
+            # Суммарная статистика учитывает только дни, для которых есть данные
+            "total": {
                 "calls": {
-                    "total": sum(day["calls"]["total"] for day in days_with_data),
-                    "answered": sum(day["calls"]["answered"] for day in days_with_data),
-                    "missed": sum(day["calls"]["missed"] for day in days_with_data)
+                    "total": int(totals["total_calls"]),
+                    "answered": int(totals["answered_calls"]),
+                    "missed": int(totals["missed_calls"])
                 },
                 "chats": {
-                    "total": sum(day["chats"]["total"] for day in days_with_data)
+                    "total": int(totals["total_chats"])
                 },
-                "phones_received": sum(day["phones_received"] for day in days_with_data),
+                "phones_received": int(totals["phones_received"]),
                 "statistics": {
-                    "views": sum(day["statistics"]["views"] for day in days_with_data),
-                    "contacts": sum(day["statistics"]["contacts"] for day in days_with_data),
-                    "favorites": sum(day["statistics"]["favorites"] for day in days_with_data)
+                    "views": int(totals["views"]),
+                    "contacts": int(totals["contacts"]),
+                    "favorites": int(totals["favorites"])
                 },
-                "daily_reviews": sum(day["reviews"]["daily"] for day in days_with_data),
-                "expenses": sum(day["finance"]["expense"] for day in days_with_data)
-            }
-            
-            # Добавляем среднедневные значения
-            if result["days_with_data"] > 0:
-                total_stats["daily_avg"] = {
-                    "calls": round(total_stats["calls"]["total"] / result["days_with_data"], 1),
-                    "views": round(total_stats["statistics"]["views"] / result["days_with_data"], 1),
-                    "contacts": round(total_stats["statistics"]["contacts"] / result["days_with_data"], 1),
-                    "expenses": round(total_stats["expenses"] / result["days_with_data"], 2)
+                "daily_reviews": int(totals["daily_reviews"]),
+                "expenses": totals["daily_expense"],
+                "daily_avg": {
+                    "calls": round(averages["total_calls"], 1),
+                    "views": round(averages["views"], 1),
+                    "contacts": round(averages["contacts"], 1),
+                    "expenses": round(averages["daily_expense"], 2)
                 }
-            
-            result["total"] = total_stats
+            }
+        }
         
         logger.info(f"Получена историческая статистика для аккаунта {account.name} за {days} дней")
         return result
@@ -829,6 +781,12 @@ def get_historical_stats(account_id, days=7):
         logger.error(f"Ошибка при получении исторической статистики: {e}")
         return {}
 
+def format_delta(delta):
+    """Изменение к предыдущему дню в скобках или пустая строка, если оно неизвестно"""
+    if math.isnan(delta):
+        return ""
+    return f" ({delta:+.0f})"
+
 def format_historical_stats_message(stats_data):
     """
     Форматирует историческую статистику для сообщения
@@ -884,28 +842,38 @@ def format_historical_stats_message(stats_data):
     # Добавляем статистику по дням в обратном порядке (от новых к старым)
     message += f"📅 *Статистика по дням:*\n"
     
-    # Фильтруем только дни с данными
-    days_with_data = [day for day in stats_data.get('days', []) if day.get('has_data', False)]
+    history = stats_data.get('history')
+    if history is None:
+        return message
     
     # Ограничиваем количество дней в детализации
     max_days_in_details = 10
-    days_to_show = days_with_data[-max_days_in_details:] if len(days_with_data) > max_days_in_details else days_with_data
-    days_to_show = list(reversed(days_to_show))  # Сортируем от новых к старым
+    days_to_show = history.recent_days(max_days_in_details)  # От новых к старым
     
     # Если данных слишком много, добавим примечание
-    if len(days_with_data) > max_days_in_details:
-        message += f"_(показаны последние {max_days_in_details} дней из {len(days_with_data)})_\n"
-    
-    for day in days_to_show:
-        date = day.get('date', '')
-        calls = day.get('calls', {}).get('total', 0)
-        views = day.get('statistics', {}).get('views', 0)
-        contacts = day.get('statistics', {}).get('contacts', 0)
-        expense = day.get('finance', {}).get('expense', 0)
+    if history.days_with_data > max_days_in_details:
+        message += f"_(показаны последние {max_days_in_details} дней из {history.days_with_data})_\n"
+    
+    # Изменения к предыдущему дню считаются сразу для всего периода
+    deltas = history.deltas()
+    calls = history.column('total_calls')
+    views = history.column('views')
+    contacts = history.column('contacts')
+    expenses = history.column('daily_expense')
+    calls_delta = deltas[:, history.fields.index('total_calls')]
+    views_delta = deltas[:, history.fields.index('views')]
+    contacts_delta = deltas[:, history.fields.index('contacts')]
+    
+    for position in days_to_show:
+        date = str(history.dates[position])
         
         message += f"\n*{date}*:\n"
-        message += f"   • Звонки: {calls}, Просмотры: {views}, Контакты: {contacts}\n"
-        message += f"   • Расходы: {expense:.2f} ₽\n"
+        message += (
+            f"   • Звонки: {calls[position]:.0f}{format_delta(calls_delta[position])}, "
+            f"Просмотры: {views[position]:.0f}{format_delta(views_delta[position])}, "
+            f"Контакты: {contacts[position]:.0f}{format_delta(contacts_delta[position])}\n"
+        )
+        message += f"   • Расходы: {expenses[position]:.2f} ₽\n"
     
     return message
 
@@ -0,0 +1,37 @@
+import logging
+from django.core.management.base import BaseCommand
+from bot.models import AvitoAccount, AvitoAccountDailyStats, AvitoAccountWeeklyStats, AvitoAccountMonthlyStats, refresh_stats_rollups
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает недельные и месячные итоги статистики по сохраненной дневной статистике'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--account', type=int, help='ID аккаунта Авито (по умолчанию все аккаунты)')
+
+    def handle(self, *args, **options):
+        accounts = AvitoAccount.objects.all()
+        if options['account']:
+            accounts = accounts.filter(id=options['account'])
+
+        self.stdout.write(f'Пересчет итогов статистики для аккаунтов: {accounts.count()}')
+        for account in accounts:
+            try:
+                self.rebuild_account(account)
+            except Exception as e:
+                logger.error(f"Ошибка при пересчете итогов статистики аккаунта {account.name}: {e}")
+        self.stdout.write(self.style.SUCCESS('Итоги статистики пересчитаны'))
+
+    def rebuild_account(self, account):
+        """Удаляет итоги аккаунта и строит их заново по всем дням со статистикой"""
+        AvitoAccountWeeklyStats.objects.filter(avito_account=account).delete()
+        AvitoAccountMonthlyStats.objects.filter(avito_account=account).delete()
+        days = list(AvitoAccountDailyStats.objects.filter(avito_account=account).values_list('date', flat=True))
+        refresh_stats_rollups(account.id, days)
+        self.stdout.write(
+            f"Аккаунт {account.name}: дней {len(days)}, "
+            f"недель {AvitoAccountWeeklyStats.objects.filter(avito_account=account).count()}, "
+            f"месяцев {AvitoAccountMonthlyStats.objects.filter(avito_account=account).count()}"
+        )
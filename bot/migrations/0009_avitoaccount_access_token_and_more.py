@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0008_settings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='avitoaccount',
+            name='access_token',
+            field=models.CharField(blank=True, max_length=255, null=True, verbose_name='Токен доступа API Авито'),
+        ),
+        migrations.AddField(
+            model_name='avitoaccount',
+            name='access_token_expires_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Срок действия токена'),
+        ),
+    ]
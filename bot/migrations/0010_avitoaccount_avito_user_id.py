@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0009_avitoaccount_access_token_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='avitoaccount',
+            name='avito_user_id',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='ID пользователя Авито'),
+        ),
+    ]
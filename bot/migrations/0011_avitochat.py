@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0010_avitoaccount_avito_user_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvitoChat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField(verbose_name='ID пользователя Авито')),
+                ('chat_id', models.CharField(max_length=100, verbose_name='ID чата')),
+                ('created', models.DateTimeField(blank=True, null=True, verbose_name='Время создания')),
+                ('last_message_time', models.DateTimeField(verbose_name='Время последнего сообщения')),
+            ],
+            options={
+                'verbose_name': 'Чат Авито',
+                'verbose_name_plural': 'Чаты Авито',
+                'indexes': [models.Index(fields=['user_id', 'last_message_time'], name='bot_avitoch_user_id_51c758_idx')],
+                'unique_together': {('user_id', 'chat_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0011_avitochat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvitoCall',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField(verbose_name='ID пользователя Авито')),
+                ('call_id', models.CharField(max_length=100, verbose_name='ID звонка')),
+                ('call_time', models.DateTimeField(verbose_name='Время звонка')),
+                ('talk_duration', models.IntegerField(default=0, verbose_name='Длительность разговора')),
+            ],
+            options={
+                'verbose_name': 'Звонок Авито',
+                'verbose_name_plural': 'Звонки Авито',
+                'indexes': [models.Index(fields=['user_id', 'call_time'], name='bot_avitoca_user_id_38efc5_idx')],
+                'unique_together': {('user_id', 'call_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='AvitoSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField(verbose_name='ID пользователя Авито')),
+                ('source', models.CharField(max_length=50, verbose_name='Источник данных')),
+                ('synced_from', models.DateTimeField(blank=True, null=True, verbose_name='Загружено с')),
+                ('synced_to', models.DateTimeField(blank=True, null=True, verbose_name='Загружено по')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Состояние синхронизации',
+                'verbose_name_plural': 'Состояния синхронизации',
+                'unique_together': {('user_id', 'source')},
+            },
+        ),
+    ]
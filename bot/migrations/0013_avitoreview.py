@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0012_avitocall_avitosyncstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvitoReview',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField(verbose_name='ID пользователя Авито')),
+                ('review_id', models.CharField(max_length=100, verbose_name='ID отзыва')),
+                ('created_at', models.DateTimeField(verbose_name='Время создания')),
+            ],
+            options={
+                'verbose_name': 'Отзыв Авито',
+                'verbose_name_plural': 'Отзывы Авито',
+                'indexes': [models.Index(fields=['user_id', 'created_at'], name='bot_avitore_user_id_c7dce6_idx')],
+                'unique_together': {('user_id', 'review_id')},
+            },
+        ),
+    ]
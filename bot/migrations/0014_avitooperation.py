@@ -0,0 +1,35 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0013_avitoreview'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvitoOperation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField(verbose_name='ID пользователя Авито')),
+                ('operation_id', models.CharField(max_length=64, verbose_name='ID операции')),
+                ('operation_time', models.DateTimeField(verbose_name='Время операции')),
+                ('operation_type', models.CharField(blank=True, max_length=255, verbose_name='Тип операции')),
+                ('operation_name', models.CharField(blank=True, max_length=255, verbose_name='Название операции')),
+                ('service_name', models.CharField(blank=True, max_length=255, verbose_name='Услуга')),
+                ('service_type', models.CharField(blank=True, max_length=255, verbose_name='Тип услуги')),
+                ('item_id', models.CharField(blank=True, max_length=50, verbose_name='ID объявления')),
+                ('amount_rub', models.FloatField(default=0, verbose_name='Сумма, руб.')),
+                ('is_expense', models.BooleanField(default=False, verbose_name='Расход')),
+            ],
+            options={
+                'verbose_name': 'Операция Авито',
+                'verbose_name_plural': 'Операции Авито',
+                'indexes': [models.Index(fields=['user_id', 'is_expense', 'operation_time'], name='bot_avitoop_user_id_2ddefe_idx')],
+                'unique_together': {('user_id', 'operation_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0014_avitooperation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='avitoaccountdailystats',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True, verbose_name='Обновлено'),
+        ),
+    ]
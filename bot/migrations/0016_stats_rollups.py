@@ -0,0 +1,72 @@
+# Generated by Django 5.1.6 on 2026-10-18 15:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0015_avitoaccountdailystats_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvitoAccountMonthlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateField(verbose_name='Начало периода')),
+                ('days_count', models.IntegerField(default=0, verbose_name='Дней со статистикой')),
+                ('total_calls', models.IntegerField(default=0, verbose_name='Всего звонков')),
+                ('answered_calls', models.IntegerField(default=0, verbose_name='Отвеченные звонки')),
+                ('missed_calls', models.IntegerField(default=0, verbose_name='Пропущенные звонки')),
+                ('total_chats', models.IntegerField(default=0, verbose_name='Всего чатов')),
+                ('new_chats', models.IntegerField(default=0, verbose_name='Новые чаты')),
+                ('phones_received', models.IntegerField(default=0, verbose_name='Показы телефона')),
+                ('views', models.IntegerField(default=0, verbose_name='Просмотры')),
+                ('contacts', models.IntegerField(default=0, verbose_name='Контакты')),
+                ('favorites', models.IntegerField(default=0, verbose_name='В избранном')),
+                ('impressions', models.IntegerField(default=0, verbose_name='Показы')),
+                ('daily_reviews', models.IntegerField(default=0, verbose_name='Новые отзывы')),
+                ('daily_expense', models.FloatField(default=0, verbose_name='Расходы')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('avito_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='bot.avitoaccount', verbose_name='Аккаунт Авито')),
+            ],
+            options={
+                'verbose_name': 'Месячная статистика аккаунта',
+                'verbose_name_plural': 'Месячная статистика аккаунтов',
+                'ordering': ['-period_start'],
+                'abstract': False,
+                'unique_together': {('avito_account', 'period_start')},
+            },
+        ),
+        migrations.CreateModel(
+            name='AvitoAccountWeeklyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateField(verbose_name='Начало периода')),
+                ('days_count', models.IntegerField(default=0, verbose_name='Дней со статистикой')),
+                ('total_calls', models.IntegerField(default=0, verbose_name='Всего звонков')),
+                ('answered_calls', models.IntegerField(default=0, verbose_name='Отвеченные звонки')),
+                ('missed_calls', models.IntegerField(default=0, verbose_name='Пропущенные звонки')),
+                ('total_chats', models.IntegerField(default=0, verbose_name='Всего чатов')),
+                ('new_chats', models.IntegerField(default=0, verbose_name='Новые чаты')),
+                ('phones_received', models.IntegerField(default=0, verbose_name='Показы телефона')),
+                ('views', models.IntegerField(default=0, verbose_name='Просмотры')),
+                ('contacts', models.IntegerField(default=0, verbose_name='Контакты')),
+                ('favorites', models.IntegerField(default=0, verbose_name='В избранном')),
+                ('impressions', models.IntegerField(default=0, verbose_name='Показы')),
+                ('daily_reviews', models.IntegerField(default=0, verbose_name='Новые отзывы')),
+                ('daily_expense', models.FloatField(default=0, verbose_name='Расходы')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('avito_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='bot.avitoaccount', verbose_name='Аккаунт Авито')),
+            ],
+            options={
+                'verbose_name': 'Недельная статистика аккаунта',
+                'verbose_name_plural': 'Недельная статистика аккаунтов',
+                'ordering': ['-period_start'],
+                'abstract': False,
+                'unique_together': {('avito_account', 'period_start')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0016_stats_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvitoBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ts', models.DateTimeField(verbose_name='Время показания')),
+                ('real', models.FloatField(default=0, verbose_name='Реальный баланс')),
+                ('bonus', models.FloatField(default=0, verbose_name='Бонусы')),
+                ('advance', models.FloatField(default=0, verbose_name='Аванс')),
+                ('resolution', models.PositiveIntegerField(default=60, verbose_name='Разрешение, с')),
+                ('avito_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='bot.avitoaccount', verbose_name='Аккаунт Авито')),
+            ],
+            options={
+                'verbose_name': 'Показание баланса',
+                'verbose_name_plural': 'Показания баланса',
+                'indexes': [models.Index(fields=['avito_account', 'ts'], name='bot_avitoba_avito_a_bc5a20_idx'), models.Index(fields=['resolution', 'ts'], name='bot_avitoba_resolut_b9fdb8_idx')],
+            },
+        ),
+    ]
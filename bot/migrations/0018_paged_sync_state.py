@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0017_balance_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='avitosyncstate',
+            name='resume_mark',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Самая новая запись незавершенной загрузки'),
+        ),
+        migrations.AddField(
+            model_name='avitosyncstate',
+            name='resume_offset',
+            field=models.IntegerField(default=0, verbose_name='Смещение для продолжения загрузки'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0018_paged_sync_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='avitoaccountdailystats',
+            name='complete',
+            field=models.BooleanField(default=False, verbose_name='Все показатели получены'),
+        ),
+    ]
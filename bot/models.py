@@ -1,4 +1,5 @@
 from django.db import models
+import calendar
 import datetime
 import json
 
@@ -70,7 +71,25 @@ class AvitoAccount(models.Model):
         null=True,
         blank=True,
     )
-    
+    # Кэш OAuth-токена, общий для cron-процессов и воркеров вебхука
+    access_token = models.CharField(
+        max_length=255,
+        verbose_name='Токен доступа API Авито',
+        null=True,
+        blank=True,
+    )
+    access_token_expires_at = models.DateTimeField(
+        verbose_name='Срок действия токена',
+        null=True,
+        blank=True,
+    )
+    # ID пользователя в Авито не меняется, поэтому запрашиваем его один раз
+    avito_user_id = models.BigIntegerField(
+        verbose_name='ID пользователя Авито',
+        null=True,
+        blank=True,
+    )
+
     class Meta:
         verbose_name = 'Аккаунт Авито'
         verbose_name_plural = 'Аккаунты Авито'
@@ -102,6 +121,50 @@ class UserAvitoAccount(models.Model):
         return f"{self.user.user_name} - {self.avito_account.name}"
 
 
+class AvitoAccountDailyStatsQuerySet(models.QuerySet):
+    """
+    Запросы дневной статистики, которые пересчитывают итоги затронутых периодов
+
+    update(), delete(), bulk_create() и bulk_update() не вызывают save(),
+    поэтому итоги (см. refresh_stats_rollups) пересчитываются здесь.
+    """
+
+    def affected_days(self):
+        """{ID аккаунта: даты} строк запроса"""
+        days = {}
+        for account_id, date in self.values_list('avito_account_id', 'date').distinct():
+            days.setdefault(account_id, set()).add(date)
+        return days
+
+    def update(self, **kwargs):
+        if not ROLLUP_SOURCE_FIELDS.intersection(kwargs):
+            return super().update(**kwargs)
+        pks = list(self.values_list('pk', flat=True))
+        affected = self.model.objects.filter(pk__in=pks).affected_days()
+        result = super().update(**kwargs)
+        # Дата или аккаунт могли измениться: итоги новых периодов тоже пересчитываем
+        for account_id, days in self.model.objects.filter(pk__in=pks).affected_days().items():
+            affected.setdefault(account_id, set()).update(days)
+        refresh_affected_rollups(affected)
+        return result
+
+    def delete(self):
+        affected = self.affected_days()
+        result = super().delete()
+        refresh_affected_rollups(affected)
+        return result
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        refresh_affected_rollups(rows_days(objs))
+        return objs
+
+    def bulk_update(self, objs, *args, **kwargs):
+        result = super().bulk_update(objs, *args, **kwargs)
+        refresh_affected_rollups(rows_days(objs))
+        return result
+
+
 class AvitoAccountDailyStats(models.Model):
     """Модель для хранения ежедневной статистики аккаунта Авито"""
     avito_account = models.ForeignKey(
@@ -205,6 +268,17 @@ class AvitoAccountDailyStats(models.Model):
         verbose_name='Расход за день',
         default=0
     )
+    # Строки из отчетов с недоступными или не запрошенными данными содержат нули
+    # вместо части показателей, отчеты за период их не используют (см. bot.stored_stats)
+    complete = models.BooleanField(
+        verbose_name='Все показатели получены',
+        default=False
+    )
+    updated_at = models.DateTimeField(
+        verbose_name='Обновлено',
+        auto_now=True,
+        null=True
+    )
     
     class Meta:
         verbose_name = 'Ежедневная статистика аккаунта'
@@ -217,6 +291,382 @@ class AvitoAccountDailyStats(models.Model):
     def __str__(self):
         return f"Статистика {self.avito_account.name} за {self.date}"
 
+    objects = AvitoAccountDailyStatsQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        refresh_stats_rollups(self.avito_account_id, [self.date])
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        refresh_stats_rollups(self.avito_account_id, [self.date])
+        return result
+
+
+def week_bounds(day):
+    """Понедельник и воскресенье недели, в которую попадает day"""
+    start = day - datetime.timedelta(days=day.weekday())
+    return start, start + datetime.timedelta(days=6)
+
+
+def month_bounds(day):
+    """Первый и последний день месяца, в который попадает day"""
+    start = day.replace(day=1)
+    return start, start.replace(day=calendar.monthrange(start.year, start.month)[1])
+
+
+# Поля дневной статистики, которые суммируются в недельных и месячных итогах
+ROLLUP_FIELDS = (
+    'total_calls', 'answered_calls', 'missed_calls', 'total_chats', 'new_chats', 'phones_received',
+    'views', 'contacts', 'favorites', 'impressions', 'daily_reviews', 'daily_expense',
+)
+# Поля, от изменения которых зависят итоги
+ROLLUP_SOURCE_FIELDS = frozenset(ROLLUP_FIELDS + ('date', 'avito_account', 'avito_account_id'))
+
+
+class AvitoAccountStatsRollup(models.Model):
+    """
+    Итоги дневной статистики аккаунта за период
+
+    Пересчитываются при каждой записи или удалении дневной статистики
+    (save(), delete() и запросы AvitoAccountDailyStatsQuerySet), но только
+    для периодов, в которые попадают затронутые дни (см. refresh_stats_rollups).
+    Названия полей совпадают с AvitoAccountDailyStats, поэтому итоги можно
+    сравнивать с отчетом так же, как дневную статистику.
+
+    Подкласс задает период атрибутом period_bounds - функцией, которая
+    возвращает первый и последний день периода, содержащего день.
+    """
+    avito_account = models.ForeignKey(
+        AvitoAccount,
+        on_delete=models.CASCADE,
+        verbose_name='Аккаунт Авито'
+    )
+    period_start = models.DateField(
+        verbose_name='Начало периода'
+    )
+    days_count = models.IntegerField(
+        verbose_name='Дней со статистикой',
+        default=0
+    )
+    total_calls = models.IntegerField(verbose_name='Всего звонков', default=0)
+    answered_calls = models.IntegerField(verbose_name='Отвеченные звонки', default=0)
+    missed_calls = models.IntegerField(verbose_name='Пропущенные звонки', default=0)
+    total_chats = models.IntegerField(verbose_name='Всего чатов', default=0)
+    new_chats = models.IntegerField(verbose_name='Новые чаты', default=0)
+    phones_received = models.IntegerField(verbose_name='Показы телефона', default=0)
+    views = models.IntegerField(verbose_name='Просмотры', default=0)
+    contacts = models.IntegerField(verbose_name='Контакты', default=0)
+    favorites = models.IntegerField(verbose_name='В избранном', default=0)
+    impressions = models.IntegerField(verbose_name='Показы', default=0)
+    daily_reviews = models.IntegerField(verbose_name='Новые отзывы', default=0)
+    daily_expense = models.FloatField(verbose_name='Расходы', default=0)
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата обновления'
+    )
+
+    class Meta:
+        abstract = True
+        unique_together = ('avito_account', 'period_start')
+        ordering = ['-period_start']
+
+    @classmethod
+    def for_day(cls, account_id, day):
+        """Итоги периода, в который попадает day, или None"""
+        return cls.objects.filter(avito_account_id=account_id, period_start=cls.period_bounds(day)[0]).first()
+
+    @classmethod
+    def refresh(cls, account_id, days):
+        """Пересчитывает итоги периодов, в которые попадают дни days"""
+        for start in sorted({cls.period_bounds(day)[0] for day in days}):
+            first_day, last_day = cls.period_bounds(start)
+            sums = AvitoAccountDailyStats.objects.filter(
+                avito_account_id=account_id, date__range=(first_day, last_day)
+            ).aggregate(*(models.Sum(field) for field in ROLLUP_FIELDS), days_count=models.Count('id'))
+            if not sums['days_count']:
+                cls.objects.filter(avito_account_id=account_id, period_start=start).delete()
+                continue
+            defaults = {field: sums[f'{field}__sum'] or 0 for field in ROLLUP_FIELDS}
+            defaults['days_count'] = sums['days_count']
+            cls.objects.update_or_create(avito_account_id=account_id, period_start=start, defaults=defaults)
+
+
+class AvitoAccountWeeklyStats(AvitoAccountStatsRollup):
+    """Итоги статистики аккаунта за неделю (с понедельника по воскресенье)"""
+
+    class Meta(AvitoAccountStatsRollup.Meta):
+        verbose_name = 'Недельная статистика аккаунта'
+        verbose_name_plural = 'Недельная статистика аккаунтов'
+
+    def __str__(self):
+        return f"Статистика {self.avito_account.name} за неделю с {self.period_start}"
+
+    period_bounds = staticmethod(week_bounds)
+
+
+class AvitoAccountMonthlyStats(AvitoAccountStatsRollup):
+    """Итоги статистики аккаунта за календарный месяц"""
+
+    class Meta(AvitoAccountStatsRollup.Meta):
+        verbose_name = 'Месячная статистика аккаунта'
+        verbose_name_plural = 'Месячная статистика аккаунтов'
+
+    def __str__(self):
+        return f"Статистика {self.avito_account.name} за {self.period_start:%m.%Y}"
+
+    period_bounds = staticmethod(month_bounds)
+
+
+def refresh_stats_rollups(account_id, days):
+    """Пересчитывает недельные и месячные итоги аккаунта для дней days"""
+    for rollup in (AvitoAccountWeeklyStats, AvitoAccountMonthlyStats):
+        rollup.refresh(account_id, days)
+
+
+def refresh_affected_rollups(affected):
+    """Пересчитывает итоги по {ID аккаунта: дни}"""
+    for account_id, days in affected.items():
+        refresh_stats_rollups(account_id, days)
+
+
+def rows_days(rows):
+    """{ID аккаунта: даты} строк дневной статистики"""
+    days = {}
+    for row in rows:
+        days.setdefault(row.avito_account_id, set()).add(row.date)
+    return days
+
+
+class AvitoChat(models.Model):
+    """Чат аккаунта Авито в локальном индексе (см. bot.chat_index)"""
+    user_id = models.BigIntegerField(
+        verbose_name='ID пользователя Авито'
+    )
+    chat_id = models.CharField(
+        max_length=100,
+        verbose_name='ID чата'
+    )
+    created = models.DateTimeField(
+        verbose_name='Время создания',
+        null=True,
+        blank=True
+    )
+    last_message_time = models.DateTimeField(
+        verbose_name='Время последнего сообщения'
+    )
+
+    class Meta:
+        verbose_name = 'Чат Авито'
+        verbose_name_plural = 'Чаты Авито'
+        unique_together = ('user_id', 'chat_id')
+        indexes = [
+            models.Index(fields=['user_id', 'last_message_time']),
+        ]
+
+    def __str__(self):
+        return f"Чат {self.chat_id} пользователя {self.user_id}"
+
+
+class AvitoCall(models.Model):
+    """Звонок аккаунта Авито в локальной копии данных calltracking (см. bot.calls_store)"""
+    user_id = models.BigIntegerField(
+        verbose_name='ID пользователя Авито'
+    )
+    call_id = models.CharField(
+        max_length=100,
+        verbose_name='ID звонка'
+    )
+    call_time = models.DateTimeField(
+        verbose_name='Время звонка'
+    )
+    talk_duration = models.IntegerField(
+        verbose_name='Длительность разговора',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'Звонок Авито'
+        verbose_name_plural = 'Звонки Авито'
+        unique_together = ('user_id', 'call_id')
+        indexes = [
+            models.Index(fields=['user_id', 'call_time']),
+        ]
+
+    def __str__(self):
+        return f"Звонок {self.call_id} пользователя {self.user_id}"
+
+
+class AvitoReview(models.Model):
+    """Отзыв об аккаунте Авито в локальной копии (см. bot.reviews_store)"""
+    user_id = models.BigIntegerField(
+        verbose_name='ID пользователя Авито'
+    )
+    review_id = models.CharField(
+        max_length=100,
+        verbose_name='ID отзыва'
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Время создания'
+    )
+
+    class Meta:
+        verbose_name = 'Отзыв Авито'
+        verbose_name_plural = 'Отзывы Авито'
+        unique_together = ('user_id', 'review_id')
+        indexes = [
+            models.Index(fields=['user_id', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Отзыв {self.review_id} пользователя {self.user_id}"
+
+
+class AvitoOperation(models.Model):
+    """Операция по счету аккаунта Авито в журнале операций (см. bot.operations_ledger)"""
+    user_id = models.BigIntegerField(
+        verbose_name='ID пользователя Авито'
+    )
+    operation_id = models.CharField(
+        max_length=64,
+        verbose_name='ID операции'
+    )
+    operation_time = models.DateTimeField(
+        verbose_name='Время операции'
+    )
+    operation_type = models.CharField(
+        max_length=255,
+        verbose_name='Тип операции',
+        blank=True
+    )
+    operation_name = models.CharField(
+        max_length=255,
+        verbose_name='Название операции',
+        blank=True
+    )
+    service_name = models.CharField(
+        max_length=255,
+        verbose_name='Услуга',
+        blank=True
+    )
+    service_type = models.CharField(
+        max_length=255,
+        verbose_name='Тип услуги',
+        blank=True
+    )
+    item_id = models.CharField(
+        max_length=50,
+        verbose_name='ID объявления',
+        blank=True
+    )
+    amount_rub = models.FloatField(
+        verbose_name='Сумма, руб.',
+        default=0
+    )
+    is_expense = models.BooleanField(
+        verbose_name='Расход',
+        default=False
+    )
+
+    class Meta:
+        verbose_name = 'Операция Авито'
+        verbose_name_plural = 'Операции Авито'
+        unique_together = ('user_id', 'operation_id')
+        indexes = [
+            models.Index(fields=['user_id', 'is_expense', 'operation_time']),
+        ]
+
+    def __str__(self):
+        return f"{self.operation_type} {self.amount_rub} руб. ({self.operation_time})"
+
+
+class AvitoBalanceSnapshot(models.Model):
+    """
+    Показание баланса аккаунта Авито (см. bot.balance_history)
+
+    Показания записываются каждую минуту и со временем прореживаются:
+    resolution - длина отрезка времени в секундах, последним показанием
+    которого является строка.
+    """
+    avito_account = models.ForeignKey(
+        AvitoAccount,
+        on_delete=models.CASCADE,
+        verbose_name='Аккаунт Авито'
+    )
+    ts = models.DateTimeField(
+        verbose_name='Время показания'
+    )
+    real = models.FloatField(
+        verbose_name='Реальный баланс',
+        default=0
+    )
+    bonus = models.FloatField(
+        verbose_name='Бонусы',
+        default=0
+    )
+    advance = models.FloatField(
+        verbose_name='Аванс',
+        default=0
+    )
+    resolution = models.PositiveIntegerField(
+        verbose_name='Разрешение, с',
+        default=60
+    )
+
+    class Meta:
+        verbose_name = 'Показание баланса'
+        verbose_name_plural = 'Показания баланса'
+        indexes = [
+            models.Index(fields=['avito_account', 'ts']),
+            models.Index(fields=['resolution', 'ts']),
+        ]
+
+    def __str__(self):
+        return f"Баланс {self.avito_account.name} на {self.ts}"
+
+
+class AvitoSyncState(models.Model):
+    """Отрезок времени, за который данные источника уже загружены (см. bot.sync_state)"""
+    user_id = models.BigIntegerField(
+        verbose_name='ID пользователя Авито'
+    )
+    source = models.CharField(
+        max_length=50,
+        verbose_name='Источник данных'
+    )
+    synced_from = models.DateTimeField(
+        verbose_name='Загружено с',
+        null=True,
+        blank=True
+    )
+    synced_to = models.DateTimeField(
+        verbose_name='Загружено по',
+        null=True,
+        blank=True
+    )
+    # Незавершенный проход по списку от новых записей к старым (см. sync_state.begin_paged_sync)
+    resume_offset = models.IntegerField(
+        verbose_name='Смещение для продолжения загрузки',
+        default=0
+    )
+    resume_mark = models.DateTimeField(
+        verbose_name='Самая новая запись незавершенной загрузки',
+        null=True,
+        blank=True
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата обновления'
+    )
+
+    class Meta:
+        verbose_name = 'Состояние синхронизации'
+        verbose_name_plural = 'Состояния синхронизации'
+        unique_together = ('user_id', 'source')
+
+    def __str__(self):
+        return f"{self.source} пользователя {self.user_id}: {self.synced_from} - {self.synced_to}"
+
 
 class Settings(models.Model):
     """Модель для хранения настроек приложения"""
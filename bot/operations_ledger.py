@@ -0,0 +1,224 @@
+"""
+Журнал операций по счету аккаунта Авито.
+
+Операции из operations_history сохраняются в AvitoOperation и больше не
+изменяются (журнал только пополняется). Загрузка продолжается с отметки
+синхронизации (см. bot.sync_state). API отдает не больше OPERATIONS_LIMIT
+операций за запрос, поэтому заполненный ответ означает, что операций
+больше: такой отрезок делится пополам и загружается по частям.
+
+Расходы за любой период считаются агрегирующими запросами к журналу.
+"""
+import collections
+import datetime
+import hashlib
+import json
+import logging
+
+from django.db.models import Count, Max, Sum
+
+from bot.avito_client import PageWalk, walk_pages
+from bot.models import AvitoOperation
+from bot.sync_state import PlannedRanges, parse_time, format_time
+
+logger = logging.getLogger(__name__)
+
+SOURCE = 'operations'
+
+# Максимум операций в одном ответе API
+OPERATIONS_LIMIT = 1000
+
+# Отрезки короче не делим, даже если ответ заполнен
+MIN_WINDOW = datetime.timedelta(minutes=1)
+
+# Типы операций расхода средств (в нижнем регистре)
+EXPENSE_TYPES = frozenset((
+    'резервирование средств под услугу',
+    'списание за услугу',
+    'резервирование средств',
+    'списание средств',
+    'списание',
+    'оплата услуги',
+))
+
+UNKNOWN = 'Неизвестно'
+
+# Поля операции, которые не меняются после ее создания (отпечаток операции без ID)
+OPERATION_KEY_FIELDS = (
+    'createdAt', 'operationType', 'operationName', 'serviceId', 'serviceName', 'serviceType', 'itemId', 'amountRub',
+)
+
+
+def operations_request(access_token, date_from, date_to):
+    return {
+        'method': 'POST',
+        'idempotent': True,  # POST только читает данные
+        'url': 'https://api.avito.ru/core/v1/accounts/operations_history/',
+        'headers': {
+            'Authorization': f'Bearer {access_token}',
+            'Content-Type': 'application/json'
+        },
+        'json': {
+            'dateTimeFrom': date_from,
+            'dateTimeTo': date_to,
+            'limit': OPERATIONS_LIMIT
+        }
+    }
+
+
+def operation_key(operation):
+    """ID операции, а если API его не вернул - отпечаток ее неизменяемых полей"""
+    if operation.get('id') is not None:
+        return str(operation['id'])
+    # Статус и updatedAt меняются, и обновленная операция не должна попасть в журнал второй раз
+    fingerprint = {field: operation.get(field) for field in OPERATION_KEY_FIELDS}
+    return hashlib.sha1(json.dumps(fingerprint, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+def parse_operations(user_id, operations):
+    """Строки AvitoOperation для операций из ответа API"""
+    rows = []
+    for operation in operations:
+        operation_time = parse_time(operation.get('updatedAt') or operation.get('createdAt'))
+        if operation_time is None:
+            continue
+        item_id = operation.get('itemId')
+        operation_type = operation.get('operationType') or ''
+        amount_rub = float(operation.get('amountRub') or 0)
+        rows.append(AvitoOperation(
+            user_id=user_id,
+            operation_id=operation_key(operation),
+            operation_time=operation_time,
+            operation_type=operation_type,
+            operation_name=operation.get('operationName') or UNKNOWN,
+            service_name=operation.get('serviceName') or UNKNOWN,
+            service_type=operation.get('serviceType') or UNKNOWN,
+            item_id=str(item_id) if item_id else '',
+            amount_rub=amount_rub,
+            # Тип расхода определяется при загрузке, чтобы отчеты фильтровали по индексу
+            is_expense=operation_type.lower() in EXPENSE_TYPES and amount_rub > 0,
+        ))
+    return rows
+
+
+def store_operations(rows):
+    """Добавляет операции в журнал, уже сохраненные пропускаются"""
+    if rows:
+        AvitoOperation.objects.bulk_create(rows, ignore_conflicts=True)
+    return len(rows)
+
+
+def split_window(start, end):
+    """Половины отрезка или None, если отрезок делить уже некуда"""
+    if end - start <= MIN_WINDOW:
+        return None
+    middle = start + (end - start) / 2
+    return (start, middle), (middle, end)
+
+
+class OperationsPages(PageWalk):
+    """
+    Операции за не загруженные отрезки периода (RFC3339)
+
+    Отрезок с заполненным ответом заменяется своими половинами, и они
+    загружаются по очереди: одновременные запросы половин у загруженного
+    аккаунта множились бы с каждым делением.
+    """
+
+    def __init__(self, access_token, user_id, date_from, date_to):
+        self.access_token = access_token
+        self.user_id = user_id
+        self.ranges = PlannedRanges(user_id, SOURCE, date_from, date_to)
+        self.windows = collections.deque()
+        self.ingested = 0
+
+    def begin(self):
+        self.ranges.load()
+
+    def next_request(self):
+        if not self.windows:
+            if self.ranges.current is None:
+                return None
+            self.windows.append(self.ranges.current)
+        start, end = self.windows[0]
+        return operations_request(self.access_token, format_time(start), format_time(end))
+
+    def handle(self, payload):
+        operations = payload.get('operations', [])
+        start, end = self.windows.popleft()
+        halves = split_window(start, end) if len(operations) >= OPERATIONS_LIMIT else None
+        if halves:
+            self.windows.extendleft(reversed(halves))
+        else:
+            self.ingested += store_operations(parse_operations(self.user_id, operations))
+        if not self.windows:
+            self.ranges.complete_current()
+
+    def result(self):
+        logger.info(
+            f"Операции пользователя {self.user_id} с {self.ranges.date_from} по {self.ranges.date_to}: "
+            f"загружено {self.ingested}"
+        )
+        return self.ingested
+
+
+def ingest_operations(access_token, user_id, date_from, date_to):
+    """
+    Догружает в журнал операции за период (RFC3339)
+
+    Returns:
+        int: Сколько операций получено от API
+    """
+    return walk_pages(OperationsPages(access_token, user_id, date_from, date_to))
+
+
+def expense_operations(user_id, date_from, date_to):
+    """Расходные операции журнала за период (RFC3339)"""
+    return AvitoOperation.objects.filter(
+        user_id=user_id,
+        is_expense=True,
+        operation_time__gte=parse_time(date_from),
+        operation_time__lte=parse_time(date_to),
+    )
+
+
+def expense_key(service_name, service_type):
+    # Ключ группировки: название услуги и ее тип, если он известен
+    key = f"{service_name}"
+    if service_type and service_type != UNKNOWN:
+        key += f" ({service_type})"
+    return key
+
+
+def expense_breakdown(user_id, date_from, date_to):
+    """
+    Расходы за период с детализацией по услугам
+
+    Returns:
+        dict: {'total': сумма, 'details': {услуга: {'amount', 'count', 'type', 'items'}}}
+    """
+    operations = expense_operations(user_id, date_from, date_to)
+    expenses_details = {}
+
+    for group in operations.values('service_name', 'service_type').annotate(
+        amount=Sum('amount_rub'),
+        count=Count('id'),
+        type=Max('operation_type'),
+    ):
+        key = expense_key(group['service_name'], group['service_type'])
+        details = expenses_details.setdefault(key, {'amount': 0, 'count': 0, 'type': group['type'], 'items': []})
+        details['amount'] += group['amount']
+        details['count'] += group['count']
+
+    for service_name, service_type, item_id in operations.exclude(item_id='').values_list(
+        'service_name', 'service_type', 'item_id'
+    ).distinct():
+        expenses_details[expense_key(service_name, service_type)]['items'].append(item_id)
+
+    total_expenses = sum(details['amount'] for details in expenses_details.values())
+    logger.info(f"Расходы за период: общая сумма {total_expenses:.2f} руб., {len(expenses_details)} категорий")
+    return {
+        'total': total_expenses,
+        'details': expenses_details
+    }
+
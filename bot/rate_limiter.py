@@ -0,0 +1,229 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Группы методов API Авито с общими лимитами: префикс пути -> группа
+ENDPOINT_FAMILIES = (
+    ('/stats/', 'stats'),
+    ('/messenger/', 'messenger'),
+    ('/calltracking/', 'calltracking'),
+    ('/cpa/', 'cpa'),
+)
+
+
+def endpoint_family(url):
+    """Группа лимитов для URL. Запросы токена не ограничиваются"""
+    path = urlsplit(url).path
+    if path.startswith('/token'):
+        return None
+    for prefix, family in ENDPOINT_FAMILIES:
+        if path.startswith(prefix):
+            return family
+    return 'core'
+
+
+class RateLimitExceeded(Exception):
+    """Ожидание свободного токена превысило допустимое время"""
+
+
+class TokenBucket:
+    """
+    Потокобезопасное ведро токенов.
+
+    Токены резервируются заранее: вызов получает время, через которое его
+    токен станет доступен, и сам ждет это время. Так синхронный и
+    асинхронный код делят одно ведро, а очередь запросов не сжигает квоту.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+        self.waits = 0
+        self.waited_seconds = 0.0
+        self.rejected = 0
+        self.throttled = 0
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def reserve(self, max_wait):
+        """
+        Резервирует токен
+
+        Returns:
+            float: Сколько секунд нужно подождать перед запросом
+
+        Raises:
+            RateLimitExceeded: Если ждать пришлось бы дольше max_wait секунд
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            delay = (1 - self._tokens) / self.rate if self._tokens < 1 else 0.0
+            if delay > max_wait:
+                self.rejected += 1
+                raise RateLimitExceeded(f"Ожидание лимита {delay:.1f} с больше допустимых {max_wait} с")
+            self._tokens -= 1
+            if delay:
+                self.waits += 1
+                self.waited_seconds += delay
+            return delay
+
+    def throttle(self, seconds):
+        """Опустошает ведро так, чтобы следующий токен появился через seconds секунд (после ответа 429)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, -seconds * self.rate + 1)
+            self.throttled += 1
+
+    def snapshot(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "tokens": round(self._tokens, 2),
+                "rate": self.rate,
+                "capacity": self.capacity,
+                "waits": self.waits,
+                "waited_seconds": round(self.waited_seconds, 2),
+                "rejected": self.rejected,
+                "throttled": self.throttled,
+            }
+
+
+def short_hash(value):
+    return hashlib.sha1(value.encode()).hexdigest()[:8]
+
+
+def account_key(headers):
+    """
+    Аккаунт запроса по токену из заголовка Authorization
+
+    Ключ - короткий хэш client_id (или самого токена, если его владелец
+    неизвестен): ключи попадают в логи и мониторинг, а client_id - учетные
+    данные API.
+    """
+    authorization = (headers or {}).get('Authorization', '')
+    if not authorization.startswith('Bearer '):
+        return '-'
+    token = authorization[len('Bearer '):]
+
+    # Импорт внутри функции: token_store сам использует HTTP-клиент
+    from bot.token_store import token_store
+    client_id = token_store.client_id_for(token)
+    if client_id:
+        return 'client:' + short_hash(client_id)
+    return 'token:' + short_hash(token)
+
+
+class RateLimiter:
+    """
+    Лимиты запросов к API Авито по группам методов и аккаунтам.
+
+    Для каждой пары (группа, аккаунт) заводится свое ведро токенов с
+    параметрами группы из settings.AVITO_RATE_LIMITS. Запрос ждет свободный
+    токен не дольше max_wait секунд, ответ 429 приостанавливает ведро на
+    время из Retry-After.
+    """
+
+    def __init__(self, limits=None, max_wait=None, penalty=None):
+        self.limits = limits or settings.AVITO_RATE_LIMITS
+        self.max_wait = max_wait if max_wait is not None else settings.AVITO_RATE_LIMIT_MAX_WAIT
+        self.penalty = penalty if penalty is not None else settings.AVITO_RATE_LIMIT_PENALTY
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, family, account):
+        key = (family, account)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    rate, capacity = self.limits.get(family, self.limits['core'])
+                    bucket = self._buckets[key] = TokenBucket(rate, capacity)
+        return bucket
+
+    def _reserve(self, url, headers):
+        family = endpoint_family(url)
+        if family is None:
+            return 0.0
+        account = account_key(headers)
+        delay = self.bucket(family, account).reserve(self.max_wait)
+        if delay:
+            logger.info(f"Лимит запросов {family} для {account}: ожидание {delay:.2f} с")
+        return delay
+
+    def acquire(self, url, headers=None):
+        """Ждет свободный токен для запроса (синхронно)"""
+        delay = self._reserve(url, headers)
+        if delay:
+            time.sleep(delay)
+
+    async def acquire_async(self, url, headers=None):
+        """Ждет свободный токен для запроса, не блокируя цикл событий"""
+        delay = self._reserve(url, headers)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def record_response(self, url, headers, status_code, retry_after=None):
+        """Учитывает ответ API: при 429 приостанавливает ведро"""
+        if status_code != 429:
+            return
+        family = endpoint_family(url)
+        if family is None:
+            return
+        account = account_key(headers)
+        seconds = parse_retry_after(retry_after, self.penalty)
+        self.bucket(family, account).throttle(seconds)
+        logger.warning(f"Превышен лимит запросов {family} для {account} (429), пауза {seconds:.1f} с")
+
+    def snapshot(self):
+        """
+        Состояние лимитов для мониторинга
+
+        Returns:
+            dict: {группа: {аккаунт: {"tokens": ..., "waits": ..., "waited_seconds": ..., ...}}}
+        """
+        with self._lock:
+            buckets = dict(self._buckets)
+        result = {}
+        for (family, account), bucket in buckets.items():
+            result.setdefault(family, {})[account] = bucket.snapshot()
+        return result
+
+    def summary(self):
+        """
+        Сводка лимитов по группам методов без разбивки по аккаунтам (для публичного мониторинга)
+
+        Returns:
+            dict: {группа: {"accounts": ..., "waits": ..., "waited_seconds": ..., "rejected": ..., "throttled": ...}}
+        """
+        result = {}
+        for family, accounts in self.snapshot().items():
+            totals = result[family] = {"accounts": len(accounts), "waits": 0, "waited_seconds": 0.0, "rejected": 0, "throttled": 0}
+            for bucket in accounts.values():
+                for field in ("waits", "waited_seconds", "rejected", "throttled"):
+                    totals[field] += bucket[field]
+            totals["waited_seconds"] = round(totals["waited_seconds"], 2)
+        return result
+
+
+def parse_retry_after(value, default):
+    """Секунды из заголовка Retry-After (поддерживается только числовая форма)"""
+    try:
+        return max(float(value), 0)
+    except (TypeError, ValueError):
+        return default
+
+
+rate_limiter = RateLimiter()
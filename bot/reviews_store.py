@@ -0,0 +1,166 @@
+"""
+Локальная копия отзывов аккаунта.
+
+Отзывы хранятся в AvitoReview. API отдает отзывы начиная с самых новых,
+поэтому синхронизация загружает страницы только до первого отзыва старше
+отметки синхронизации по createdAt (см. bot.sync_state.PagedSync). Проход,
+прерванный ошибкой, продолжается следующей синхронизацией. Число отзывов
+за день, неделю или любой другой период считается запросом к базе.
+"""
+import datetime
+import logging
+
+from django.utils import timezone
+
+from bot.avito_client import PageWalk, walk_pages
+from bot.models import AvitoReview
+from bot.sync_state import begin_paged_sync, finish_paged_sync, parse_time
+
+logger = logging.getLogger(__name__)
+
+SOURCE = 'reviews'
+
+# Размер страницы списка отзывов
+REVIEWS_PAGE_SIZE = 50
+
+
+def reviews_request(access_token, offset=0, limit=REVIEWS_PAGE_SIZE):
+    return {
+        'method': 'GET',
+        'url': 'https://api.avito.ru/ratings/v1/reviews',
+        'headers': {
+            'Authorization': f'Bearer {access_token}'
+        },
+        'params': {
+            'offset': offset,
+            'limit': limit
+        }
+    }
+
+
+def parse_reviews_page(user_id, reviews, mark):
+    """
+    Разбирает страницу отзывов
+
+    Returns:
+        tuple: (строки AvitoReview, достигнута ли отметка синхронизации)
+    """
+    rows = []
+    reached_mark = False
+    for review in reviews:
+        created_at = parse_time(review.get('createdAt'))
+        if review.get('id') is None or created_at is None:
+            continue
+        if mark is not None and created_at < mark:
+            reached_mark = True
+            continue
+        rows.append(AvitoReview(user_id=user_id, review_id=str(review['id']), created_at=created_at))
+    return rows, reached_mark
+
+
+def store_reviews(rows):
+    if rows:
+        AvitoReview.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['user_id', 'review_id'],
+            update_fields=['created_at'],
+        )
+    return len(rows)
+
+
+class ReviewsPages(PageWalk):
+    """Страницы отзывов от новых к старым до отметки синхронизации"""
+
+    def __init__(self, access_token, user_id):
+        self.access_token = access_token
+        self.user_id = user_id
+        self.paged_sync = None
+        self.synced = 0
+        self.total = None
+
+    def begin(self):
+        self.paged_sync = begin_paged_sync(self.user_id, SOURCE)
+
+    def next_request(self):
+        if self.paged_sync.complete:
+            return None
+        return reviews_request(self.access_token, self.paged_sync.offset)
+
+    def handle(self, payload):
+        if self.total is None:
+            self.total = payload.get('total', 0)
+        reviews = payload.get('reviews', [])
+        rows, reached_mark = parse_reviews_page(self.user_id, reviews, self.paged_sync.mark)
+        self.synced += store_reviews(rows)
+        self.paged_sync.advance(len(reviews), (row.created_at for row in rows))
+        if reached_mark or len(reviews) < REVIEWS_PAGE_SIZE:
+            self.paged_sync.complete = True
+
+    def finish(self):
+        if self.paged_sync is not None:
+            finish_paged_sync(self.paged_sync)
+
+    def result(self):
+        logger.info(
+            f"Отзывы пользователя {self.user_id}: загружено {self.synced}, всего {self.total} (отметка {self.paged_sync.mark})"
+        )
+        return self.total
+
+
+def sync_reviews(access_token, user_id):
+    """
+    Догружает отзывы новее отметки синхронизации
+
+    Returns:
+        int: Общее число отзывов по данным API
+    """
+    return walk_pages(ReviewsPages(access_token, user_id))
+
+
+def period_bounds(date_from=None, date_to=None):
+    """
+    Границы периода по датам (часть до 'T' в строке RFC3339), включительно
+
+    Если начало не передано, период - текущий день.
+    """
+    today = timezone.localdate()
+    if date_from is None:
+        first_day = last_day = today
+    else:
+        first_day = datetime.date.fromisoformat(date_from.split('T')[0])
+        last_day = datetime.date.fromisoformat(date_to.split('T')[0]) if date_to else today
+    start = timezone.make_aware(datetime.datetime.combine(first_day, datetime.time.min))
+    end = timezone.make_aware(datetime.datetime.combine(last_day + datetime.timedelta(days=1), datetime.time.min))
+    return start, end
+
+
+def count_reviews(user_id, date_from=None, date_to=None):
+    """Число отзывов за период по локальной таблице"""
+    start, end = period_bounds(date_from, date_to)
+    return AvitoReview.objects.filter(user_id=user_id, created_at__gte=start, created_at__lt=end).count()
+
+
+def daily_review_counts(user_id, first_day, last_day):
+    """
+    Число отзывов по дням за период (для исторической статистики)
+
+    Returns:
+        dict: {дата: число отзывов}, дни без отзывов не включаются
+    """
+    start, end = period_bounds(first_day.isoformat(), last_day.isoformat())
+    counts = {}
+    for created_at in AvitoReview.objects.filter(
+        user_id=user_id, created_at__gte=start, created_at__lt=end
+    ).values_list('created_at', flat=True):
+        day = timezone.localdate(created_at)
+        counts[day] = counts.get(day, 0) + 1
+    return counts
+
+
+def total_reviews(user_id, before=None):
+    """Число сохраненных отзывов, если передана дата - созданных до ее начала"""
+    reviews = AvitoReview.objects.filter(user_id=user_id)
+    if before is not None:
+        reviews = reviews.filter(created_at__lt=timezone.make_aware(datetime.datetime.combine(before, datetime.time.min)))
+    return reviews.count()
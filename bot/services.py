@@ -1,735 +1,598 @@
-import requests
+import collections
+import contextvars
+import copy
 import json
 import datetime
+import itertools
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from bot.avito_client import get_avito_client, report_budget
+from bot.cache import avito_cache
+from bot.calls_store import ingest_calls, calls_summary
+from bot.chat_index import sync_chats, count_chats
+from bot.collectors import (
+    Collector, CollectorContext, CollectorFailed, CollectorRegistry, SourceCandidate, choose_sources, failed_result,
+    run_plan, synced_count,
+)
+from bot.models import AvitoAccount
+from bot.operations_ledger import ingest_operations, expense_breakdown
+from bot.circuit_breaker import circuit_breakers
+from bot.reviews_store import sync_reviews, count_reviews, total_reviews
+from bot.single_flight import statistics_flight
+from bot.stored_stats import stored_period
+from bot.token_store import token_store
 
 logger = logging.getLogger(__name__)
 
-def get_access_token(client_id, client_secret):
-    auth_url = 'https://api.avito.ru/token'
-    auth_data = {
-        'grant_type': 'client_credentials',
-        'client_id': client_id,
-        'client_secret': client_secret
-    }
+# Кэш статистики профиля (1 час) и проверок XL продвижения объявлений
+profile_stats_cache = avito_cache.namespace("profile_stats", 60 * 60)
+item_services_cache = avito_cache.namespace("item_services", settings.AVITO_ITEM_SERVICES_TTL)
 
-    auth_response = requests.post(auth_url, data=auth_data)
-    auth_result = json.loads(auth_response.text)
+# Построители запросов и разбор ответов ниже общие для синхронного клиента
+# и для bot.async_services: у requests.Response и httpx.Response одинаковые
+# status_code, text, json() и raise_for_status()
+
+def read_json(response, default, source):
+    """
+    Проверяет ответ API и разбирает JSON
+
+    Args:
+        response: Ответ requests или httpx
+        default: Значение для пустого или некорректного ответа
+        source: Название API для сообщений в логе
+    """
+    response.raise_for_status()
 
-    # Извлечение API ключа из ответа
-    access_token = auth_result.get('access_token')
-    return access_token
+    # Проверяем, что ответ не пустой
+    if not response.text.strip():
+        logger.warning(f"Получен пустой ответ от API {source}")
+        return default
 
-def get_user_calls(access_token, date_from=None, date_to=None):
-    """Получение списка звонков за указанный период"""
     try:
-        if date_from is None or date_to is None:
-            current_time = datetime.datetime.now()
-            date_from = (current_time - datetime.timedelta(days=30)).strftime("%Y-%m-%dT%H:%M:%SZ")
-            date_to = current_time.strftime("%Y-%m-%dT%H:%M:%SZ")
+        return response.json()
+    except json.JSONDecodeError as e:
+        logger.error(f"Ошибка декодирования JSON: {e}, содержимое ответа: {response.text[:200]}")
+        return default
 
-        calls_url = 'https://api.avito.ru/calltracking/v1/getCalls/'
-        calls_data = {
-            'dateTimeFrom': date_from,
-            'dateTimeTo': date_to,
-            'limit': 100,
-            'offset': 0
-        }
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Content-Type': 'application/json'
-        }
 
-        logger.info(f"Запрос звонков с {date_from} по {date_to}")
-        
-        calls_response = requests.post(calls_url, headers=headers, json=calls_data)
-        calls_response.raise_for_status()
-        
-        # Проверяем, что ответ не пустой
-        if not calls_response.text.strip():
-            logger.warning("Получен пустой ответ от API звонков")
-            return {"calls": []}
-        
-        try:
-            calls_result = calls_response.json()
-            logger.info(f"Получено {len(calls_result.get('calls', []))} звонков")
-            return calls_result
-        except json.JSONDecodeError as e:
-            logger.error(f"Ошибка декодирования JSON: {e}, содержимое ответа: {calls_response.text[:200]}")
-            return {"calls": []}
-            
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Ошибка запроса к API звонков: {e}")
-        return {"calls": []}
-    except Exception as e:
-        logger.error(f"Непредвиденная ошибка при получении звонков: {e}")
-        return {"calls": []}
+def default_period(date_from=None, date_to=None, days=30):
+    """Подставляет период по умолчанию: последние days дней до текущего момента"""
+    current_time = datetime.datetime.now()
+    if date_from is None:
+        date_from = (current_time - datetime.timedelta(days=days)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    if date_to is None:
+        date_to = current_time.strftime("%Y-%m-%dT%H:%M:%SZ")
+    return date_from, date_to
 
 
-def get_total_calls(access_token, date_from=None, date_to=None):
-    """Подсчет общего количества звонков за период"""
+def get_access_token(client_id, client_secret):
+    """Возвращает действующий токен доступа из общего кэша токенов"""
+    return token_store.get_token(client_id, client_secret)
+
+def get_calls_summary(access_token, user_id, date_from=None, date_to=None):
+    """
+    Количество звонков за период: всего, отвеченных и пропущенных
+
+    Сначала догружаются еще не загруженные звонки периода, затем
+    количество считается по локальной таблице звонков. Если загрузка не
+    удалась, выбрасывает CollectorFailed с подсчетом по уже загруженным звонкам.
+    """
+    if date_from is None or date_to is None:
+        date_from, date_to = default_period()
+
+    summary = synced_count(
+        lambda: statistics_flight.do(
+            ("calls", user_id, date_from, date_to),
+            lambda: ingest_calls(access_token, user_id, date_from, date_to)
+        ),
+        lambda: calls_summary(user_id, date_from, date_to),
+        f"звонков пользователя {user_id}",
+    )
+    logger.info(f"Звонки с {date_from} по {date_to}: всего {summary['total_calls']}, пропущено {summary['missed_calls']}")
+    return summary
+
+
+def calls_count(summary_key, access_token, user_id, date_from, date_to):
     try:
-        calls_result = get_user_calls(access_token, date_from, date_to)
-        total_calls = len(calls_result.get('calls', []))
-        logger.info(f"Общее количество звонков: {total_calls}")
-        return total_calls
-    except Exception as e:
-        logger.error(f"Ошибка при подсчете общего количества звонков: {e}")
-        return 0
+        return get_calls_summary(access_token, user_id, date_from, date_to)[summary_key]
+    except CollectorFailed as e:
+        raise CollectorFailed(str(e), fallback=e.fallback[summary_key]) from e
+
+def get_total_calls(access_token, user_id, date_from=None, date_to=None):
+    """Подсчет общего количества звонков за период"""
+    return calls_count("total_calls", access_token, user_id, date_from, date_to)
 
-def get_missed_calls(access_token, date_from=None, date_to=None):
+def get_missed_calls(access_token, user_id, date_from=None, date_to=None):
     """Подсчет пропущенных звонков за период"""
-    try:
-        calls_result = get_user_calls(access_token, date_from, date_to)
-        missed_calls = sum(1 for call in calls_result.get('calls', []) if call.get('talkDuration', 0) == 0)
-        logger.info(f"Количество пропущенных звонков: {missed_calls}")
-        return missed_calls
-    except Exception as e:
-        logger.error(f"Ошибка при подсчете пропущенных звонков: {e}")
-        return 0
+    return calls_count("missed_calls", access_token, user_id, date_from, date_to)
 
-def get_user_balance_info(access_token, user_id=None):
+def balance_request(access_token, user_id):
+    # Реальный баланс кошелька (метод API v1)
+    return {
+        'method': 'GET',
+        'url': f'https://api.avito.ru/core/v1/accounts/{user_id}/balance/',
+        'headers': {
+            'Authorization': f'Bearer {access_token}'
+        }
+    }
+
+def advance_request(access_token):
+    # Авансы (старый метод API v3)
+    return {
+        'method': 'POST',
+        'idempotent': True,  # POST только читает данные
+        'url': 'https://api.avito.ru/cpa/v3/balanceInfo',
+        'headers': {
+            'Authorization': f'Bearer {access_token}',
+            'X-Source': 'python_script',
+            'Content-Type': 'application/json'
+        },
+        'json': {}
+    }
+
+def parse_balance_info(balance_data, advance_result):
+    # Получаем данные о авансе из ответа API
+    advance = 0
+    if 'balance' in advance_result:
+        advance = advance_result['balance'] / 100
+    elif 'data' in advance_result and 'balance' in advance_result['data']:
+        advance = advance_result['data']['balance'] / 100
+
+    # Формируем ответ с полной информацией о балансе
+    return {
+        "balance_real": balance_data.get('real', 0),  # Реальные деньги
+        "balance_bonus": balance_data.get('bonus', 0),  # Бонусы
+        "advance": advance  # Авансовые платежи (старый 'balance')
+    }
+
+def get_user_balance_info(access_token, user_id):
     """
     Получает подробную информацию о балансе пользователя:
     - balance_real - реальные деньги в кошельке
     - balance_bonus - бонусные средства
     - advance - авансовые платежи (бывший 'balance' из API v3)
+
+    При ошибке запроса выбрасывает исключение: нулевой баланс вместо
+    показания был бы принят за расход.
     """
-    try:
-        # Если не передан user_id, получаем его из профиля
-        if not user_id:
-            profile_url = 'https://api.avito.ru/core/v1/accounts/self'
-            profile_headers = {
-                'Authorization': f'Bearer {access_token}'
-            }
-            profile_response = requests.get(profile_url, headers=profile_headers)
-            profile_response.raise_for_status()
-            profile_data = profile_response.json()
-            user_id = profile_data.get('id')
-            
-            if not user_id:
-                logger.error("Не удалось получить идентификатор пользователя")
-                return {"balance_real": 0, "balance_bonus": 0, "advance": 0}
-        
-        # Получаем реальный баланс кошелька (метод API v1)
-        balance_url = f'https://api.avito.ru/core/v1/accounts/{user_id}/balance/'
-        balance_headers = {
-            'Authorization': f'Bearer {access_token}'
-        }
-        
-        balance_response = requests.get(balance_url, headers=balance_headers)
-        balance_response.raise_for_status()
-        balance_data = balance_response.json()
-        
-        # Получаем авансы (старый метод API v3)
-        advance_url = 'https://api.avito.ru/cpa/v3/balanceInfo'
-        advance_headers = {
-            'Authorization': f'Bearer {access_token}',
-            'X-Source': 'python_script',
-            'Content-Type': 'application/json'
-        }
-        advance_data = {}
-        
-        advance_response = requests.post(advance_url, headers=advance_headers, json=advance_data)
-        advance_response.raise_for_status()
-        advance_result = advance_response.json()
-        
-        # Получаем данные о авансе из ответа API
-        advance = 0
-        if 'balance' in advance_result:
-            advance = advance_result['balance'] / 100
-        elif 'data' in advance_result and 'balance' in advance_result['data']:
-            advance = advance_result['data']['balance'] / 100
-        
-        # Формируем ответ с полной информацией о балансе
-        return {
-            "balance_real": balance_data.get('real', 0),  # Реальные деньги
-            "balance_bonus": balance_data.get('bonus', 0),  # Бонусы
-            "advance": advance  # Авансовые платежи (старый 'balance')
-        }
-    except Exception as e:
-        logger.error(f"Ошибка при получении информации о балансе: {e}")
-        return {"balance_real": 0, "balance_bonus": 0, "advance": 0}
+    balance_response = get_avito_client().request(**balance_request(access_token, user_id))
+    balance_response.raise_for_status()
+    balance_data = balance_response.json()
+
+    advance_response = get_avito_client().request(**advance_request(access_token))
+    advance_response.raise_for_status()
+    advance_result = advance_response.json()
+
+    return parse_balance_info(balance_data, advance_result)
 
 # Оставляем старую функцию для обратной совместимости, но теперь она возвращает авансы
-def get_user_ballance(access_token):
+def get_user_ballance(access_token, user_id):
     """Устаревшая функция, возвращает авансовые платежи для обратной совместимости"""
     try:
-        balance_info = get_user_balance_info(access_token)
+        balance_info = get_user_balance_info(access_token, user_id)
         return balance_info['advance']
     except Exception as e:
         logger.error(f"Ошибка при получении аванса: {e}")
         return 0
-    
+
+def user_info_request(access_token):
+    return {
+        'method': 'GET',
+        'url': 'https://api.avito.ru/core/v1/accounts/self',
+        'headers': {
+            'Authorization': f'Bearer {access_token}'
+        }
+    }
+
 def get_user_info(access_token):
     """
     Получает информацию об авторизованном пользователе.
-    
+
     Args:
         access_token: Токен доступа к API
-        
+
     Returns:
         dict: Словарь с информацией о пользователе (id, email, name, phone и т.д.)
               или пустой словарь в случае ошибки
     """
     try:
-        # URL для получения информации о пользователе
-        user_info_url = 'https://api.avito.ru/core/v1/accounts/self'
-        
-        # Заголовки запроса
-        headers = {
-            'Authorization': f'Bearer {access_token}'
-        }
-        
         logger.info("Запрос информации о пользователе")
-        
-        # Выполняем запрос
-        response = requests.get(user_info_url, headers=headers)
-        response.raise_for_status()
-        
-        # Проверяем, что ответ не пустой
-        if not response.text.strip():
-            logger.error("Получен пустой ответ от API информации о пользователе")
-            return {}
-            
-        # Парсим JSON ответ
-        try:
-            user_data = response.json()
-            logger.info(f"Получена информация о пользователе с ID: {user_data.get('id')}")
-            return user_data
-        except json.JSONDecodeError as e:
-            logger.error(f"Ошибка декодирования JSON: {e}, содержимое ответа: {response.text}")
-            return {}
-            
+
+        response = get_avito_client().request(**user_info_request(access_token))
+        user_data = read_json(response, {}, "информации о пользователе")
+        logger.info(f"Получена информация о пользователе с ID: {user_data.get('id')}")
+        return user_data
+
     except Exception as e:
         logger.error(f"Ошибка при получении информации о пользователе: {e}")
         return {}
 
-def get_user_chats(access_token, date_from=None, date_to=None, unread_only=False, chat_types=None, limit=100, offset=0):
-    """Получение списка чатов пользователя за определенный период"""
-    # Получаем user_id из профиля пользователя
-    try:
-        user_info = get_user_info(access_token)
-        user_id = user_info.get('id')
-        
-        if not user_id:
-            logger.error("Не удалось получить идентификатор пользователя")
-            return 0
-            
-        # Формируем URL для получения чатов
-        chats_url = f'https://api.avito.ru/messenger/v2/accounts/{user_id}/chats'
-        
-        # Параметры запроса (API принимает максимум 100)
-        params = {
-            'limit': min(limit, 100),  # Ограничиваем до 100
-            'offset': offset
-        }
-        
-        # Не передаем даты в параметры URL - они не поддерживаются API
-        # Будем фильтровать чаты по датам в коде после получения
-        
-        # Добавляем необязательные параметры, если они указаны
-        if unread_only:
-            params['unread_only'] = 'true'
-            
-        if chat_types:
-            if isinstance(chat_types, list):
-                params['chat_types'] = ','.join(chat_types)
-            else:
-                params['chat_types'] = 'u2i'  # По умолчанию только чаты по объявлениям
-        
-        # Заголовки запроса
-        headers = {
-            'Authorization': f'Bearer {access_token}'
-        }
-        
-        logger.info(f"Запрос чатов пользователя {user_id} с параметрами: {params}")
-        
-        # Выполняем запрос
-        chats_response = requests.get(chats_url, headers=headers, params=params)
-        chats_response.raise_for_status()
-        chats_result = chats_response.json()
-        
-        # Получаем все чаты из первой страницы
-        all_chats = chats_result.get('chats', [])
-        total_count = chats_result.get('count', 0)
-        
-        # Если нужно получить больше чатов и есть пагинация
-        if total_count > 100 and limit > 100:
-            # Определяем сколько еще страниц нужно запросить
-            max_pages = min(10, (limit // 100) + (1 if limit % 100 > 0 else 0))
-            
-            for page in range(1, max_pages):
-                page_offset = page * 100
-                
-                params['offset'] = page_offset
-                page_response = requests.get(chats_url, headers=headers, params=params)
-                
-                if page_response.status_code != 200:
-                    break
-                    
-                page_result = page_response.json()
-                page_chats = page_result.get('chats', [])
-                
-                if not page_chats:
-                    break
-                    
-                all_chats.extend(page_chats)
-                
-                # Если получили нужное количество или все чаты
-                if len(all_chats) >= limit or len(all_chats) >= total_count:
-                    break
-        
-        # Фильтруем чаты по дате, если указаны даты
-        filtered_chats = all_chats
-        if date_from or date_to:
-            filtered_chats = []
-            from_date = None
-            to_date = None
-            
-            if date_from:
-                from_date = datetime.datetime.fromisoformat(date_from.replace('Z', '+00:00'))
-            if date_to:
-                to_date = datetime.datetime.fromisoformat(date_to.replace('Z', '+00:00'))
-            
-            for chat in all_chats:
-                last_message_time = chat.get('lastMessageTime')
-                if last_message_time:
-                    message_time = datetime.datetime.fromisoformat(last_message_time.replace('Z', '+00:00'))
-                    
-                    if from_date and message_time < from_date:
-                        continue
-                    if to_date and message_time > to_date:
-                        continue
-                        
-                    filtered_chats.append(chat)
-        
-        # Возвращаем количество чатов
-        total_chats = len(filtered_chats)
-        logger.info(f"Получено {total_chats} чатов из {len(all_chats)} общих (всего в API: {total_count})")
-        return total_chats
-        
-    except Exception as e:
-        logger.error(f"Ошибка при получении списка чатов: {e}")
-        return 0
+def refresh_chat_index(access_token, user_id):
+    """Догружает новые чаты в локальный индекс, одновременные обновления одного аккаунта объединяются"""
+    statistics_flight.do(("chats", user_id), lambda: sync_chats(access_token, user_id))
+
+def get_user_chats(access_token, user_id, date_from=None, date_to=None):
+    """
+    Количество чатов пользователя с последним сообщением за период (по локальному индексу чатов)
 
-def get_chats_by_time(access_token, date_from=None):
+    Если индекс обновить не удалось, выбрасывает CollectorFailed с подсчетом по уже сохраненным чатам.
+    """
+    total_chats = synced_count(
+        lambda: refresh_chat_index(access_token, user_id),
+        lambda: count_chats(user_id, date_from, date_to),
+        f"чатов пользователя {user_id}",
+    )
+    logger.info(f"Найдено {total_chats} чатов пользователя {user_id} с {date_from} по {date_to}")
+    return total_chats
+
+def day_start(date_from=None):
+    """Начало текущего дня в формате RFC3339, если дата не передана"""
+    if date_from is None:
+        current_time = datetime.datetime.now()
+        date_from = current_time.replace(hour=0, minute=0, second=0, microsecond=0).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return date_from
+
+def get_chats_by_time(access_token, user_id, date_from=None):
     """
     Получение новых чатов после указанной даты
-    
+
     Args:
         access_token: Токен доступа к API
+        user_id: ID пользователя Авито
         date_from: Время, с которого нужно начинать поиск чатов (RFC3339)
                   Если не передано, берется начало текущего дня/недели
-    
+
     Returns:
         int: Количество новых чатов
     """
-    try:
-        # Если начальная дата не передана, используем текущую дату
-        if date_from is None:
-            current_time = datetime.datetime.now()
-            date_from = current_time.replace(hour=0, minute=0, second=0, microsecond=0).strftime("%Y-%m-%dT%H:%M:%SZ")
-
-        # Получаем информацию о пользователе для получения user_id
-        user_info = get_user_info(access_token)
-        user_id = user_info.get('id')
-        
-        if not user_id:
-            logger.error("Не удалось получить идентификатор пользователя")
-            return 0
-        
-        # Получаем чаты пользователя через функцию get_user_chats
-        # Передаем date_from как параметр для фильтрации
-        total_chats = get_user_chats(
-            access_token=access_token,
-            date_from=date_from,
-            chat_types='u2i'
-        )
-        
-        logger.info(f"Найдено {total_chats} чатов после {date_from}")
-        return total_chats
-            
-    except Exception as e:
-        logger.error(f"Ошибка при получении новых чатов: {e}")
-        return 0
+    # Если начальная дата не передана, используем текущую дату
+    date_from = day_start(date_from)
 
-def get_all_numbers(access_token, date_from=None, date_to=None):
-    """Получение статистики показов телефона за указанный период"""
-    try:
-        if date_from is None:
-            current_time = datetime.datetime.now()
-            date_from = (current_time - datetime.timedelta(days=30)).strftime("%Y-%m-%dT%H:%M:%SZ")
-        
-        if date_to is None:
-            date_to = datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")
-        
-        phones_url = 'https://api.avito.ru/cpa/v1/phonesInfoFromChats'
-        phones_data = {
+    # Считаем чаты по индексу через функцию get_user_chats
+    total_chats = get_user_chats(
+        access_token=access_token,
+        user_id=user_id,
+        date_from=date_from
+    )
+
+    logger.info(f"Найдено {total_chats} чатов после {date_from}")
+    return total_chats
+
+def phones_request(access_token, date_from, date_to):
+    return {
+        'method': 'POST',
+        'idempotent': True,  # POST только читает данные
+        'url': 'https://api.avito.ru/cpa/v1/phonesInfoFromChats',
+        'headers': {
+            'Authorization': f'Bearer {access_token}',
+            'X-Source': 'python_script',
+            'Content-Type': 'application/json'
+        },
+        'json': {
             'dateTimeFrom': date_from,
             'dateTimeTo': date_to,
             'limit': 100,
             'offset': 0
         }
-        phones_headers = {
-            'Authorization': f'Bearer {access_token}',
-            'X-Source': 'python_script',
-            'Content-Type': 'application/json'
-        }
+    }
 
-        logger.info(f"Запрос статистики показов телефона с {date_from} по {date_to}")
-        
-        phones_response = requests.post(phones_url, headers=phones_headers, json=phones_data)
-        phones_response.raise_for_status()
-        
-        # Проверяем, что ответ не пустой
-        if not phones_response.text.strip():
-            logger.warning("Получен пустой ответ от API показов телефона")
-            return 0
-        
-        try:
-            phones_result = phones_response.json()
-            total_phone_results = phones_result.get('total', 0)
-            logger.info(f"Получено {total_phone_results} показов телефона")
-            return total_phone_results
-        except json.JSONDecodeError as e:
-            logger.error(f"Ошибка декодирования JSON: {e}, содержимое ответа: {phones_response.text[:200]}")
-            return 0
-            
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Ошибка запроса к API показов телефона: {e}")
-        return 0
-    except Exception as e:
-        logger.error(f"Непредвиденная ошибка при получении показов телефона: {e}")
-        return 0
+def get_all_numbers(access_token, date_from=None, date_to=None):
+    """Получение статистики показов телефона за указанный период; при ошибке запроса выбрасывает исключение"""
+    date_from, date_to = default_period(date_from, date_to)
 
+    logger.info(f"Запрос статистики показов телефона с {date_from} по {date_to}")
 
-def get_user_items_stats(access_token, user_id, status="active", per_page=25, page=1, date_from=None, date_to=None, period_grouping="day"):
-    """Получает базовую информацию о объявлениях пользователя и их идентификаторы."""
-    try:
-        items_url = 'https://api.avito.ru/core/v1/items'
-        items_headers = {
+    phones_response = get_avito_client().request(**phones_request(access_token, date_from, date_to))
+    phones_result = read_json(phones_response, {}, "показов телефона")
+    total_phone_results = phones_result.get('total', 0)
+    logger.info(f"Получено {total_phone_results} показов телефона")
+    return total_phone_results
+
+
+def items_request(access_token, status="active", per_page=25, page=1):
+    return {
+        'method': 'GET',
+        'url': 'https://api.avito.ru/core/v1/items',
+        'headers': {
             'Authorization': f'Bearer {access_token}'
-        }
-        
-        params = {
+        },
+        'params': {
             'status': status,
             'per_page': per_page,
             'page': page
         }
-        
-        logger.info(f"Запрос информации об объявлениях пользователя {user_id}")
-        
-        response = requests.get(items_url, headers=items_headers, params=params)
-        response.raise_for_status()
-        
-        # Проверяем, что ответ не пустой
-        if not response.text.strip():
-            logger.warning("Получен пустой ответ от API объявлений")
-            return []
-        
-        try:
-            result = response.json()
-            
-            # Правильное извлечение идентификаторов объявлений из структуры ответа API
-            items = result.get('resources', [])
-            item_ids = [item['id'] for item in items if 'id' in item]
-            
-            logger.info(f"Получено {len(item_ids)} идентификаторов объявлений")
-            return item_ids
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"Ошибка декодирования JSON: {e}, содержимое ответа: {response.text[:200]}")
-            return []
-            
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Ошибка запроса к API объявлений: {e}")
-        return []
-    except Exception as e:
-        logger.error(f"Непредвиденная ошибка при получении объявлений: {e}")
-        return []
+    }
+
+def parse_item_ids(result):
+    # Правильное извлечение идентификаторов объявлений из структуры ответа API
+    items = result.get('resources', [])
+    return [item['id'] for item in items if 'id' in item]
+
+def fetch_items_page(access_token, status, per_page, page):
+    """Идентификаторы объявлений одной страницы списка"""
+    response = get_avito_client().request(**items_request(access_token, status, per_page, page))
+    return parse_item_ids(read_json(response, {}, "объявлений"))
+
+def iter_user_items(access_token, user_id, status="active", per_page=None, page=1, prefetch=None):
+    """
+    Лениво перебирает идентификаторы всех объявлений пользователя постранично
+
+    Пока вызывающий код обрабатывает текущую страницу, следующие prefetch
+    страниц уже запрашиваются в фоне, поэтому в памяти не больше
+    prefetch + 1 страниц. Перебор заканчивается на неполной странице, ошибка
+    запроса страницы передается вызывающему коду: неполный каталог нельзя
+    выдавать за весь.
+    """
+    per_page = per_page or settings.AVITO_ITEMS_PAGE_SIZE
+    prefetch = settings.AVITO_ITEMS_PREFETCH_PAGES if prefetch is None else prefetch
+    logger.info(f"Запрос информации об объявлениях пользователя {user_id}")
+
+    executor = ThreadPoolExecutor(max_workers=max(prefetch, 1), thread_name_prefix="avito-items")
+    pending = collections.deque()
+    next_page = page
+    total = 0
+
+    def request_next_page():
+        nonlocal next_page
+        future = executor.submit(
+            contextvars.copy_context().run, fetch_items_page, access_token, status, per_page, next_page
+        )
+        pending.append((next_page, future))
+        next_page += 1
 
-def get_item_promotion_info(access_token, user_id, item_ids):
-    """Получает информацию о продвижении объявлений."""
     try:
-        if not item_ids:
-            logger.info("Нет объявлений для анализа продвижения")
-            return {"total_items": 0, "xl_promotion_count": 0}
-    
-        # Подсчет объявлений с XL продвижением
-        xl_promotion_count = 0
-        
-        # Ограничиваем количество проверяемых объявлений
-        check_ids = item_ids[:50]  # Проверяем не более 50 объявлений
-        
-        # Получаем детальную информацию о каждом объявлении для проверки XL продвижения
-        for item_id in check_ids:
+        request_next_page()
+        while pending:
+            page_number, future = pending.popleft()
             try:
-                item_info_url = f'https://api.avito.ru/core/v1/accounts/{user_id}/items/{item_id}/'
-                item_info_headers = {
-                    'Authorization': f'Bearer {access_token}'
-                }
-                
-                item_response = requests.get(item_info_url, headers=item_info_headers)
-                item_response.raise_for_status()
-                
-                # Проверяем, что ответ не пустой
-                if not item_response.text.strip():
-                    continue
-                    
-                item_data = item_response.json()
-                
-                # Проверка наличия XL продвижения
-                services = item_data.get('services', [])
-                for service in services:
-                    if service.get('code') == 'xl':
-                        xl_promotion_count += 1
-                        break
-                        
+                item_ids = future.result()
             except Exception as e:
-                logger.error(f"Ошибка при получении информации о продвижении объявления {item_id}: {e}")
-                continue
-        
-        # Если проверили не все объявления, экстраполируем результаты
-        if len(check_ids) < len(item_ids):
-            ratio = len(item_ids) / len(check_ids)
-            xl_promotion_count = int(xl_promotion_count * ratio)
-            logger.info(f"Экстраполяция данных по продвижению: проверено {len(check_ids)} из {len(item_ids)} объявлений")
-        
-        result = {
-            "total_items": len(item_ids),
-            "xl_promotion_count": xl_promotion_count
-        }
-        
-        logger.info(f"Информация о продвижениях: всего {len(item_ids)} объявлений, с XL продвижением: {xl_promotion_count}")
-        return result
-        
-    except Exception as e:
-        logger.error(f"Ошибка при получении информации о продвижении объявлений: {e}")
-        return {
-            "total_items": len(item_ids) if item_ids else 0,
-            "xl_promotion_count": 0
+                logger.error(f"Ошибка при получении страницы {page_number} объявлений: {e}")
+                raise
+
+            has_more = len(item_ids) >= per_page
+            while has_more and len(pending) < prefetch:
+                request_next_page()
+
+            total += len(item_ids)
+            yield from item_ids
+
+            if has_more and not pending:
+                request_next_page()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        logger.info(f"Получено {total} идентификаторов объявлений")
+
+def iter_chunks(iterable, size):
+    """Разбивает итерируемый объект на списки не длиннее size"""
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+def add_counts(totals, counts):
+    """Прибавляет числовые показатели counts к totals"""
+    for key, value in counts.items():
+        totals[key] = totals.get(key, 0) + value
+    return totals
+
+def item_info_request(access_token, user_id, item_id):
+    return {
+        'method': 'GET',
+        'url': f'https://api.avito.ru/core/v1/accounts/{user_id}/items/{item_id}/',
+        'headers': {
+            'Authorization': f'Bearer {access_token}'
         }
+    }
 
-def get_items_statistics(access_token, user_id, item_ids, date_from=None, date_to=None, period_grouping="day"):
-    """Получает статистику по объявлениям: просмотры, контакты, избранное."""
+def has_xl_promotion(item_data):
+    # Проверка наличия XL продвижения
+    return any(service.get('code') == 'xl' for service in item_data.get('services', []))
+
+def cached_xl_promotion(user_id, item_id):
+    """Результат проверки XL продвижения из кэша или None, если записи нет или она устарела"""
+    return item_services_cache.get((user_id, item_id))
+
+def cached_xl_promotions(user_id, item_ids):
+    """{ID объявления: результат проверки из кэша или None}"""
+    return {item_id: cached_xl_promotion(user_id, item_id) for item_id in item_ids}
+
+def store_xl_promotion(user_id, item_id, has_xl):
+    item_services_cache.set((user_id, item_id), has_xl)
+
+def store_xl_promotions(user_id, checks):
+    """Кэширует успешные проверки {ID объявления: есть ли XL продвижение или None}"""
+    for item_id, has_xl in checks.items():
+        if has_xl is not None:
+            store_xl_promotion(user_id, item_id, has_xl)
+
+def promotion_summary(item_ids, xl_promotion_count, from_cache, failed):
+    logger.info(
+        f"Информация о продвижениях: всего {len(item_ids)} объявлений, с XL продвижением: {xl_promotion_count} "
+        f"(из кэша {from_cache}, ошибок {failed})"
+    )
+    return {
+        "total_items": len(item_ids),
+        "xl_promotion_count": xl_promotion_count
+    }
+
+def _check_xl_promotion(access_token, user_id, item_id):
+    """Есть ли у объявления XL продвижение; None, если данные получить не удалось"""
     try:
-        if not item_ids:
-            logger.info("Нет объявлений для получения статистики")
-            return {
-                "total_views": 0,
-                "total_contacts": 0,
-                "total_favorites": 0
+        item_response = get_avito_client().request(**item_info_request(access_token, user_id, item_id))
+        return has_xl_promotion(read_json(item_response, {}, "объявления"))
+    except Exception as e:
+        logger.error(f"Ошибка при получении информации о продвижении объявления {item_id}: {e}")
+        return None
+
+def get_item_promotion_info(access_token, user_id, item_ids):
+    """
+    Получает информацию о продвижении объявлений.
+
+    Проверяются все объявления: сведения об услугах запрашиваются
+    параллельно (не более AVITO_PROMOTION_WORKERS запросов одновременно) и
+    кэшируются по объявлению на AVITO_ITEM_SERVICES_TTL секунд, поэтому при
+    повторных запусках запрашиваются только объявления с устаревшей записью.
+    """
+    if not item_ids:
+        logger.info("Нет объявлений для анализа продвижения")
+        return {"total_items": 0, "xl_promotion_count": 0}
+
+    checks = cached_xl_promotions(user_id, item_ids)
+    missing_ids = [item_id for item_id, has_xl in checks.items() if has_xl is None]
+
+    if missing_ids:
+        workers = min(settings.AVITO_PROMOTION_WORKERS, len(missing_ids))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="avito-promotion") as executor:
+            futures = {
+                item_id: executor.submit(
+                    contextvars.copy_context().run, _check_xl_promotion, access_token, user_id, item_id
+                )
+                for item_id in missing_ids
             }
-        
-        if date_from is None:
-            current_time = datetime.datetime.now()
-            date_from = (current_time - datetime.timedelta(days=30)).strftime("%Y-%m-%dT%H:%M:%SZ")
-            
-        if date_to is None:
-            date_to = datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")
-            
-        # Получение статистики по объявлениям
-        stats_url = f'https://api.avito.ru/stats/v1/accounts/{user_id}/items'
-        stats_headers = {
+            for item_id, future in futures.items():
+                checks[item_id] = future.result()
+                if checks[item_id] is not None:
+                    store_xl_promotion(user_id, item_id, checks[item_id])
+
+    failed = sum(1 for has_xl in checks.values() if has_xl is None)
+    xl_promotion_count = sum(1 for has_xl in checks.values() if has_xl)
+    return promotion_summary(item_ids, xl_promotion_count, len(item_ids) - len(missing_ids), failed)
+
+# Сколько объявлений запрашивать в одном запросе статистики (ограничение API)
+ITEMS_STATS_BATCH = 200
+
+def items_statistics_request(access_token, user_id, request_ids, date_from, date_to, period_grouping="day"):
+    return {
+        'method': 'POST',
+        'idempotent': True,  # POST только читает данные
+        'url': f'https://api.avito.ru/stats/v1/accounts/{user_id}/items',
+        'headers': {
             'Authorization': f'Bearer {access_token}',
             'Content-Type': 'application/json'
-        }
-        
-        # Ограничиваем количество ID для запроса
-        request_ids = item_ids[:200]  # API ограничение
-        
-        stats_data = {
+        },
+        'json': {
             'dateFrom': date_from,
             'dateTo': date_to,
             'itemIds': request_ids,
             'fields': ["uniqViews", "uniqContacts", "uniqFavorites"],
             'periodGrouping': period_grouping
         }
-        
-        logger.info(f"Запрос статистики по {len(request_ids)} объявлениям с {date_from} по {date_to}")
-        
-        stats_response = requests.post(stats_url, headers=stats_headers, json=stats_data)
-        stats_response.raise_for_status()
-        
-        # Проверяем, что ответ не пустой
-        if not stats_response.text.strip():
-            logger.warning("Получен пустой ответ от API статистики объявлений")
-            return {
-                "total_views": 0,
-                "total_contacts": 0,
-                "total_favorites": 0
-            }
-        
-        try:
-            stats_result = stats_response.json()
-            
-            # Подсчет общего количества просмотров, контактов и избранных
-            total_views = 0
-            total_contacts = 0
-            total_favorites = 0
-            
-            for item in stats_result.get('result', {}).get('items', []):
-                for stat in item.get('stats', []):
-                    total_views += stat.get('uniqViews', 0)
-                    total_contacts += stat.get('uniqContacts', 0)
-                    total_favorites += stat.get('uniqFavorites', 0)
-            
-            # Если запросили не все объявления, экстраполируем результаты
-            if len(request_ids) < len(item_ids):
-                ratio = len(item_ids) / len(request_ids)
-                total_views = int(total_views * ratio)
-                total_contacts = int(total_contacts * ratio)
-                total_favorites = int(total_favorites * ratio)
-                logger.info(f"Экстраполяция статистики: проверено {len(request_ids)} из {len(item_ids)} объявлений")
-            
-            result = {
-                "total_views": total_views,
-                "total_contacts": total_contacts,
-                "total_favorites": total_favorites
-            }
-            
-            logger.info(f"Статистика объявлений: просмотры: {total_views}, контакты: {total_contacts}, избранное: {total_favorites}")
-            return result
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"Ошибка декодирования JSON: {e}, содержимое ответа: {stats_response.text[:200]}")
-            return {
-                "total_views": 0,
-                "total_contacts": 0,
-                "total_favorites": 0
-            }
-            
-    except Exception as e:
-        logger.error(f"Ошибка при получении статистики объявлений: {e}")
-        return {
-            "total_views": 0,
-            "total_contacts": 0,
-            "total_favorites": 0
-        }
+    }
 
+def sum_items_statistics(stats_result, request_ids, item_ids):
+    # Подсчет общего количества просмотров, контактов и избранных
+    total_views = 0
+    total_contacts = 0
+    total_favorites = 0
 
-def get_user_rating_info(access_token):
-    """Получение рейтинга пользователя"""
-    try:
-        rating_info_url = 'https://api.avito.ru/ratings/v1/info'
-        rating_info_headers = {
-            'Authorization': f'Bearer {access_token}'
-        }
+    for item in stats_result.get('result', {}).get('items', []):
+        for stat in item.get('stats', []):
+            total_views += stat.get('uniqViews', 0)
+            total_contacts += stat.get('uniqContacts', 0)
+            total_favorites += stat.get('uniqFavorites', 0)
 
-        logger.info("Запрос информации о рейтинге пользователя")
-        
-        response = requests.get(rating_info_url, headers=rating_info_headers)
-        response.raise_for_status()
-        
-        # Проверяем, что ответ не пустой
-        if not response.text.strip():
-            logger.warning("Получен пустой ответ от API рейтинга")
-            return 0
-        
-        try:
-            result = response.json()
-            score = result.get('rating', {}).get('score', 0)
-            logger.info(f"Получен рейтинг пользователя: {score}")
-            return score
-        except json.JSONDecodeError as e:
-            logger.error(f"Ошибка декодирования JSON: {e}, содержимое ответа: {response.text[:200]}")
-            return 0
-            
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Ошибка запроса к API рейтинга: {e}")
-        return 0
-    except Exception as e:
-        logger.error(f"Непредвиденная ошибка при получении рейтинга: {e}")
-        return 0
+    # Если запросили не все объявления, экстраполируем результаты
+    if len(request_ids) < len(item_ids):
+        ratio = len(item_ids) / len(request_ids)
+        total_views = int(total_views * ratio)
+        total_contacts = int(total_contacts * ratio)
+        total_favorites = int(total_favorites * ratio)
+        logger.info(f"Экстраполяция статистики: проверено {len(request_ids)} из {len(item_ids)} объявлений")
+
+    logger.info(f"Статистика объявлений: просмотры: {total_views}, контакты: {total_contacts}, избранное: {total_favorites}")
+    return {
+        "total_views": total_views,
+        "total_contacts": total_contacts,
+        "total_favorites": total_favorites
+    }
 
+def get_items_statistics(access_token, user_id, item_ids, date_from=None, date_to=None, period_grouping="day"):
+    """Получает статистику по объявлениям: просмотры, контакты, избранное; при ошибке запроса выбрасывает исключение"""
+    empty_stats = {
+        "total_views": 0,
+        "total_contacts": 0,
+        "total_favorites": 0
+    }
+    if not item_ids:
+        logger.info("Нет объявлений для получения статистики")
+        return empty_stats
 
-def get_user_reviews(access_token, date_from=None, date_to=None, offset=0, limit=50):
-    """Получение отзывов пользователя за указанный период"""
-    try:
-        reviews_url = 'https://api.avito.ru/ratings/v1/reviews'
-        reviews_headers = {
+    date_from, date_to = default_period(date_from, date_to)
+
+    # Ограничиваем количество ID для запроса
+    request_ids = item_ids[:ITEMS_STATS_BATCH]  # API ограничение
+
+    logger.info(f"Запрос статистики по {len(request_ids)} объявлениям с {date_from} по {date_to}")
+
+    stats_response = get_avito_client().request(
+        **items_statistics_request(access_token, user_id, request_ids, date_from, date_to, period_grouping)
+    )
+    stats_result = read_json(stats_response, None, "статистики объявлений")
+    if stats_result is None:
+        return empty_stats
+
+    return sum_items_statistics(stats_result, request_ids, item_ids)
+
+
+def rating_request(access_token):
+    return {
+        'method': 'GET',
+        'url': 'https://api.avito.ru/ratings/v1/info',
+        'headers': {
             'Authorization': f'Bearer {access_token}'
         }
+    }
 
-        params = {
-            'offset': offset,
-            'limit': limit
-        }
+def get_user_rating_info(access_token):
+    """Получение рейтинга пользователя; при ошибке запроса выбрасывает исключение"""
+    logger.info("Запрос информации о рейтинге пользователя")
 
-        logger.info(f"Запрос отзывов пользователя с {date_from} по {date_to}")
-        
-        response = requests.get(reviews_url, headers=reviews_headers, params=params)
-        response.raise_for_status()
-        
-        # Проверяем, что ответ не пустой
-        if not response.text.strip():
-            logger.warning("Получен пустой ответ от API отзывов")
-            return {"total_reviews": 0, "period_reviews": 0}
-        
-        try:
-            result = response.json()
-            total_reviews = result.get('total', 0)
-            reviews = result.get('reviews', [])
-
-            # Подсчет отзывов за указанный период
-            period_reviews = 0
-
-            # Определяем временной промежуток для фильтрации
-            if date_from is None:
-                today = datetime.datetime.now().date()
-                for review in reviews:
-                    created_at = review.get('createdAt', 0)
-                    if created_at:
-                        review_date = datetime.datetime.fromtimestamp(created_at).date()
-                        if review_date == today:
-                            period_reviews += 1
-            else:
-                # Преобразуем строковые даты в объекты datetime для сравнения
-                date_from_obj = datetime.datetime.fromisoformat(date_from.split('T')[0]).date()
-                date_to_obj = datetime.datetime.fromisoformat(date_to.split('T')[0]).date() if date_to else datetime.datetime.now().date()
-                
-                for review in reviews:
-                    created_at = review.get('createdAt', 0)
-                    if created_at:
-                        review_date = datetime.datetime.fromtimestamp(created_at).date()
-                        if date_from_obj <= review_date <= date_to_obj:
-                            period_reviews += 1
-
-            logger.info(f"Получено отзывов: всего {total_reviews}, за период: {period_reviews}")
-            return {
-                "total_reviews": total_reviews,
-                "period_reviews": period_reviews
-            }
-        except json.JSONDecodeError as e:
-            logger.error(f"Ошибка декодирования JSON: {e}, содержимое ответа: {response.text[:200]}")
-            return {"total_reviews": 0, "period_reviews": 0}
-    
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Ошибка запроса к API отзывов: {e}")
-        return {"total_reviews": 0, "period_reviews": 0}
+    response = get_avito_client().request(**rating_request(access_token))
+    result = read_json(response, {}, "рейтинга")
+    score = result.get('rating', {}).get('score', 0)
+    logger.info(f"Получен рейтинг пользователя: {score}")
+    return score
+
+
+def get_user_reviews(access_token, user_id, date_from=None, date_to=None):
+    """
+    Общее число отзывов и число отзывов за период
+
+    Новые отзывы догружаются в локальную таблицу, количество за период
+    считается по ней. Если загрузка не удалась, выбрасывает CollectorFailed
+    с подсчетом по уже загруженным отзывам.
+    """
+    logger.info(f"Запрос отзывов пользователя с {date_from} по {date_to}")
+
+    try:
+        total = statistics_flight.do(("reviews", user_id), lambda: sync_reviews(access_token, user_id))
     except Exception as e:
-        logger.error(f"Непредвиденная ошибка при получении отзывов: {e}")
-        return {"total_reviews": 0, "period_reviews": 0}
+        raise CollectorFailed(
+            f"Ошибка при загрузке отзывов пользователя {user_id}: {e}",
+            fallback={"total_reviews": total_reviews(user_id), "period_reviews": count_reviews(user_id, date_from, date_to)},
+        ) from e
 
+    period_reviews = count_reviews(user_id, date_from, date_to)
+    logger.info(f"Получено отзывов: всего {total}, за период: {period_reviews}")
+    return {
+        "total_reviews": total,
+        "period_reviews": period_reviews
+    }
 
 
 
 
 def get_avito_user_id(client_id, client_secret):
-    token_url = 'https://api.avito.ru/token'
-    token_data = {
-        'grant_type': 'client_credentials',
-        'client_id': client_id,
-        'client_secret': client_secret
-    }
-    
     try:
-        # Получаем токен доступа
-        token_response = requests.post(token_url, data=token_data)
-        token_response.raise_for_status()
-        token_result = token_response.json()
-        access_token = token_result.get('access_token')
+        # Получаем токен доступа из общего кэша
+        access_token = get_access_token(client_id, client_secret)
         
         if not access_token:
             return None
@@ -740,617 +603,965 @@ def get_avito_user_id(client_id, client_secret):
             'Authorization': f'Bearer {access_token}'
         }
         
-        user_response = requests.get(user_info_url, headers=user_info_headers)
+        user_response = get_avito_client().get(user_info_url, headers=user_info_headers)
         user_response.raise_for_status()
         user_data = user_response.json()
         
         # Возвращаем Avito ID пользователя
         return user_data.get('id')
     except Exception as e:
-        print(f"Ошибка при получении Avito ID: {e}")
+        logger.error(f"Ошибка при получении Avito ID для {client_id}: {e}")
         return None
 
 
+# ID пользователя Авито по client_id, общий для всех вызовов в процессе
+_avito_user_ids = {}
 
-def get_daily_statistics(client_id, client_secret):
-    try:
-        # Получаем текущую дату и вчерашнюю дату
-        current_time = datetime.datetime.now()
-        yesterday = current_time - datetime.timedelta(days=1)
-        yesterday_start = yesterday.replace(hour=0, minute=0, second=0, microsecond=0).strftime("%Y-%m-%dT%H:%M:%SZ")
-        yesterday_end = yesterday.replace(hour=23, minute=59, second=59, microsecond=999999).strftime("%Y-%m-%dT%H:%M:%SZ")
-        
-        # Форматы дат для разных API
-        yesterday_date = yesterday.strftime("%Y-%m-%d")
-        
-        logger.info(f"Запрос дневной статистики за {yesterday_date}")
-        
-        # Получаем токен доступа
-        access_token = get_access_token(client_id, client_secret)
-        if not access_token:
-            logger.error("Не удалось получить токен доступа")
-            raise Exception("Не удалось получить токен доступа")
-            
+
+def resolve_avito_user_id(client_id, client_secret):
+    """
+    Возвращает ID пользователя Авито для аккаунта.
+    
+    ID запрашивается у API только один раз и сохраняется в AvitoAccount,
+    дальше берется из памяти процесса или из базы без обращений к API.
+    """
+    user_id = _avito_user_ids.get(client_id)
+    if user_id:
+        return user_id
+    
+    accounts = AvitoAccount.objects.filter(client_id=client_id, client_secret=client_secret)
+    user_id = accounts.exclude(avito_user_id=None).values_list('avito_user_id', flat=True).first()
+    
+    if not user_id:
         user_id = get_avito_user_id(client_id, client_secret)
         if not user_id:
-            logger.error("Не удалось получить ID пользователя")
-            raise Exception("Не удалось получить ID пользователя")
-        
-        # Инициализируем значения по умолчанию
-        total_calls = 0
-        missed_calls = 0
-        balance_info = {"balance_real": 0, "balance_bonus": 0, "advance": 0}
-        expenses_info = {"total": 0, "details": {}}
-        total_chats = 0
-        new_chats = 0
-        total_phones = 0
-        rating = 0
-        reviews_info = {"total_reviews": 0, "period_reviews": 0}
-        promotion_info = {"total_items": 0, "xl_promotion_count": 0}
-        items_stats = {"total_views": 0, "total_contacts": 0, "total_favorites": 0}
-        
-        # Создаем ключ для кэша статистики
-        stats_cache_key = f"daily_stats_{user_id}_{yesterday_date}"
-        
-        # Проверяем, есть ли у нас кэшированные данные
-        if hasattr(get_daily_statistics, '_stats_cache') and stats_cache_key in get_daily_statistics._stats_cache:
-            cache_data, cache_time = get_daily_statistics._stats_cache[stats_cache_key]
-            time_diff = (current_time - cache_time).total_seconds() / 60  # Разница в минутах
-            
-            # Используем кэш, если он не старше 30 минут
-            if time_diff < 30:
-                logger.info(f"Использование кэшированной дневной статистики ({time_diff:.1f} минут)")
-                return cache_data
-        
-        # Пытаемся получить расширенную статистику профиля, только если не было ошибок ранее
-        use_profile_stats = True
-        if hasattr(get_daily_statistics, '_profile_stats_errors'):
-            # Если было слишком много ошибок (429) в течение последнего часа, не запрашиваем API
-            last_error_time, error_count = get_daily_statistics._profile_stats_errors
-            if (current_time - last_error_time).total_seconds() < 3600 and error_count > 3:
-                logger.warning("Пропуск запроса к API статистики из-за предыдущих ошибок (Too Many Requests)")
-                use_profile_stats = False
-        else:
-            get_daily_statistics._profile_stats_errors = (datetime.datetime.min, 0)
-        
-        profile_stats = {}
-        if use_profile_stats:
-            # Получаем расширенную статистику профиля за вчерашний день
-            profile_stats = get_profile_statistics(access_token, user_id, date_from=yesterday_date, date_to=yesterday_date)
-        
-        # Если статистика успешно получена, используем ее
-        if not profile_stats is None:
-            # Используем статистику профиля для звонков и чатов
-            total_calls = profile_stats.get('calls', 0)
-            total_chats = profile_stats.get('chats', 0)
-            
-            # Обновляем статистику объявлений
-            items_stats = {
-                "total_views": profile_stats.get('views', 0),
-                "total_contacts": profile_stats.get('contacts', 0),
-                "total_favorites": profile_stats.get('favorites', 0)
-            }
-            
-            # Обновляем расходы
-            spending = profile_stats.get('spending', {})
-            if spending:
-                expenses_info = {
-                    "total": spending.get('total', 0),
-                    "details": {
-                        "presense": {
-                            "amount": spending.get('presence', 0),
-                            "count": 1,
-                            "type": "размещение",
-                            "items": []
-                        },
-                        "promo": {
-                            "amount": spending.get('promo', 0),
-                            "count": 1,
-                            "type": "продвижение",
-                            "items": []
-                        },
-                        "sales": {
-                            "amount": spending.get('sales', 0),
-                            "count": 1,
-                            "type": "продвижение",
-                            "items": []
-                        }
-                    }
-                }
-            
-            # Обновляем информацию о количестве объявлений
-            promotion_info["total_items"] = profile_stats.get('active_items', 0)
-            
-            # Сбрасываем счетчик ошибок
-            get_daily_statistics._profile_stats_errors = (datetime.datetime.min, 0)
-        else:
-            # Если получили ошибку 429, обновляем счетчик ошибок
-            if hasattr(get_profile_statistics, 'last_error_code') and get_profile_statistics.last_error_code == 429:
-                last_error_time, error_count = get_daily_statistics._profile_stats_errors
-                if (current_time - last_error_time).total_seconds() > 3600:
-                    # Если последняя ошибка была больше часа назад, сбрасываем счетчик
-                    get_daily_statistics._profile_stats_errors = (current_time, 1)
-                else:
-                    # Увеличиваем счетчик ошибок
-                    get_daily_statistics._profile_stats_errors = (last_error_time, error_count + 1)
-                
-                logger.warning(f"Зарегистрирована ошибка API статистики (429), всего: {error_count + 1} за последний час")
-            
-            # Если расширенная статистика недоступна, используем старые методы
-            try:
-                # Получаем статистику звонков за вчерашний день
-                total_calls = get_total_calls(access_token, yesterday_start, yesterday_end)
-                missed_calls = get_missed_calls(access_token, yesterday_start, yesterday_end)
-            except Exception as e:
-                logger.error(f"Ошибка при получении статистики звонков: {e}")
-            
-            try:
-                # Получаем чаты за вчерашний день
-                total_chats = get_user_chats(access_token, yesterday_start, yesterday_end)
-            except Exception as e:
-                logger.error(f"Ошибка при получении информации о чатах: {e}")
-                
-            try:
-                # Получаем информацию о объявлениях за вчерашний день
-                item_ids = get_user_items_stats(access_token, user_id, date_from=yesterday_start, date_to=yesterday_end)
-                items_stats = get_items_statistics(access_token, user_id, item_ids, date_from=yesterday_start, date_to=yesterday_end)
-                promotion_info = get_item_promotion_info(access_token, user_id, item_ids)
-            except Exception as e:
-                logger.error(f"Ошибка при получении информации об объявлениях: {e}")
-                
-            try:
-                # Получаем информацию о расходах за вчерашний день
-                expenses_info = get_operations_history(access_token, yesterday_start, yesterday_end)
-            except Exception as e:
-                logger.error(f"Ошибка при получении информации о расходах: {e}")
-        
-        # Дополняем данные, которые нельзя получить из расширенной статистики
-        try:
-            # Если статистика профиля не вернула пропущенные звонки, получаем их отдельно
-            if missed_calls == 0 and total_calls > 0:
-                missed_calls = get_missed_calls(access_token, yesterday_start, yesterday_end)
-        except Exception as e:
-            logger.error(f"Ошибка при получении информации о пропущенных звонках: {e}")
-            
-        try:
-            # Получаем новые чаты за период (функция использует фильтрацию по дате)
-            new_chats = get_chats_by_time(access_token, yesterday_start)
-            total_phones = get_all_numbers(access_token, yesterday_start, yesterday_end)
-        except Exception as e:
-            logger.error(f"Ошибка при получении дополнительной информации о чатах и телефонах: {e}")
-        
-        try:
-            # Получаем полную информацию о балансе (текущую)
-            balance_info = get_user_balance_info(access_token, user_id)
-        except Exception as e:
-            logger.error(f"Ошибка при получении информации о балансе: {e}")
-        
-        try:
-            # Получаем рейтинг и отзывы
-            rating = get_user_rating_info(access_token)
-            reviews_info = get_user_reviews(access_token, yesterday_start, yesterday_end)
-        except Exception as e:
-            logger.error(f"Ошибка при получении информации о рейтинге и отзывах: {e}")
-        
-        # Формируем и возвращаем полную статистику за вчерашний день
-        result = {
-            "date": yesterday_date,
-            "calls": {
-                "total": total_calls,
-                "missed": missed_calls,
-                "answered": total_calls - missed_calls
-            },
-            "balance_real": balance_info["balance_real"],
-            "balance_bonus": balance_info["balance_bonus"],
-            "advance": balance_info["advance"],
-            "expenses": expenses_info,
-            "chats": {
-                "total": total_chats,
-                "new": new_chats
-            },
-            "phones_received": total_phones,
-            "rating": rating,
-            "reviews": {
-                "total": reviews_info["total_reviews"],
-                "today": reviews_info["period_reviews"]
-            },
-            "items": {
-                "total": promotion_info["total_items"],
-                "with_xl_promotion": promotion_info["xl_promotion_count"]
-            },
-            "statistics": {
-                "views": items_stats["total_views"],
-                "impressions": profile_stats.get("impressions", 0),
-                "impressionsToViewsConversion": profile_stats.get("impressionsToViewsConversion", 0),
-                "contacts": items_stats["total_contacts"],
-                "favorites": items_stats["total_favorites"]
-            }
-        }
-        
-        # Сохраняем результат в кэш
-        if not hasattr(get_daily_statistics, '_stats_cache'):
-            get_daily_statistics._stats_cache = {}
-        get_daily_statistics._stats_cache[stats_cache_key] = (result, current_time)
-        
-        logger.info(f"Дневная статистика за вчера успешно получена")
-        return result
-        
-    except Exception as e:
-        logger.error(f"Ошибка при получении дневной статистики: {e}")
-        # Возвращаем структуру с нулевыми значениями в случае ошибки
-        yesterday = (datetime.datetime.now() - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
-        return {
-            "date": yesterday,
-            "calls": {"total": 0, "missed": 0, "answered": 0},
-            "balance_real": 0,
-            "balance_bonus": 0,
-            "advance": 0,
-            "expenses": {"total": 0, "details": {}},
-            "chats": {"total": 0, "new": 0},
-            "phones_received": 0,
-            "rating": 0,
-            "reviews": {"total": 0, "today": 0},
-            "items": {"total": 0, "with_xl_promotion": 0},
-            "statistics": {"views": 0, "contacts": 0, "favorites": 0}
-        }
+            return None
+        accounts.update(avito_user_id=user_id)
+        logger.info(f"Сохранен ID пользователя Авито {user_id} для {client_id}")
+    
+    _avito_user_ids[client_id] = user_id
+    return user_id
+
+
+
+def get_items_info(access_token, user_id, date_from, date_to):
+    """
+    Получает статистику и информацию о продвижении объявлений за период
+
+    Объявления обрабатываются пачками по мере получения страниц списка,
+    весь каталог в памяти не собирается.
+
+    Returns:
+        tuple: (статистика объявлений, информация о продвижении)
+    """
+    items_stats = {"total_views": 0, "total_contacts": 0, "total_favorites": 0}
+    promotion_info = {"total_items": 0, "xl_promotion_count": 0}
+
+    for item_ids in iter_chunks(iter_user_items(access_token, user_id), ITEMS_STATS_BATCH):
+        add_counts(items_stats, get_items_statistics(access_token, user_id, item_ids, date_from=date_from, date_to=date_to))
+        add_counts(promotion_info, get_item_promotion_info(access_token, user_id, item_ids))
 
+    return items_stats, promotion_info
 
-def get_weekly_statistics(client_id, client_secret):
+
+def _run_collector(func):
     try:
-        # Получаем текущую дату и дату неделю назад
-        current_time = datetime.datetime.now()
-        week_ago = current_time - datetime.timedelta(days=7)
-        week_start = week_ago.replace(hour=0, minute=0, second=0, microsecond=0).strftime("%Y-%m-%dT%H:%M:%SZ")
-        week_end = current_time.strftime("%Y-%m-%dT%H:%M:%SZ")
-        
-        # Форматы дат для разных API
-        week_start_date = week_ago.strftime("%Y-%m-%d")
-        week_end_date = current_time.strftime("%Y-%m-%d")
-        
-        logger.info(f"Запрос недельной статистики с {week_start_date} по {week_end_date}")
-        
-        # Создаем ключ для кэша статистики
-        stats_cache_key = f"weekly_stats_{week_start_date}_{week_end_date}"
-        
-        # Проверяем, есть ли у нас кэшированные данные
-        if hasattr(get_weekly_statistics, '_stats_cache') and stats_cache_key in get_weekly_statistics._stats_cache:
-            cache_data, cache_time = get_weekly_statistics._stats_cache[stats_cache_key]
-            time_diff = (current_time - cache_time).total_seconds() / 60  # Разница в минутах
-            
-            # Используем кэш, если он не старше 60 минут
-            if time_diff < 60:
-                logger.info(f"Использование кэшированной недельной статистики ({time_diff:.1f} минут)")
-                return cache_data
-        
-        # Получаем токен доступа
-        access_token = get_access_token(client_id, client_secret)
-        if not access_token:
-            logger.error("Не удалось получить токен доступа")
-            raise Exception("Не удалось получить токен доступа")
-            
-        user_id = get_avito_user_id(client_id, client_secret)
-        if not user_id:
-            logger.error("Не удалось получить ID пользователя")
-            raise Exception("Не удалось получить ID пользователя")
-        
-        # Инициализируем значения по умолчанию
-        total_calls = 0
-        missed_calls = 0
-        balance_info = {"balance_real": 0, "balance_bonus": 0, "advance": 0}
-        expenses_info = {"total": 0, "details": {}}
-        total_chats = 0
-        new_chats = 0
-        total_phones = 0
-        rating = 0
-        reviews_info = {"total_reviews": 0, "period_reviews": 0}
-        promotion_info = {"total_items": 0, "xl_promotion_count": 0}
-        items_stats = {"total_views": 0, "total_contacts": 0, "total_favorites": 0}
-        
-        # Пытаемся получить расширенную статистику профиля, только если не было ошибок ранее
-        use_profile_stats = True
-        if hasattr(get_daily_statistics, '_profile_stats_errors'):
-            # Проверяем, были ли ошибки в дневной статистике
-            last_error_time, error_count = get_daily_statistics._profile_stats_errors
-            if (current_time - last_error_time).total_seconds() < 3600 and error_count > 3:
-                logger.warning("Пропуск запроса к API статистики из-за предыдущих ошибок (Too Many Requests)")
-                use_profile_stats = False
-        
-        profile_stats = {}
-        if use_profile_stats:
-            # Получаем расширенную статистику профиля
-            profile_stats = get_profile_statistics(access_token, user_id, date_from=week_start_date, date_to=week_end_date)
-        # Если статистика успешно получена, используем ее
-        if not profile_stats is None:
-            # Используем статистику профиля для звонков и чатов
-            total_calls = profile_stats.get('calls', 0)
-            total_chats = profile_stats.get('chats', 0)
-            
-            # Обновляем статистику объявлений
-            items_stats = {
-                "total_views": profile_stats.get('views', 0),
-                "total_contacts": profile_stats.get('contacts', 0),
-                "total_favorites": profile_stats.get('favorites', 0)
-            }
-            
-            # Обновляем расходы
-            spending = profile_stats.get('spending', {})
-            if spending:
-                expenses_info = {
-                    "total": spending.get('total', 0),
-                    "details": {
-                        "presense": {
-                            "amount": spending.get('presence', 0),
-                            "count": 1,
-                            "type": "размещение",
-                            "items": []
-                        },
-                        "promo": {
-                            "amount": spending.get('promo', 0),
-                            "count": 1,
-                            "type": "продвижение",
-                            "items": []
-                        },
-                        "sales": {
-                            "amount": spending.get('sales', 0),
-                            "count": 1,
-                            "type": "продвижение",
-                            "items": []
-                        }
-                    }
-                }
-            
-            # Обновляем информацию о количестве объявлений
-            promotion_info["total_items"] = profile_stats.get('active_items', 0)
-        else:
-            # Если расширенная статистика недоступна, используем старые методы
-            try:
-                # Получаем статистику звонков
-                total_calls = get_total_calls(access_token, week_start, week_end)
-                missed_calls = get_missed_calls(access_token, week_start, week_end)
-            except Exception as e:
-                logger.error(f"Ошибка при получении статистики звонков: {e}")
-                
-            try:
-                # Получаем чаты
-                total_chats = get_user_chats(access_token, week_start, week_end)
-            except Exception as e:
-                logger.error(f"Ошибка при получении информации о чатах: {e}")
-                
+        return func()
+    finally:
+        # Django не закрывает соединения с БД в сторонних потоках сам
+        connections.close_all()
+
+
+def run_collectors(collectors, timeout=None, max_workers=None, failed=None):
+    """
+    Параллельно выполняет независимые сборщики данных в ограниченном пуле потоков
+
+    Args:
+        collectors: Словарь {имя: (функция без аргументов, значение по умолчанию[, таймаут])}
+        timeout: Таймаут сборщика в секундах, если он не указан для сборщика явно
+        max_workers: Размер пула потоков
+        failed: Список, в который добавляются имена сборщиков, замененных значением по умолчанию
+
+    Returns:
+        dict: {имя: результат}. Если сборщик завершился с ошибкой или не уложился
+              в таймаут, вместо результата возвращается его значение по умолчанию
+              (или запасное значение из CollectorFailed)
+    """
+    if not collectors:
+        return {}
+
+    timeout = timeout or settings.AVITO_COLLECTOR_TIMEOUT
+    max_workers = min(max_workers or settings.AVITO_COLLECTOR_WORKERS, len(collectors))
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="avito-collector")
+    try:
+        started_at = time.monotonic()
+        futures = {
+            # У каждого сборщика своя копия контекста, в т.ч. бюджета времени отчета
+            name: executor.submit(contextvars.copy_context().run, _run_collector, collector[0])
+            for name, collector in collectors.items()
+        }
+
+        results = {}
+        for name, future in futures.items():
+            default = collectors[name][1]
+            collector_timeout = collectors[name][2] if len(collectors[name]) > 2 else timeout
             try:
-                # Получаем информацию о объявлениях
-                item_ids = get_user_items_stats(access_token, user_id, date_from=week_start, date_to=week_end)
-                items_stats = get_items_statistics(access_token, user_id, item_ids, date_from=week_start, date_to=week_end)
-                promotion_info = get_item_promotion_info(access_token, user_id, item_ids)
+                remaining = max(started_at + collector_timeout - time.monotonic(), 0)
+                results[name] = future.result(timeout=remaining)
+            except FuturesTimeoutError:
+                logger.error(f"Сборщик {name} не уложился в {collector_timeout} с, используется значение по умолчанию")
+                results[name] = default
+                if failed is not None:
+                    failed.append(name)
             except Exception as e:
-                logger.error(f"Ошибка при получении информации об объявлениях: {e}")
-                
-            # try:
-            #     get_operations_history
-            #     # Получаем информацию о расходах
-            #     # expenses_info = get_operations_history(access_token, week_start, week_end)
-            #     expenses_info = {
-            #         "total": spending.get("total", 0),
-            #         "details": {
-            #             "promo": spending['details'].get()
-            #         }
-            #     }
-            # except Exception as e:
-            #     logger.error(f"Ошибка при получении информации о расходах: {e}")
-        
-        # Дополняем данные, которые нельзя получить из расширенной статистики
-        try:
-            # Если статистика профиля не вернула пропущенные звонки, получаем их отдельно
-            if missed_calls == 0 and total_calls > 0:
-                missed_calls = get_missed_calls(access_token, week_start, week_end)
-        except Exception as e:
-            logger.error(f"Ошибка при получении информации о пропущенных звонках: {e}")
-            
-        try:
-            # Получаем новые чаты за период
-            new_chats = get_chats_by_time(access_token, week_start)
-            total_phones = get_all_numbers(access_token, week_start, week_end)
-        except Exception as e:
-            logger.error(f"Ошибка при получении дополнительной информации о чатах и телефонах: {e}")
-        
-        try:
-            # Получаем полную информацию о балансе
-            balance_info = get_user_balance_info(access_token, user_id)
-        except Exception as e:
-            logger.error(f"Ошибка при получении информации о балансе: {e}")
-        
+                logger.error(f"Ошибка в сборщике {name}: {e}")
+                results[name] = failed_result(e, default)
+                if failed is not None:
+                    failed.append(name)
+
+        logger.info(f"Выполнено {len(collectors)} сборщиков за {time.monotonic() - started_at:.2f} с")
+        return results
+    finally:
+        # Не ждем зависшие сборщики: их результаты уже заменены значениями по умолчанию
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Общие части отчетов за период. Ими пользуются и синхронный build_period_statistics,
+# и его асинхронная версия
+
+# Значения по умолчанию для данных, которые не удалось получить
+COLLECTOR_DEFAULTS = {
+    "total_calls": 0,
+    "missed_calls": 0,
+    "balance_info": {"balance_real": 0, "balance_bonus": 0, "advance": 0},
+    "expenses_info": {"total": 0, "details": {}},
+    "total_chats": 0,
+    "new_chats": 0,
+    "total_phones": 0,
+    "rating": 0,
+    "reviews_info": {"total_reviews": 0, "period_reviews": 0},
+    "promotion_info": {"total_items": 0, "xl_promotion_count": 0},
+    "items_stats": {"total_views": 0, "total_contacts": 0, "total_favorites": 0},
+}
+
+
+# Поля отчета, которые заполняет статистика профиля
+PROFILE_FIELDS = (
+    "calls.total", "chats.total", "statistics", "impressions",
+    "items.total", "expenses.total", "expenses.details",
+)
+
+
+# Сборщики показателей отчетов за период (см. bot.collectors). Стоимость - примерное
+# число запросов к API, время жизни - сколько секунд результат остается свежим:
+# отчет запрашивает заново только сборщики с устаревшими данными. Старые методы
+# API запускаются, только если статистика профиля отключена предохранителем
+STATISTICS_COLLECTORS = CollectorRegistry([
+    Collector(
+        "missed_calls", lambda ctx: get_missed_calls(ctx.access_token, ctx.user_id, ctx.start, ctx.end),
+        families=("calltracking",), ttl=15 * 60, provides=("calls.missed",),
+    ),
+    Collector(
+        "new_chats", lambda ctx: get_chats_by_time(ctx.access_token, ctx.user_id, ctx.start),
+        families=("messenger",), ttl=15 * 60, provides=("chats.new",),
+    ),
+    Collector(
+        "total_phones", lambda ctx: get_all_numbers(ctx.access_token, ctx.start, ctx.end),
+        inputs=("access_token", "period"), families=("cpa",), ttl=15 * 60, provides=("phones_received",),
+    ),
+    Collector(
+        "balance_info", lambda ctx: get_user_balance_info(ctx.access_token, ctx.user_id),
+        default=COLLECTOR_DEFAULTS["balance_info"], inputs=("access_token", "user_id"),
+        cost=2, families=("core", "cpa"), ttl=60, provides=("balance",),
+    ),
+    Collector(
+        "rating", lambda ctx: get_user_rating_info(ctx.access_token),
+        inputs=("access_token",), families=("core",), ttl=24 * 60 * 60, provides=("rating",),
+    ),
+    Collector(
+        "reviews_info", lambda ctx: get_user_reviews(ctx.access_token, ctx.user_id, ctx.start, ctx.end),
+        default=COLLECTOR_DEFAULTS["reviews_info"], families=("core",), ttl=24 * 60 * 60, provides=("reviews",),
+    ),
+    Collector(
+        "profile_stats",
+        lambda ctx: get_profile_statistics(
+            ctx.access_token, ctx.user_id, date_from=ctx.period["date_from"], date_to=ctx.period["date_to"]
+        ),
+        default={}, cost=2, families=("stats", "core"), ttl=60 * 60, provides=PROFILE_FIELDS,
+    ),
+    # Старые методы API вместо статистики профиля
+    Collector(
+        "total_calls", lambda ctx: get_total_calls(ctx.access_token, ctx.user_id, ctx.start, ctx.end),
+        families=("calltracking",), ttl=15 * 60, provides=("calls.total",), fallback_for="profile_stats",
+    ),
+    Collector(
+        "total_chats", lambda ctx: get_user_chats(ctx.access_token, ctx.user_id, ctx.start, ctx.end),
+        families=("messenger",), ttl=15 * 60, provides=("chats.total",), fallback_for="profile_stats",
+    ),
+    Collector(
+        "items_info", lambda ctx: get_items_info(ctx.access_token, ctx.user_id, ctx.start, ctx.end),
+        default=(COLLECTOR_DEFAULTS["items_stats"], COLLECTOR_DEFAULTS["promotion_info"]),
+        cost=50, families=("core", "stats"), ttl=60 * 60,
+        provides=("statistics", "items.total", "items.xl"), fallback_for="profile_stats",
+    ),
+    Collector(
+        "expenses_info", lambda ctx: get_operations_history(ctx.access_token, ctx.user_id, ctx.start, ctx.end),
+        default=COLLECTOR_DEFAULTS["expenses_info"], families=("core",), ttl=15 * 60,
+        provides=("expenses.total", "expenses.details"), fallback_for="profile_stats",
+    ),
+])
+
+# Группы методов API (см. bot.rate_limiter.endpoint_family), от которых зависит каждый сборщик
+COLLECTOR_FAMILIES = {collector.name: collector.families for collector in STATISTICS_COLLECTORS}
+COLLECTOR_TTLS = {collector.name: collector.ttl for collector in STATISTICS_COLLECTORS}
+
+collector_cache = avito_cache.namespace("collectors", max(COLLECTOR_TTLS.values()))
+
+# Отчет целиком кэшируется на AVITO_REPORT_TTL - столько же обновляются основные
+# данные отчета (звонки, чаты, расходы), пересборка берет их из кэша сборщиков.
+# Устаревший отчет хранится еще AVITO_REPORT_STALE_GRACE секунд для выдачи по
+# кнопке (см. stale_statistics)
+daily_stats_cache = avito_cache.namespace("daily_stats", settings.AVITO_REPORT_TTL, settings.AVITO_REPORT_STALE_GRACE)
+weekly_stats_cache = avito_cache.namespace("weekly_stats", settings.AVITO_REPORT_TTL, settings.AVITO_REPORT_STALE_GRACE)
+
+
+def collector_cache_key(name, user_id, period):
+    # Данные текущих значений (баланс, рейтинг) не зависят от периода отчета
+    if STATISTICS_COLLECTORS[name].point_in_time:
+        return (user_id, name)
+    return (user_id, name, period["date_from"], period["date_to"])
+
+
+def fresh_collected(collectors, user_id, period):
+    """
+    Отделяет сборщики, данные которых в кэше еще свежие
+
+    Returns:
+        tuple: (сборщики для запуска, {имя: данные из кэша})
+    """
+    stale = {}
+    fresh = {}
+    for name, collector in collectors.items():
+        entry = collector_cache.get_entry(collector_cache_key(name, user_id, period))
+        if entry is None:
+            stale[name] = collector
+        else:
+            fresh[name] = entry[0]
+    if fresh:
+        logger.info(f"Из кэша сборщиков: {', '.join(sorted(fresh))}")
+    return stale, fresh
+
+
+def store_collected(results, unavailable, user_id, period):
+    """
+    Кэширует данные сборщиков, кроме пустых ответов и результатов сборщиков из unavailable
+
+    Функции сборщиков сообщают об ошибке исключением (см. bot.collectors.CollectorFailed),
+    поэтому значения по умолчанию и подсчеты по неполным данным попадают в unavailable.
+    """
+    for name, result in results.items():
+        if name in unavailable or result == {}:
+            continue
+        collector_cache.set(collector_cache_key(name, user_id, period), result, COLLECTOR_TTLS.get(name))
+
+
+def skip_unavailable(collectors, unavailable):
+    """
+    Отделяет сборщики, группы API которых отключены предохранителем
+
+    Returns:
+        tuple: (сборщики для запуска, {имя: значение по умолчанию} для пропущенных).
+               Имена пропущенных сборщиков добавляются в unavailable
+    """
+    active = {}
+    skipped = {}
+    for name, collector in collectors.items():
+        open_families = circuit_breakers.open_families(COLLECTOR_FAMILIES.get(name, ()))
+        if open_families:
+            logger.warning(f"Сборщик {name} пропущен: API {', '.join(open_families)} временно недоступно")
+            unavailable.append(name)
+            skipped[name] = collector[1]
+        else:
+            active[name] = collector
+    return active, skipped
+
+
+def note_unavailable(names, unavailable):
+    """Добавляет в unavailable сборщики, предохранитель которых открылся во время сбора"""
+    for name in names:
+        if name not in unavailable and circuit_breakers.open_families(COLLECTOR_FAMILIES.get(name, ())):
+            unavailable.append(name)
+
+
+def note_failed(failed, unavailable):
+    """Добавляет в unavailable сборщики, завершившиеся ошибкой"""
+    unavailable.extend(name for name in failed if name not in unavailable)
+
+
+def run_available_collectors(collectors, unavailable, user_id=None, period=None):
+    """
+    run_collectors, который сразу пропускает сборщики с открытым предохранителем
+
+    Сборщики, завершившиеся ошибкой, тоже добавляются в unavailable: их
+    резервные сборщики запускаются, а отчет не кэшируется. Если переданы user_id и period, свежие данные сборщиков берутся из кэша
+    (см. COLLECTOR_TTLS), а полученные данные кэшируются.
+    """
+    cached = {}
+    if user_id is not None:
+        collectors, cached = fresh_collected(collectors, user_id, period)
+    active, results = skip_unavailable(collectors, unavailable)
+    failed = []
+    collected = run_collectors(active, failed=failed)
+    note_unavailable(active, unavailable)
+    note_failed(failed, unavailable)
+    if user_id is not None:
+        store_collected(collected, unavailable, user_id, period)
+    results.update(collected)
+    results.update(cached)
+    return results
+
+
+def collector_default(name):
+    return copy.deepcopy(COLLECTOR_DEFAULTS[name])
+
+
+def daily_period(current_time):
+    """Границы вчерашнего дня в форматах разных API"""
+    yesterday = current_time - datetime.timedelta(days=1)
+    return {
+        "start": yesterday.replace(hour=0, minute=0, second=0, microsecond=0).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "end": yesterday.replace(hour=23, minute=59, second=59, microsecond=999999).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "date_from": yesterday.strftime("%Y-%m-%d"),
+        "date_to": yesterday.strftime("%Y-%m-%d"),
+    }
+
+
+def range_period(first_day, last_day, current_time):
+    """Границы периода с first_day по last_day (период до сегодня заканчивается текущим временем)"""
+    if last_day >= current_time.date():
+        end = current_time.strftime("%Y-%m-%dT%H:%M:%SZ")
+    else:
+        end = f"{last_day.isoformat()}T23:59:59Z"
+    return {
+        "start": f"{first_day.isoformat()}T00:00:00Z",
+        "end": end,
+        "date_from": first_day.isoformat(),
+        "date_to": last_day.isoformat(),
+    }
+
+
+def weekly_period(current_time):
+    """Границы последних 7 дней в форматах разных API"""
+    week_ago = current_time - datetime.timedelta(days=7)
+    return {
+        "start": week_ago.replace(hour=0, minute=0, second=0, microsecond=0).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "end": current_time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "date_from": week_ago.strftime("%Y-%m-%d"),
+        "date_to": current_time.strftime("%Y-%m-%d"),
+    }
+
+
+def get_cached_statistics(cache, cache_key, label):
+    """Возвращает отчет из пространства кэша cache, если он еще не устарел"""
+    entry = cache.get_entry(cache_key)
+    if entry is None:
+        return None
+    cache_data, age = entry
+    logger.info(f"Использование кэшированной {label} статистики ({age / 60:.1f} минут)")
+    return cache_data
+
+
+def store_cached_statistics(cache, cache_key, result):
+    cache.set(cache_key, result)
+
+
+# Ключи отчетов, которые сейчас пересобираются в фоне
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def refresh_in_background(flight_key, build):
+    """
+    Пересобирает отчет в фоновом потоке
+
+    Пока отчет пересобирается, новые нажатия кнопки не запускают потоков:
+    single-flight объединил бы только сборки, уже начавшиеся в потоках.
+    """
+    with _refreshing_lock:
+        if flight_key in _refreshing:
+            return
+        _refreshing.add(flight_key)
+
+    def refresh():
         try:
-            # Получаем рейтинг и отзывы
-            rating = get_user_rating_info(access_token)
-            reviews_info = get_user_reviews(access_token, week_start, week_end)
-        except Exception as e:
-            logger.error(f"Ошибка при получении информации о рейтинге и отзывах: {e}")
-        
-        # Формируем и возвращаем полную статистику за неделю
-        result = {
-            "period": f"{week_ago.strftime('%Y-%m-%d')} - {current_time.strftime('%Y-%m-%d')}",
-            "calls": {
-                "total": total_calls,
-                "missed": missed_calls,
-                "answered": total_calls - missed_calls
-            },
-            "balance_real": balance_info["balance_real"],
-            "balance_bonus": balance_info["balance_bonus"],
-            "advance": balance_info["advance"],
-            "expenses": expenses_info,
-            "chats": {
-                "total": total_chats,
-                "new": new_chats
-            },
-            "phones_received": total_phones,
-            "rating": rating,
-            "reviews": {
-                "total": reviews_info["total_reviews"],
-                "weekly": reviews_info["period_reviews"]
+            statistics_flight.do(flight_key, build)
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(flight_key)
+
+    threading.Thread(target=_run_collector, args=(refresh,), name="avito-report-refresh", daemon=True).start()
+
+
+def stale_statistics(cache, client_id, client_secret, period, metrics, flight_key, build, report_format=None):
+    """
+    Отчет из кэша для выдачи по кнопке без ожидания API
+
+    Свежий отчет возвращается как есть. Устаревший (в пределах
+    AVITO_REPORT_STALE_GRACE) возвращается с возрастом в секундах в ключе
+    stale_age, а отчет тем временем пересобирается в фоне.
+
+    Returns:
+        dict: Отчет или None, если в кэше его нет
+    """
+    user_id = resolve_avito_user_id(client_id, client_secret)
+    if not user_id:
+        return None
+    entry = cache.get_stale_entry(statistics_cache_key(user_id, period, metrics, report_format))
+    if entry is None:
+        return None
+    result, age, fresh = entry
+    if fresh:
+        return result
+    logger.info(f"Выдаем отчет из кэша ({age / 60:.1f} минут), обновляем в фоне")
+    refresh_in_background(flight_key, build)
+    return {**result, "stale_age": age}
+
+
+def spending_to_expenses(spending):
+    """Переводит расходы из статистики профиля в формат детализации операций"""
+    return {
+        "total": spending.get('total', 0),
+        "details": {
+            "presense": {
+                "amount": spending.get('presence', 0),
+                "count": 1,
+                "type": "размещение",
+                "items": []
             },
-            "items": {
-                "total": promotion_info["total_items"],
-                "with_xl_promotion": promotion_info["xl_promotion_count"]
+            "promo": {
+                "amount": spending.get('promo', 0),
+                "count": 1,
+                "type": "продвижение",
+                "items": []
             },
-            "statistics": {
-                "views": items_stats["total_views"],
-                "impressions": profile_stats.get("impressions", 0),
-                "impressionsToViewsConversion": profile_stats.get("impressionsToViewsConversion", 0),
-                "contacts": items_stats["total_contacts"],
-                "favorites": items_stats["total_favorites"]
+            "sales": {
+                "amount": spending.get('sales', 0),
+                "count": 1,
+                "type": "продвижение",
+                "items": []
             }
         }
-        
-        # Сохраняем результат в кэш
-        if not hasattr(get_weekly_statistics, '_stats_cache'):
-            get_weekly_statistics._stats_cache = {}
-        get_weekly_statistics._stats_cache[stats_cache_key] = (result, current_time)
-        
-        logger.info(f"Недельная статистика успешно получена")
+    }
+
+
+def apply_profile_stats(parts, profile_stats):
+    """Заполняет звонки, чаты, объявления и расходы из статистики профиля"""
+    # Используем статистику профиля для звонков и чатов
+    parts["total_calls"] = profile_stats.get('calls', 0)
+    parts["total_chats"] = profile_stats.get('chats', 0)
+
+    # Обновляем статистику объявлений
+    parts["items_stats"] = {
+        "total_views": profile_stats.get('views', 0),
+        "total_contacts": profile_stats.get('contacts', 0),
+        "total_favorites": profile_stats.get('favorites', 0)
+    }
+
+    # Обновляем расходы
+    spending = profile_stats.get('spending', {})
+    if spending:
+        parts["expenses_info"] = spending_to_expenses(spending)
+
+    # Обновляем информацию о количестве объявлений
+    parts["promotion_info"]["total_items"] = profile_stats.get('active_items', 0)
+
+
+def apply_legacy_stats(parts, legacy):
+    """Заполняет части отчета из старых методов API (из тех, что входят в отчет)"""
+    for name in ("total_calls", "total_chats", "expenses_info"):
+        if name in legacy:
+            parts[name] = legacy[name]
+    if "items_info" in legacy:
+        parts["items_stats"], parts["promotion_info"] = legacy["items_info"]
+
+
+def collected_parts(collected):
+    """Части отчета из результатов сборщиков, остальные - значения по умолчанию"""
+    parts = {name: collector_default(name) for name in COLLECTOR_DEFAULTS}
+    for name in ("new_chats", "total_phones", "balance_info", "rating", "reviews_info"):
+        if name in collected:
+            parts[name] = collected[name]
+    return parts
+
+
+def build_statistics(parts, collected, profile_stats, reviews_key, unavailable=()):
+    """
+    Формирует тело отчета за период
+
+    Args:
+        parts: Части отчета (звонки, чаты, баланс, расходы и т.д.)
+        collected: Результаты сборщиков
+        profile_stats: Статистика профиля
+        reviews_key: Ключ отзывов за период (см. REPORT_KINDS)
+        unavailable: Сборщики, данные которых не удалось получить из-за сбоя API
+    """
+    # Пропущенные звонки учитываем только если за период были звонки
+    total_calls = parts["total_calls"]
+    missed_calls = collected.get("missed_calls", 0) if total_calls > 0 else 0
+
+    balance_info = parts["balance_info"]
+    reviews_info = parts["reviews_info"]
+    promotion_info = parts["promotion_info"]
+    items_stats = parts["items_stats"]
+    return {
+        "calls": {
+            "total": total_calls,
+            "missed": missed_calls,
+            "answered": total_calls - missed_calls
+        },
+        "balance_real": balance_info["balance_real"],
+        "balance_bonus": balance_info["balance_bonus"],
+        "advance": balance_info["advance"],
+        "expenses": parts["expenses_info"],
+        "chats": {
+            "total": parts["total_chats"],
+            "new": parts["new_chats"]
+        },
+        "phones_received": parts["total_phones"],
+        "rating": parts["rating"],
+        "reviews": {
+            "total": reviews_info["total_reviews"],
+            reviews_key: reviews_info["period_reviews"]
+        },
+        "items": {
+            "total": promotion_info["total_items"],
+            "with_xl_promotion": promotion_info["xl_promotion_count"]
+        },
+        "statistics": {
+            "views": items_stats["total_views"],
+            "impressions": profile_stats.get("impressions", 0),
+            "impressionsToViewsConversion": profile_stats.get("impressionsToViewsConversion", 0),
+            "contacts": items_stats["total_contacts"],
+            "favorites": items_stats["total_favorites"]
+        },
+        "unavailable": list(unavailable)
+    }
+
+
+def empty_statistics(reviews_key):
+    """Структура отчета с нулевыми значениями на случай ошибки"""
+    return {
+        "calls": {"total": 0, "missed": 0, "answered": 0},
+        "balance_real": 0,
+        "balance_bonus": 0,
+        "advance": 0,
+        "expenses": {"total": 0, "details": {}},
+        "chats": {"total": 0, "new": 0},
+        "phones_received": 0,
+        "rating": 0,
+        "reviews": {"total": 0, reviews_key: 0},
+        "items": {"total": 0, "with_xl_promotion": 0},
+        "statistics": {"views": 0, "contacts": 0, "favorites": 0}
+    }
+
+
+# Наборы данных отчетов, входят в ключ объединения одинаковых запросов
+DAILY_METRICS = tuple(sorted(STATISTICS_COLLECTORS.names()))
+WEEKLY_METRICS = tuple(name for name in DAILY_METRICS if name != "expenses_info")
+
+# Виды отчетов: ключ отзывов за период и название для журнала
+REPORT_KINDS = {
+    "day": ("today", "дневной"),
+    "week": ("weekly", "недельной"),
+    "month": ("period", "месячной"),
+    "range": ("period", "периодной"),
+}
+
+# Отчеты за произвольный период кэшируются так же, как дневные и недельные
+period_stats_cache = avito_cache.namespace("period_stats", settings.AVITO_REPORT_TTL)
+
+# Все поля отчета и поля, которые показывают форматы отчетов (см. format_*_report_*
+# в bot.handlers.common). Число объявлений с XL продвижением дает только обход всех
+# объявлений, поэтому, как и раньше, оно заполняется лишь при отказе статистики профиля
+REPORT_FIELDS = frozenset().union(*(
+    collector.provides for collector in STATISTICS_COLLECTORS if collector.fallback_for is None
+))
+REPORT_FORMAT_FIELDS = {
+    "new": frozenset((
+        "calls.total", "calls.missed", "statistics", "impressions", "items.total",
+        "expenses.total", "expenses.details", "reviews", "balance",
+    )),
+    "standard": frozenset((
+        "calls.total", "calls.missed", "chats.total", "phones_received", "rating", "reviews",
+        "items.total", "statistics", "balance", "expenses.total", "expenses.details",
+    )),
+}
+
+
+def stored_profile_stats(stored):
+    """Статистика профиля из сохраненной статистики (без детализации расходов)"""
+    totals = stored.totals
+    return {
+        "calls": totals['total_calls'],
+        "chats": totals['total_chats'],
+        "views": totals['views'],
+        "contacts": totals['contacts'],
+        "favorites": totals['favorites'],
+        "impressions": totals['impressions'],
+        "impressionsToViewsConversion": totals['impressionsToViewsConversion'],
+        "active_items": stored.latest['total_items'],
+        "spending": {"total": totals['daily_expense']},
+    }
+
+
+def merge_profile_stats(stored, live):
+    """Дополняет статистику профиля из сохраненной статистики данными API за остальные дни"""
+    merged = {key: stored[key] + live.get(key, 0) for key in ("calls", "chats", "views", "contacts", "favorites", "impressions")}
+    # Конверсию взвешиваем по показам, число объявлений - текущее
+    weighted = (stored["impressionsToViewsConversion"] * stored["impressions"]
+                + live.get("impressionsToViewsConversion", 0) * live.get("impressions", 0))
+    merged["impressionsToViewsConversion"] = weighted / merged["impressions"] if merged["impressions"] else 0
+    merged["active_items"] = live.get("active_items", stored["active_items"])
+    merged["spending"] = {"total": stored["spending"]["total"] + live.get("spending", {}).get("total", 0)}
+    return merged
+
+
+# Данные сборщиков, которые можно взять из AvitoAccountDailyStats вместо API
+# (см. bot.stored_stats): {сборщик: (поля отчета, StoredPeriod -> результат,
+# слияние с результатом API за дни без статистики)}. Это те же поля, что
+# заполняет историческая статистика (см. bot.backfill)
+STORED_SOURCES = {
+    "missed_calls": (
+        ("calls.missed",),
+        lambda stored: stored.totals['missed_calls'],
+        lambda stored, live: stored + live,
+    ),
+    "reviews_info": (
+        ("reviews",),
+        lambda stored: {"total_reviews": stored.latest['total_reviews'], "period_reviews": stored.totals['daily_reviews']},
+        lambda stored, live: {
+            "total_reviews": live["total_reviews"] or stored["total_reviews"],
+            "period_reviews": stored["period_reviews"] + live["period_reviews"],
+        },
+    ),
+    "profile_stats": (
+        ("calls.total", "chats.total", "statistics", "impressions", "items.total", "expenses.total"),
+        stored_profile_stats,
+        merge_profile_stats,
+    ),
+}
+
+# Названия источников для журнала
+SOURCE_LABELS = {"cache": "кэш", "stored": "сохраненная статистика", "api": "API"}
+
+
+class SourcePlan:
+    """
+    Источники данных отчета
+
+    Attributes:
+        metrics: Сборщики для запуска (вместе с резервными)
+        values: {сборщик: данные} из кэша и сохраненной статистики
+        completions: Сборщики из values, данные которых нужно дополнить за дни windows
+        windows: Отрезки дней без сохраненной статистики [(первый день, последний день)]
+        skipped: Сборщики, поля которых формат отчета не показывает (кроме резервных)
+        cost: Оценка числа запросов к API (без резервных сборщиков)
+    """
+
+    def __init__(self, metrics, values, skipped, cost, completions=(), windows=()):
+        self.metrics = metrics
+        self.values = values
+        self.completions = completions
+        self.windows = windows
+        self.skipped = skipped
+        self.cost = cost
+
+
+def source_candidates(collectors, fields, user_id, period, stored):
+    """
+    Возможные источники полей fields: свежий кэш, сохраненная статистика и API
+
+    Сохраненная статистика стоит столько, сколько запросов нужно за дни без нее.
+    """
+    candidates = []
+    for collector in collectors:
+        covered = collector.provides & fields
+        if not covered:
+            continue
+        entry = collector_cache.get_entry(collector_cache_key(collector.name, user_id, period))
+        if entry is not None:
+            candidates.append(SourceCandidate(collector.name, "cache", 0, covered, entry[0]))
+            continue
+        if stored is not None and collector.name in STORED_SOURCES:
+            stored_fields, from_stored, _ = STORED_SOURCES[collector.name]
+            if covered & set(stored_fields):
+                candidates.append(SourceCandidate(
+                    collector.name, "stored", collector.cost * len(stored.missing),
+                    covered & set(stored_fields), from_stored(stored),
+                ))
+        candidates.append(SourceCandidate(collector.name, "api", collector.cost, covered))
+    return candidates
+
+
+def plan_sources(metrics, report_format, user_id, period, stored=None):
+    """
+    Выбирает для каждого показанного форматом поля самый дешевый источник
+
+    Сборщики, поля которых формат не показывает, не запускаются. Данные
+    берутся из свежего кэша сборщиков или из сохраненной статистики дней
+    периода (stored, у API запрашиваются только остальные дни), остальное
+    запрашивается у API с наименьшим числом запросов. Резервные сборщики
+    выбранных из API добавляются в план на случай отказа. Без формата
+    нужны все поля отчета.
+    """
+    fields = REPORT_FORMAT_FIELDS.get(report_format, REPORT_FIELDS)
+    collectors = [STATISTICS_COLLECTORS[name] for name in metrics]
+    chosen, uncovered = choose_sources(fields, source_candidates(collectors, fields, user_id, period, stored))
+
+    from_api = [name for name, candidate in chosen.items() if candidate.source == "api"]
+    fallbacks = [
+        collector.name for collector in collectors
+        if collector.fallback_for in from_api and collector.name not in chosen
+        and collector.provides & chosen[collector.fallback_for].fields
+    ]
+    completions = [
+        name for name, candidate in chosen.items() if candidate.source == "stored" and stored.missing
+    ]
+    # Поля резервных сборщиков заполняет основной, поэтому пропущенными они не считаются
+    skipped = [
+        collector.name for collector in collectors
+        if not collector.provides & fields and collector.fallback_for is None
+    ]
+    cost = sum(candidate.cost for candidate in chosen.values())
+
+    sources = ", ".join(
+        f"{name} - {SOURCE_LABELS[candidate.source]}" for name, candidate in sorted(chosen.items())
+    )
+    if completions:
+        sources += f"; дни без статистики: {', '.join(f'{first} - {last}' for first, last in stored.missing)}"
+    logger.info(
+        f"План источников отчета ({report_format or 'полный'}): {sources}; резерв: {', '.join(fallbacks) or 'нет'}; "
+        f"не нужны: {', '.join(skipped) or 'нет'}; оценка {cost} запросов к API"
+    )
+    if uncovered:
+        logger.warning(f"Нет источника для полей отчета: {', '.join(sorted(uncovered))}")
+    return SourcePlan(
+        tuple(from_api + fallbacks),
+        {name: candidate.value for name, candidate in chosen.items() if candidate.source != "api"},
+        skipped,
+        cost,
+        completions,
+        stored.missing if completions else (),
+    )
+
+
+def report_header(period, kind):
+    """Дата дневного отчета или период остальных"""
+    if kind == "day":
+        return {"date": period["date_from"]}
+    return {"period": f"{period['date_from']} - {period['date_to']}"}
+
+
+def statistics_cache_key(user_id, period, metrics, report_format=None):
+    return (user_id, period["date_from"], period["date_to"], metrics, report_format)
+
+
+def statistics_context(client_id, client_secret, period):
+    """Входные данные сборщиков: токен доступа, ID пользователя и период"""
+    access_token = get_access_token(client_id, client_secret)
+    if not access_token:
+        logger.error("Не удалось получить токен доступа")
+        raise Exception("Не удалось получить токен доступа")
+
+    user_id = resolve_avito_user_id(client_id, client_secret)
+    if not user_id:
+        logger.error("Не удалось получить ID пользователя")
+        raise Exception("Не удалось получить ID пользователя")
+    return CollectorContext(access_token, user_id, period)
+
+
+def assemble_statistics(collected, unavailable, period, kind, skipped=()):
+    """Собирает отчет из результатов сборщиков"""
+    profile_stats = collected.get("profile_stats", {})
+    parts = collected_parts(collected)
+    if "profile_stats" in unavailable and not profile_stats:
+        # API статистики отключено предохранителем - данные получены старыми методами
+        profile_stats = {}
+    else:
+        apply_profile_stats(parts, profile_stats)
+    # Старые методы API - резерв статистики профиля или источник полей, которых в ней нет
+    apply_legacy_stats(parts, collected)
+    result = {**report_header(period, kind), **build_statistics(parts, collected, profile_stats, REPORT_KINDS[kind][0], unavailable)}
+    if skipped:
+        result["skipped"] = list(skipped)
+    return result
+
+
+def collection_plan(metrics, report_format, context):
+    """План источников отчета с сохраненной статистикой дней периода"""
+    try:
+        stored = stored_period(
+            context.user_id,
+            datetime.date.fromisoformat(context.period["date_from"]),
+            datetime.date.fromisoformat(context.period["date_to"]),
+        )
+    except Exception as e:
+        # Без сохраненной статистики все запрашивается у API
+        logger.error(f"Ошибка при чтении сохраненной статистики пользователя {context.user_id}: {e}")
+        stored = None
+    return plan_sources(metrics, report_format, context.user_id, context.period, stored)
+
+
+def window_context(context, first_day, last_day):
+    """Входные данные сборщиков за часть периода отчета"""
+    return CollectorContext(
+        context.access_token, context.user_id, range_period(first_day, last_day, datetime.datetime.now())
+    )
+
+
+def merge_completions(values, completions, results):
+    for name in completions:
+        values[name] = STORED_SOURCES[name][2](values[name], results[name])
+
+
+def complete_stored(source_plan, context, unavailable):
+    """Дополняет данные из сохраненной статистики данными API за дни без нее"""
+    for first_day, last_day in source_plan.windows:
+        window = window_context(context, first_day, last_day)
+        results = run_available_collectors(
+            {name: STATISTICS_COLLECTORS[name].task(window) for name in source_plan.completions},
+            unavailable, context.user_id, window.period,
+        )
+        merge_completions(source_plan.values, source_plan.completions, results)
+
+
+@report_budget
+def build_period_statistics(client_id, client_secret, period, kind, metrics, cache, report_format=None):
+    """
+    Отчет за период: для полей отчета (с форматом report_format - только
+    показанных им) выбираются самые дешевые источники (см. plan_sources),
+    сборщики выполняются по плану (независимые - параллельно), результат
+    кэшируется в cache
+    """
+    reviews_key, label = REPORT_KINDS[kind]
+    try:
+        logger.info(f"Запрос {label} статистики с {period['date_from']} по {period['date_to']}")
+        context = statistics_context(client_id, client_secret, period)
+
+        # Используем кэш готового отчета, если он еще свежий
+        cache_key = statistics_cache_key(context.user_id, period, metrics, report_format)
+        cached = get_cached_statistics(cache, cache_key, label)
+        if cached is not None:
+            return cached
+
+        source_plan = collection_plan(metrics, report_format, context)
+        unavailable = []
+        complete_stored(source_plan, context, unavailable)
+        collected = {**source_plan.values, **run_plan(
+            STATISTICS_COLLECTORS.plan(source_plan.metrics), context,
+            lambda tasks, unavailable: run_available_collectors(tasks, unavailable, context.user_id, period),
+            unavailable,
+        )}
+        result = assemble_statistics(collected, unavailable, period, kind, source_plan.skipped)
+        # Неполный отчет не кэшируем, чтобы следующий запрос попробовал получить недостающее
+        if not unavailable:
+            store_cached_statistics(cache, cache_key, result)
+
+        logger.info(f"Статистика ({label}) успешно получена")
+        logger.info(f"Соединения с API Авито: {get_avito_client().get_connection_stats()}")
         return result
-        
+
     except Exception as e:
-        logger.error(f"Ошибка при получении недельной статистики: {e}")
+        logger.error(f"Ошибка при получении {label} статистики: {e}")
         # Возвращаем структуру с нулевыми значениями в случае ошибки
-        return {
-            "period": f"{week_ago.strftime('%Y-%m-%d')} - {current_time.strftime('%Y-%m-%d')}",
-            "calls": {"total": 0, "missed": 0, "answered": 0},
-            "balance_real": 0,
-            "balance_bonus": 0,
-            "advance": 0,
-            "expenses": {"total": 0, "details": {}},
-            "chats": {"total": 0, "new": 0},
-            "phones_received": 0,
-            "rating": 0,
-            "reviews": {"total": 0, "weekly": 0},
-            "items": {"total": 0, "with_xl_promotion": 0},
-            "statistics": {"views": 0, "contacts": 0, "favorites": 0}
-        }
+        return {**report_header(period, kind), **empty_statistics(reviews_key)}
+
+
+def report_statistics(cache, client_id, client_secret, period, metrics, flight_key, build, allow_stale, report_format):
+    """Отчет по ключу flight_key: с allow_stale - из кэша (см. stale_statistics), иначе собранный build"""
+    if allow_stale:
+        cached = stale_statistics(cache, client_id, client_secret, period, metrics, flight_key, build, report_format)
+        if cached is not None:
+            return cached
+    return statistics_flight.do(flight_key, build)
+
+
+def get_daily_statistics(client_id, client_secret, *, allow_stale=False, report_format=None):
+    """
+    Статистика аккаунта за вчерашний день
+
+    Одновременные запросы отчета по одному аккаунту (например, cron и
+    кнопка в боте) выполняются один раз, остальные ждут готовый результат.
+    С allow_stale устаревший отчет из кэша выдается сразу (см. stale_statistics).
+    С report_format собираются только поля этого формата (см. plan_sources).
+    """
+    period = daily_period(datetime.datetime.now())
+    flight_key = ("daily", client_id, period["date_from"], DAILY_METRICS, report_format)
+    build = lambda: build_period_statistics(
+        client_id, client_secret, period, "day", DAILY_METRICS, daily_stats_cache, report_format
+    )
+    return report_statistics(
+        daily_stats_cache, client_id, client_secret, period, DAILY_METRICS, flight_key, build, allow_stale, report_format
+    )
+
+
+def get_weekly_statistics(client_id, client_secret, *, allow_stale=False, report_format=None):
+    """Статистика аккаунта за последние 7 дней, одновременные запросы объединяются"""
+    period = weekly_period(datetime.datetime.now())
+    flight_key = ("weekly", client_id, period["date_from"], period["date_to"], WEEKLY_METRICS, report_format)
+    build = lambda: build_period_statistics(
+        client_id, client_secret, period, "week", WEEKLY_METRICS, weekly_stats_cache, report_format
+    )
+    return report_statistics(
+        weekly_stats_cache, client_id, client_secret, period, WEEKLY_METRICS, flight_key, build, allow_stale, report_format
+    )
+
+
+def get_period_statistics(client_id, client_secret, first_day, last_day, kind="range", metrics=DAILY_METRICS):
+    """
+    Статистика аккаунта за произвольный период (например, месяц)
+
+    Args:
+        first_day, last_day: Первый и последний день периода (datetime.date)
+        kind: Вид отчета из REPORT_KINDS
+        metrics: Показатели отчета (имена сборщиков)
+    """
+    period = range_period(first_day, last_day, datetime.datetime.now())
+    metrics = tuple(sorted(metrics))
+    return statistics_flight.do(
+        (kind, client_id, period["date_from"], period["date_to"], metrics),
+        lambda: build_period_statistics(client_id, client_secret, period, kind, metrics, period_stats_cache)
+    )
 
-def get_operations_history(access_token, date_from, date_to):
+def get_operations_history(access_token, user_id, date_from, date_to):
     """
     Получает историю операций пользователя за указанный период
     и возвращает детализацию расходов.
-    
+
+    Новые операции догружаются в журнал операций, расходы считаются по нему.
+
     Args:
         access_token: Токен доступа к API
+        user_id: ID пользователя Авито
         date_from: Начало периода в формате строки ISO (например, '2023-04-01T00:00:00Z')
         date_to: Конец периода в формате строки ISO (например, '2023-04-08T00:00:00Z')
-        
+
     Returns:
-        dict: Словарь с общей суммой расходов и детализацией по типам услуг
+        dict: Словарь с общей суммой расходов и детализацией по типам услуг.
+              Если загрузка не удалась, выбрасывает CollectorFailed с
+              расходами по уже загруженным операциям
     """
-    try:
-        # URL для получения истории операций
-        operations_url = 'https://api.avito.ru/core/v1/accounts/operations_history/'
-        
-        # Заголовки запроса
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Content-Type': 'application/json'
-        }
-        
-        # Данные запроса
-        data = {
-            'dateTimeFrom': date_from,
-            'dateTimeTo': date_to,
-            'limit': 1000  # Увеличиваем лимит для получения большего количества операций
-        }
-        
-        logger.info(f"Запрос истории операций с {date_from} по {date_to}")
-        
-        # Выполняем запрос
-        response = requests.post(operations_url, headers=headers, json=data)
-        response.raise_for_status()
-        
-        # Проверяем, что ответ не пустой
-        if not response.text.strip():
-            logger.error("Получен пустой ответ от API операций")
-            return {'total': 0, 'details': {}}
-            
-        # Парсим JSON ответ
-        try:
-            result = response.json()
-            logger.info(f"Получен ответ от API операций с {len(result.get('operations', []))} операциями")
-        except json.JSONDecodeError as e:
-            logger.error(f"Ошибка декодирования JSON: {e}, содержимое ответа: {response.text}")
-            return {'total': 0, 'details': {}}
-        
-        # Инициализируем счетчики и структуру для детализации расходов
-        total_expenses = 0
-        expenses_details = {}
-        
-        # Обрабатываем все операции
-        for operation in result.get('operations', []):
-            # Тип операции
-            operation_type = operation.get('operationType', '')
-            
-            # Считаем только операции расхода средств
-            expense_types = [
-                'резервирование средств под услугу',
-                'списание за услугу',
-                'резервирование средств',
-                'списание средств',
-                'списание',
-                'оплата услуги'
-            ]
-            
-            if operation_type.lower() not in [t.lower() for t in expense_types]:
-                continue
-                
-            # Получаем сумму расхода
-            amount_rub = float(operation.get('amountRub', 0))
-            if amount_rub <= 0:
-                continue
-                
-            # Добавляем в общую сумму расходов
-            total_expenses += amount_rub
-            
-            # Получаем информацию о типе услуги
-            service_name = operation.get('serviceName', 'Неизвестно')
-            operation_name = operation.get('operationName', 'Неизвестно')
-            service_type = operation.get('serviceType', 'Неизвестно')
-            item_id = operation.get('itemId', 'Неизвестно')
-            
-            # Формируем ключ для группировки
-            key = f"{service_name}"
-            if service_type and service_type != 'Неизвестно':
-                key += f" ({service_type})"
-            
-            # Добавляем или обновляем запись в детализации
-            if key in expenses_details:
-                expenses_details[key]['amount'] += amount_rub
-                expenses_details[key]['count'] += 1
-                if item_id and item_id != 'Неизвестно':
-                    expenses_details[key]['items'].add(str(item_id))
-            else:
-                expenses_details[key] = {
-                    'amount': amount_rub,
-                    'count': 1,
-                    'type': operation_type,
-                    'items': {str(item_id)} if item_id and item_id != 'Неизвестно' else set()
-                }
-        
-        # Преобразуем множества объявлений в списки для сериализации JSON
-        for key in expenses_details:
-            expenses_details[key]['items'] = list(expenses_details[key]['items'])
-            if len(expenses_details[key]['items']) == 1 and expenses_details[key]['items'][0] == 'Неизвестно':
-                expenses_details[key]['items'] = []
-        
-        # Формируем структуру с результатами
-        result = {
-            'total': total_expenses,
-            'details': expenses_details
-        }
-        
-        logger.info(f"Расходы за период: общая сумма {total_expenses:.2f} руб., {len(expenses_details)} категорий")
-        return result
-    except Exception as e:
-        logger.error(f"Ошибка при получении истории операций: {e}")
-        return {
-            'total': 0,
-            'details': {}
-        }
+    logger.info(f"Запрос истории операций с {date_from} по {date_to}")
 
+    return synced_count(
+        lambda: statistics_flight.do(
+            ("operations", user_id, date_from, date_to),
+            lambda: ingest_operations(access_token, user_id, date_from, date_to)
+        ),
+        lambda: expense_breakdown(user_id, date_from, date_to),
+        f"операций пользователя {user_id}",
+    )
 
 
 
@@ -1488,214 +1699,252 @@ def get_operations_history(access_token, date_from, date_to):
 
 
 
-def get_daily_expenses(access_token):
+def get_daily_expenses(access_token, user_id):
     """Получает расходы за текущий день"""
     # Получаем текущую дату и начало дня
     current_time = datetime.datetime.now()
     day_start = current_time.replace(hour=0, minute=0, second=0, microsecond=0).strftime("%Y-%m-%dT%H:%M:%SZ")
     current_iso = current_time.strftime("%Y-%m-%dT%H:%M:%SZ")
-    
+
     logger.info(f"Запрос дневных расходов с {day_start} по {current_iso}")
-    
+
     # Получаем расходы
-    return get_operations_history(access_token, day_start, current_iso)
+    return get_operations_history(access_token, user_id, day_start, current_iso)
 
-def get_weekly_expenses(access_token):
+def get_weekly_expenses(access_token, user_id):
     """Получает расходы за текущую неделю"""
     # Получаем текущую дату и начало недели (7 дней назад)
     current_time = datetime.datetime.now()
     week_start = (current_time - datetime.timedelta(days=7)).replace(hour=0, minute=0, second=0, microsecond=0).strftime("%Y-%m-%dT%H:%M:%SZ")
     current_iso = current_time.strftime("%Y-%m-%dT%H:%M:%SZ")
-    
+
     logger.info(f"Запрос недельных расходов с {week_start} по {current_iso}")
-    
+
     # Получаем расходы
-    return get_operations_history(access_token, week_start, current_iso)
+    return get_operations_history(access_token, user_id, week_start, current_iso)
+
+# Набор всех нужных метрик статистики профиля
+PROFILE_METRICS = [
+    "views",                         # Просмотры
+    "contacts",                      # Контакты (общее)
+    "contactsShowPhone",             # Посмотрели телефон
+    "contactsMessenger",             # Написали в чат
+    "favorites",                     # В избранном
+    "impressions",                   # Показы
+    "allSpending",                   # Все расходы
+    "spending",                      # Расходы на объявления
+    "presenceSpending",              # Расходы на размещение
+    "promoSpending",                 # Расходы на продвижение
+    "activeItems",                   # Активные объявления
+    "impressions",                   # Показы
+    "impressionsToViewsConversion"   # Конверсия
+]
+
+def profile_period(date_from=None, date_to=None, grouping="totals"):
+    """Период статистики профиля по умолчанию в формате YYYY-MM-DD"""
+    # Если даты не указаны, используем текущий день/неделю
+    if date_from is None:
+        current_time = datetime.datetime.now()
+        if grouping == "totals":
+            # Для общей статистики берем последние 30 дней
+            date_from = (current_time - datetime.timedelta(days=30)).strftime("%Y-%m-%d")
+        else:
+            # Для детальной статистики берем текущий день
+            date_from = current_time.replace(hour=0, minute=0, second=0, microsecond=0).strftime("%Y-%m-%d")
+        date_to = current_time.strftime("%Y-%m-%d")
+
+    if date_to is None:
+        date_to = datetime.datetime.now().strftime("%Y-%m-%d")
+    return date_from, date_to
+
+def profile_headers(access_token):
+    return {
+        'Authorization': f'Bearer {access_token}',
+        'Content-Type': 'application/json'
+    }
+
+def offers_request(access_token, date_from, date_to):
+    return {
+        'method': 'POST',
+        'idempotent': True,  # POST только читает данные
+        'url': 'https://api.avito.ru/special-offers/v1/stats',
+        'headers': profile_headers(access_token),
+        'json': {
+            "dateTimeFrom": f"{date_to}T00:00:00Z",
+            "dateTimeTo": f"{date_from}T23:59:59Z",
+        }
+    }
+
+def sum_offers(offers_result):
+    return sum(item['price'] for item in offers_result.get('stats', {}))
+
+def read_offers_sum(response):
+    """
+    Расходы на продажи из ответа API спецпредложений
+
+    Returns:
+        Сумма или None, если API ответило 429 (rate_limiter уже приостановил запросы)
+    """
+    if response.status_code == 429:
+        logger.warning(f"Превышен лимит запросов к API спецпредложений (429 Too Many Requests)")
+        return None
+    return sum_offers(read_json(response, {}, "спецпредложений"))
+
+def profile_stats_request(access_token, user_id, date_from, date_to, grouping="totals"):
+    return {
+        'method': 'POST',
+        'idempotent': True,  # POST только читает данные
+        'url': f'https://api.avito.ru/stats/v2/accounts/{user_id}/items',
+        'headers': profile_headers(access_token),
+        'json': {
+            "dateFrom": date_from,
+            "dateTo": date_to,
+            "grouping": grouping,
+            "metrics": PROFILE_METRICS,
+            "limit": 1000,
+            "offset": 0
+        }
+    }
+
+def parse_profile_totals(result, offers_sum):
+    """Переводит ответ API статистики с группировкой totals в словарь показателей"""
+    # Получаем метрики из первой группировки
+    groupings = result.get('result', {}).get('groupings', [])
+    if not groupings:
+        logger.warning("В ответе API отсутствуют группировки")
+        return None
+
+    result_dict = profile_metrics(groupings[0].get('metrics', []), offers_sum)
+    logger.info(f"Получена статистика: просмотры: {result_dict['views']}, контакты: {result_dict['contacts']}, звонки: {result_dict['calls']}, чаты: {result_dict['chats']}")
+    return result_dict
+
+def profile_metrics(metrics_data, offers_sum=0):
+    """Показатели отчета из списка метрик одной группировки статистики профиля"""
+    # Преобразуем список метрик в словарь {slug: value}
+    stats = {metric.get('slug'): metric.get('value', 0) for metric in metrics_data}
+
+    # Добавляем расчетные показатели
+    calls = stats.get('contactsShowPhone', 0)
+    chats = stats.get('contactsMessenger', 0)
+
+    # Формируем результат с основными и дополнительными показателями
+    result_dict = {
+        "views": stats.get('views', 0),
+        "contacts": stats.get('contacts', 0),
+        "calls": calls,
+        "chats": chats,
+        "favorites": stats.get('favorites', 0),
+        "impressions": stats.get('impressions', 0),
+        "impressionsToViewsConversion": stats.get('impressionsToViewsConversion', 0),
+
+        # Почему-то для рекламы ('ads') берётся метрика 'spending', которая является суммой всех остальных расходов
+        "spending": {
+            "total": stats.get('spending', 0) + offers_sum,
+            "ads": stats.get('spending', 0),
+            "presence": stats.get('presenceSpending', 0),
+            "promo": stats.get('promoSpending', 0),
+            'sales': offers_sum
+        },
+        "active_items": stats.get('activeItems', 0),
+    }
+    return result_dict
+
+def grouping_date(grouping):
+    """Дата группировки 'day': строка YYYY-MM-DD или unix-время в поле id или date"""
+    value = grouping.get('date', grouping.get('id'))
+    if isinstance(value, (int, float)):
+        return timezone.localdate(datetime.datetime.fromtimestamp(value, tz=datetime.timezone.utc))
+    if isinstance(value, str) and value:
+        return datetime.date.fromisoformat(value[:10])
+    return None
+
+def parse_profile_days(result):
+    """
+    Переводит ответ API статистики с группировкой day в показатели по дням
+
+    Returns:
+        dict: {дата: показатели в формате parse_profile_totals}
+    """
+    days = {}
+    for grouping in result.get('groupings', []):
+        date = grouping_date(grouping)
+        if date is not None:
+            days[date] = profile_metrics(grouping.get('metrics', []))
+    return days
+
+def get_cached_profile_statistics(cache_key):
+    # Статистика профиля кэшируется на 1 час
+    entry = profile_stats_cache.get_entry(cache_key)
+    if entry is None:
+        return None
+    cache_data, age = entry
+    logger.info(f"Использование кэшированных данных статистики профиля ({age / 3600:.2f} часов)")
+    return cache_data
 
 def get_profile_statistics(access_token, user_id, date_from=None, date_to=None, grouping="totals"):
     """
     Получение расширенной статистики профиля пользователя с использованием API v2
-    
+
+    Одинаковые одновременные запросы (дневной и недельный отчеты, несколько
+    пользователей) выполняются один раз.
+
     Args:
         access_token: Токен доступа к API
         user_id: ID пользователя
         date_from: Начальная дата в формате YYYY-MM-DD
         date_to: Конечная дата в формате YYYY-MM-DD
         grouping: Тип группировки ('totals', 'day', 'week', 'month', 'item')
-        
+
     Returns:
         dict: Словарь с показателями статистики
     """
-    try:
-        # Сбрасываем код последней ошибки
-        get_profile_statistics.last_error_code = None
-        
-        # Создаем уникальный ключ для кэширования
-        cache_key = f"profile_stats_{user_id}_{date_from}_{date_to}_{grouping}"
-        
-        # Проверяем, есть ли кэш для этого запроса в глобальном хранилище
-        if not hasattr(get_profile_statistics, '_stats_cache'):
-            get_profile_statistics._stats_cache = {}
-            
-        # Проверяем наличие кэша и его актуальность (не старше 1 часа)
-        current_time = datetime.datetime.now()
-        if cache_key in get_profile_statistics._stats_cache:
-            cache_data, cache_time = get_profile_statistics._stats_cache[cache_key]
-            time_diff = (current_time - cache_time).total_seconds() / 3600  # Разница в часах
-            
-            if time_diff < 1:  # Кэш действителен в течение 1 часа
-                logger.info(f"Использование кэшированных данных статистики профиля ({time_diff:.2f} часов)")
-                return cache_data
-        
-        # Если даты не указаны, используем текущий день/неделю
-        if date_from is None:
-            if grouping == "totals":
-                # Для общей статистики берем последние 30 дней
-                current_time = datetime.datetime.now()
-                date_from = (current_time - datetime.timedelta(days=30)).strftime("%Y-%m-%d")
-                date_to = current_time.strftime("%Y-%m-%d")
-            else:
-                # Для детальной статистики берем текущий день
-                current_time = datetime.datetime.now()
-                date_from = current_time.replace(hour=0, minute=0, second=0, microsecond=0).strftime("%Y-%m-%d")
-                date_to = current_time.strftime("%Y-%m-%d")
-        
-        if date_to is None:
-            date_to = datetime.datetime.now().strftime("%Y-%m-%d")
+    return statistics_flight.do(
+        ("profile", user_id, date_from, date_to, grouping, tuple(PROFILE_METRICS)),
+        lambda: _fetch_profile_statistics(access_token, user_id, date_from, date_to, grouping)
+    )
 
-            
-        
-        # URL для получения статистики
-        stats_url = f'https://api.avito.ru/stats/v2/accounts/{user_id}/items'
-        
-        # Заголовки запроса
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Content-Type': 'application/json'
-        }
-        offers_url = 'https://api.avito.ru/special-offers/v1/stats'
-        offers_states = {
-            "dateTimeFrom": f"{date_to}T00:00:00Z",
-            "dateTimeTo": f"{date_from}T23:59:59Z",
-            }
+def _fetch_profile_statistics(access_token, user_id, date_from=None, date_to=None, grouping="totals"):
+    """При любой ошибке выбрасывает исключение: нули вместо статистики не должны попасть в отчет и кэш"""
+    # Создаем уникальный ключ для кэширования
+    cache_key = (user_id, date_from, date_to, grouping)
+    cached = get_cached_profile_statistics(cache_key)
+    if cached is not None:
+        return cached
 
-        offers_response = requests.post(offers_url, headers=headers, json=offers_states)
-        offers_sum = 0
-        for item in offers_response.json().get('stats', {}):
-            offers_sum += item['price']
-        
-        # Набор всех нужных метрик
-        metrics = [
-            "views",                         # Просмотры
-            "contacts",                      # Контакты (общее)
-            "contactsShowPhone",             # Посмотрели телефон
-            "contactsMessenger",             # Написали в чат
-            "favorites",                     # В избранном
-            "impressions",                   # Показы
-            "allSpending",                   # Все расходы
-            "spending",                      # Расходы на объявления
-            "presenceSpending",              # Расходы на размещение
-            "promoSpending",                 # Расходы на продвижение
-            "activeItems",                   # Активные объявления       
-            "impressions",                   # Показы
-            "impressionsToViewsConversion"   # Конверсия
-        ]
-        
-        # Данные запроса
-        data = {
-            "dateFrom": date_from,
-            "dateTo": date_to,
-            "grouping": grouping,
-            "metrics": metrics,
-            "limit": 1000,
-            "offset": 0
-        }
-        
-        logger.info(f"Запрос расширенной статистики профиля за период {date_from} - {date_to}, группировка: {grouping}")
-        
-        # Выполняем запрос
-        response = requests.post(stats_url, headers=headers, json=data)
-        
-        # Проверяем код ответа. Если 429 (Too Many Requests), возвращаем пустой результат
-        if response.status_code == 429:
-            get_profile_statistics.last_error_code = 429
-            logger.warning(f"Превышен лимит запросов к API статистики (429 Too Many Requests)")
-            return {}
-            
-        response.raise_for_status()
-        
-        # Проверяем, что ответ не пустой
-        if not response.text.strip():
-            logger.warning("Получен пустой ответ от API статистики профиля")
-            return {}
-        
-        # Парсим JSON ответ
-        try:
-            result = response.json()
-            
-            # Если группировка по общим значениям, получаем первую группировку
-            if grouping == "totals":
-                # Получаем метрики из первой группировки
-                groupings = result.get('result', {}).get('groupings', [])
-                if not groupings:
-                    logger.warning("В ответе API отсутствуют группировки")
-                    return {}
-                
-                # Получаем метрики из первой группировки
-                metrics_data = groupings[0].get('metrics', [])
-                
-                # Преобразуем список метрик в словарь {slug: value}
-                stats = {metric.get('slug'): metric.get('value', 0) for metric in metrics_data}
-                
-                # Добавляем расчетные показатели
-                calls = stats.get('contactsShowPhone', 0)
-                chats = stats.get('contactsMessenger', 0)
-                
-                # Формируем результат с основными и дополнительными показателями
-                result_dict = {
-                    "views": stats.get('views', 0),
-                    "contacts": stats.get('contacts', 0),
-                    "calls": calls,
-                    "chats": chats,
-                    "favorites": stats.get('favorites', 0),
-                    "impressions": stats.get('impressions', 0),
-                    "impressionsToViewsConversion": stats.get('impressionsToViewsConversion', 0),
-                    
-                    # Почему-то для рекламы ('ads') берётся метрика 'spending', которая является суммой всех остальных расходов
-                    "spending": {
-                        "total": stats.get('spending', 0) + offers_sum,
-                        "ads": stats.get('spending', 0),
-                        "presence": stats.get('presenceSpending', 0),
-                        "promo": stats.get('promoSpending', 0),
-                        'sales': offers_sum
-                    },
-                    "active_items": stats.get('activeItems', 0),
-                }
-                logger.info(f"Получена статистика: просмотры: {result_dict['views']}, контакты: {result_dict['contacts']}, звонки: {result_dict['calls']}, чаты: {result_dict['chats']}")
-                
-                # Сохраняем результат в кэш
-                get_profile_statistics._stats_cache[cache_key] = (result_dict, current_time)
-                
-                return result_dict
-                
-            else:
-                # Для других группировок возвращаем полный результат
-                return result.get('result', {})
-                
-        except json.JSONDecodeError as e:
-            logger.error(f"Ошибка декодирования JSON: {e}, содержимое ответа: {response.text[:200]}")
-            return {}
-            
-    except requests.exceptions.RequestException as e:
-        # Сохраняем код ошибки, если это 429
-        if hasattr(e, 'response') and e.response is not None:
-            status_code = e.response.status_code
-            if status_code == 429:
-                get_profile_statistics.last_error_code = 429
-                logger.warning(f"Превышен лимит запросов к API статистики (429 Too Many Requests) в RequestException")
-                
-        logger.error(f"Ошибка запроса API статистики: {e}")
-        return {}
-    except Exception as e:
-        logger.error(f"Ошибка при получении расширенной статистики профиля: {e}")
-        return {}
\ No newline at end of file
+    date_from, date_to = profile_period(date_from, date_to, grouping)
+
+    # Расходы на продажи нужны только для общих значений
+    offers_sum = 0
+    if grouping == "totals":
+        offers_response = get_avito_client().request(**offers_request(access_token, date_from, date_to))
+        offers_sum = read_offers_sum(offers_response)
+        if offers_sum is None:
+            raise CollectorFailed("Превышен лимит запросов к API спецпредложений")
+
+    logger.info(f"Запрос расширенной статистики профиля за период {date_from} - {date_to}, группировка: {grouping}")
+
+    # Выполняем запрос
+    response = get_avito_client().request(**profile_stats_request(access_token, user_id, date_from, date_to, grouping))
+    return read_profile_statistics(response, grouping, offers_sum, cache_key)
+
+def read_profile_statistics(response, grouping, offers_sum, cache_key):
+    """Разбирает ответ API статистики профиля; общие значения кэширует"""
+    # Если 429 (Too Many Requests), rate_limiter уже приостановил запросы к API статистики
+    if response.status_code == 429:
+        raise CollectorFailed("Превышен лимит запросов к API статистики (429 Too Many Requests)")
+
+    result = read_json(response, None, "статистики профиля")
+    if result is None:
+        raise CollectorFailed("Пустой ответ API статистики профиля")
+
+    # Для группировок кроме общих значений возвращаем полный результат
+    if grouping != "totals":
+        return result.get('result', {})
+
+    result_dict = parse_profile_totals(result, offers_sum)
+    if result_dict is None:
+        raise CollectorFailed("Нет общих значений в ответе API статистики профиля")
+
+    # Сохраняем результат в кэш
+    profile_stats_cache.set(cache_key, result_dict)
+    return result_dict
@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных вычислений.
+
+    Первый вызов с ключом выполняет функцию, остальные вызовы с тем же
+    ключом, пришедшие до его завершения, ждут и получают тот же результат
+    (или то же исключение). После завершения ключ освобождается, поэтому
+    это не кэш: повторный вызов снова выполнит функцию.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, func):
+        """Выполняет func() для key или ждет результата уже идущего вызова"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            logger.info(f"{self.name}: ожидание уже выполняющегося запроса {key}")
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    async def do_async(self, key, func):
+        """Асинхронный вариант do: func - функция, возвращающая корутину"""
+        loop = asyncio.get_running_loop()
+        task_key = (loop, key)
+        with self._lock:
+            task = self._tasks.get(task_key)
+            if task is None:
+                task = self._tasks[task_key] = loop.create_task(func())
+                task.add_done_callback(lambda _: self._tasks.pop(task_key, None))
+                self.executed += 1
+            else:
+                self.coalesced += 1
+                logger.info(f"{self.name}: ожидание уже выполняющегося запроса {key}")
+        # shield: отмена одного ожидающего не отменяет вычисление для остальных
+        return await asyncio.shield(task)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._calls) + len(self._tasks),
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+            }
+
+
+# Сборка отчетов и запросы статистики профиля
+statistics_flight = SingleFlight("Статистика Авито")
@@ -0,0 +1,103 @@
+"""
+История дневной статистики аккаунта.
+
+Строки AvitoAccountDailyStats за период читаются одним запросом values_list
+только нужных столбцов и раскладываются в массивы NumPy по плотному
+индексу дат: строка массива соответствует дню периода, а маска present
+отмечает дни, за которые статистика сохранена. Итоги, средние и изменения
+день к дню считаются над массивами целиком, поэтому история за 90 и 365
+дней обходится не дороже недельной.
+"""
+import numpy as np
+
+from bot.models import AvitoAccountDailyStats
+
+# Поля дневной статистики, которые показывает история
+HISTORY_FIELDS = (
+    'total_calls', 'answered_calls', 'missed_calls', 'total_chats', 'new_chats', 'phones_received',
+    'views', 'contacts', 'favorites', 'daily_reviews', 'daily_expense',
+)
+
+
+class StatsHistory:
+    """
+    Дневная статистика аккаунта за период
+
+    Attributes:
+        dates: Все дни периода (datetime64[D]) по порядку
+        fields: Поля статистики, столбцы values
+        values: Значения (дни x поля); в днях без статистики нули
+        present: Маска дней, за которые статистика сохранена
+    """
+
+    def __init__(self, dates, fields, values, present):
+        self.dates = dates
+        self.fields = tuple(fields)
+        self.values = values
+        self.present = present
+        self._index = {field: position for position, field in enumerate(self.fields)}
+
+    @property
+    def days_count(self):
+        return len(self.dates)
+
+    @property
+    def days_with_data(self):
+        return int(self.present.sum())
+
+    @property
+    def days_missing(self):
+        return self.days_count - self.days_with_data
+
+    def column(self, field):
+        return self.values[:, self._index[field]]
+
+    def totals(self):
+        """Суммы полей по дням со статистикой {поле: сумма}"""
+        return dict(zip(self.fields, self.values.sum(axis=0).tolist()))
+
+    def averages(self):
+        """Средние за день со статистикой {поле: среднее}; без статистики - нули"""
+        days = self.days_with_data
+        means = self.values.sum(axis=0) / days if days else np.zeros(len(self.fields))
+        return dict(zip(self.fields, means.tolist()))
+
+    def deltas(self):
+        """
+        Изменения день к дню (дни x поля)
+
+        Изменение известно, только если статистика есть за день и за
+        предыдущий день, иначе NaN. У первого дня периода изменения нет.
+        """
+        deltas = np.full(self.values.shape, np.nan)
+        deltas[1:] = np.diff(self.values, axis=0)
+        known = np.zeros(self.days_count, dtype=bool)
+        known[1:] = self.present[1:] & self.present[:-1]
+        deltas[~known] = np.nan
+        return deltas
+
+    def recent_days(self, limit):
+        """Позиции последних limit дней со статистикой, от новых к старым"""
+        return np.flatnonzero(self.present)[::-1][:limit]
+
+
+def load_history(account_id, first_day, last_day, fields=HISTORY_FIELDS):
+    """
+    История статистики аккаунта за дни с first_day по last_day включительно
+
+    Returns:
+        StatsHistory
+    """
+    dates = np.arange(np.datetime64(first_day, 'D'), np.datetime64(last_day, 'D') + 1)
+    values = np.zeros((len(dates), len(fields)))
+    present = np.zeros(len(dates), dtype=bool)
+
+    rows = list(AvitoAccountDailyStats.objects.filter(
+        avito_account_id=account_id, date__range=(first_day, last_day)
+    ).values_list('date', *fields))
+    if rows:
+        days, *columns = zip(*rows)
+        positions = (np.array(days, dtype='datetime64[D]') - dates[0]).astype(int)
+        values[positions] = np.nan_to_num(np.array(columns, dtype=float).T)
+        present[positions] = True
+    return StatsHistory(dates, fields, values, present)
@@ -0,0 +1,97 @@
+"""
+Сохраненная дневная статистика аккаунтов за период.
+
+Отчеты за неделю, месяц или любой другой период собираются из строк
+AvitoAccountDailyStats одним агрегирующим запросом, а у API запрашиваются
+только дни без сохраненной статистики (см. bot.services.plan_sources).
+Строка подходит, только если записана после окончания своего дня (строка,
+сохраненная в течение дня, содержит неполные данные) и отмечена как полная:
+в отчете, из которого она сохранена, все показатели получены.
+"""
+import datetime
+
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from bot.models import AvitoAccount, AvitoAccountDailyStats
+
+# Поля, которые суммируются по дням периода
+SUM_FIELDS = (
+    'total_calls', 'missed_calls', 'total_chats', 'views', 'contacts', 'favorites',
+    'impressions', 'daily_reviews', 'daily_expense',
+)
+
+
+def day_windows(days, max_days):
+    """Разбивает отсортированные дни на непрерывные отрезки (начало, конец) не длиннее max_days"""
+    windows = []
+    for day in days:
+        if windows:
+            start, end = windows[-1]
+            if day - end == datetime.timedelta(days=1) and (day - start).days < max_days:
+                windows[-1] = (start, day)
+                continue
+        windows.append((day, day))
+    return windows
+
+
+def period_days(first_day, last_day):
+    return [first_day + datetime.timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+
+
+def day_end(day):
+    return timezone.make_aware(datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min))
+
+
+class StoredPeriod:
+    """
+    Сохраненная статистика части дней периода
+
+    Attributes:
+        days: Дни с сохраненной статистикой
+        totals: Суммы SUM_FIELDS по этим дням и конверсия показов в просмотры,
+                взвешенная по показам
+        latest: Число объявлений и отзывов за последний сохраненный день
+        missing: Отрезки дней без статистики [(первый день, последний день)]
+    """
+
+    def __init__(self, days, totals, latest, missing):
+        self.days = days
+        self.totals = totals
+        self.latest = latest
+        self.missing = missing
+
+
+def stored_period(user_id, first_day, last_day):
+    """
+    Сохраненная статистика аккаунта с ID пользователя user_id за период
+
+    Returns:
+        StoredPeriod или None, если за период ничего не сохранено
+    """
+    account_id = AvitoAccount.objects.filter(avito_user_id=user_id).values_list('id', flat=True).first()
+    if account_id is None:
+        return None
+    rows = AvitoAccountDailyStats.objects.filter(
+        avito_account_id=account_id, date__range=(first_day, last_day), complete=True
+    )
+    days = sorted(
+        day for day, updated_at in rows.values_list('date', 'updated_at')
+        if updated_at is not None and updated_at >= day_end(day)
+    )
+    if not days:
+        return None
+
+    complete = rows.filter(date__in=days)
+    sums = complete.aggregate(
+        *(Sum(field) for field in SUM_FIELDS),
+        weighted_conversion=Sum(F('impressionsToViewsConversion') * F('impressions')),
+    )
+    totals = {field: sums[f'{field}__sum'] or 0 for field in SUM_FIELDS}
+    impressions = totals['impressions']
+    totals['impressionsToViewsConversion'] = (sums['weighted_conversion'] or 0) / impressions if impressions else 0
+    latest = complete.order_by('-date').values('total_items', 'total_reviews').first()
+
+    stored = set(days)
+    missing = [day for day in period_days(first_day, last_day) if day not in stored]
+    return StoredPeriod(days, totals, latest, day_windows(missing, len(missing)))
@@ -0,0 +1,178 @@
+"""
+Отметки синхронизации локальных копий данных API Авито.
+
+Для источников с фильтром по времени (звонки, операции) хранится отрезок
+времени, за который данные аккаунта уже загружены (AvitoSyncState).
+Загрузка продолжается с конца отрезка, поэтому повторно запрашиваются
+только новые данные.
+
+Списки без фильтра по времени (чаты, отзывы) API отдает от новых записей
+к старым. Для них хранится отметка: все записи старше нее уже загружены.
+Отметка сдвигается, только когда проход дошел до нее или до конца списка;
+прерванный проход продолжается следующим с сохраненного смещения.
+"""
+import collections
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from bot.models import AvitoSyncState
+
+
+def parse_time(value):
+    """Время из ответа API: строка RFC3339 или unix-время"""
+    if not value:
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.datetime.fromtimestamp(value, tz=datetime.timezone.utc)
+    return datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def format_time(value):
+    """Время в формате RFC3339, как его передают запросы к API"""
+    return value.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def get_synced_range(user_id, source):
+    """Уже загруженный отрезок (начало, конец) или (None, None)"""
+    state = AvitoSyncState.objects.filter(user_id=user_id, source=source).values_list('synced_from', 'synced_to').first()
+    return state or (None, None)
+
+
+def missing_ranges(synced_from, synced_to, start, end):
+    """Отрезки внутри [start, end], которые еще не загружены"""
+    if synced_from is None or synced_to is None or end < synced_from or start > synced_to:
+        return [(start, end)]
+    ranges = []
+    if start < synced_from:
+        ranges.append((start, synced_from))
+    if end > synced_to:
+        ranges.append((synced_to, end))
+    return ranges
+
+
+def sync_plan(user_id, source, date_from, date_to):
+    """
+    Отрезки, которые нужно загрузить, чтобы покрыть период (RFC3339)
+
+    Returns:
+        list: [(начало, конец)] - не загруженные части периода, конец не позже текущего момента
+    """
+    start = parse_time(date_from)
+    end = min(parse_time(date_to), timezone.now().astimezone(datetime.timezone.utc))
+    if end <= start:
+        return []
+    return missing_ranges(*get_synced_range(user_id, source), start, end)
+
+
+def extend_synced_range(user_id, source, start, end):
+    """
+    Расширяет загруженный отрезок после успешной загрузки [start, end]
+
+    API добавляет записи с задержкой, поэтому последние AVITO_SYNC_LAG
+    секунд не считаются загруженными и запрашиваются повторно (записи
+    сохраняются с обновлением, повтор безопасен). Хранится один отрезок:
+    если загруженный отрезок не пересекается с сохраненным, остается более
+    свежий из них - его используют ежедневные отчеты, а старый период при
+    следующем запросе будет загружен заново.
+    """
+    end = min(end, timezone.now().astimezone(datetime.timezone.utc) - datetime.timedelta(seconds=settings.AVITO_SYNC_LAG))
+    if end <= start:
+        return
+    synced_from, synced_to = get_synced_range(user_id, source)
+    if synced_from is not None:
+        if end < synced_from:
+            return
+        if start <= synced_to:
+            start, end = min(start, synced_from), max(end, synced_to)
+    AvitoSyncState.objects.update_or_create(
+        user_id=user_id,
+        source=source,
+        defaults={'synced_from': start, 'synced_to': end}
+    )
+
+
+class PlannedRanges:
+    """
+    Очередь не загруженных отрезков периода (RFC3339) для постраничной загрузки
+
+    Отрезок отмечается загруженным (extend_synced_range), только когда
+    загружены все его страницы.
+    """
+
+    def __init__(self, user_id, source, date_from, date_to):
+        self.user_id = user_id
+        self.source = source
+        self.date_from = date_from
+        self.date_to = date_to
+        self.pending = collections.deque()
+
+    def load(self):
+        self.pending.extend(sync_plan(self.user_id, self.source, self.date_from, self.date_to))
+
+    @property
+    def current(self):
+        """Отрезок, который загружается сейчас, или None, если загружены все"""
+        return self.pending[0] if self.pending else None
+
+    def complete_current(self):
+        extend_synced_range(self.user_id, self.source, *self.pending.popleft())
+
+
+class PagedSync:
+    """
+    Проход по списку API от новых записей к старым
+
+    Attributes:
+        mark: Отметка: записи старше нее уже загружены (None - список не загружался)
+        offset: Смещение следующей страницы
+        newest: Время самой новой записи, загруженной в проходе
+    """
+
+    def __init__(self, user_id, source, mark, offset, newest):
+        self.user_id = user_id
+        self.source = source
+        self.mark = mark
+        self.offset = offset
+        self.newest = newest
+        self.complete = False
+
+    def advance(self, page_size, times):
+        """Учитывает загруженную страницу: page_size записей, times - время сохраненных записей"""
+        self.offset += page_size
+        for value in times:
+            if self.newest is None or value > self.newest:
+                self.newest = value
+
+
+def begin_paged_sync(user_id, source):
+    """Проход по списку источника source: новый или продолжение прерванного"""
+    state = AvitoSyncState.objects.filter(user_id=user_id, source=source).values_list(
+        'synced_to', 'resume_offset', 'resume_mark'
+    ).first()
+    mark, offset, newest = state or (None, 0, None)
+    return PagedSync(user_id, source, mark, offset, newest)
+
+
+def finish_paged_sync(paged_sync):
+    """
+    Сохраняет результат прохода
+
+    Завершенный проход сдвигает отметку на самую новую загруженную запись.
+    Прерванный оставляет прежнюю отметку и запоминает, с какого смещения
+    продолжить.
+    """
+    if paged_sync.complete:
+        defaults = {
+            'synced_to': paged_sync.newest or paged_sync.mark,
+            'resume_offset': 0,
+            'resume_mark': None,
+        }
+    else:
+        defaults = {
+            'synced_to': paged_sync.mark,
+            'resume_offset': paged_sync.offset,
+            'resume_mark': paged_sync.newest,
+        }
+    AvitoSyncState.objects.update_or_create(user_id=paged_sync.user_id, source=paged_sync.source, defaults=defaults)
@@ -0,0 +1,73 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from bot.cache import CacheRegistry, LocalCacheBackend
+
+
+class CacheTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        for clock in ("time", "monotonic"):
+            patcher = mock.patch(f"bot.cache.time.{clock}", side_effect=lambda: self.now)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.backend = LocalCacheBackend(max_entries=3, max_bytes=1024 * 1024)
+        self.registry = CacheRegistry()
+        self.registry._backend = self.backend
+
+
+class CacheNamespaceTests(CacheTestCase):
+
+    def test_entry_expires_after_ttl(self):
+        namespace = self.registry.namespace("reports", ttl=60)
+        namespace.set("key", {"views": 1})
+
+        self.now += 59
+        self.assertEqual(namespace.get("key"), {"views": 1})
+        self.now += 1
+        self.assertIsNone(namespace.get("key"))
+        self.assertIsNone(namespace.get_stale_entry("key"))
+
+    def test_per_entry_ttl(self):
+        namespace = self.registry.namespace("collectors", ttl=60)
+        namespace.set("rating", 4.8, ttl=3600)
+        self.now += 600
+        self.assertEqual(namespace.get("rating"), 4.8)
+
+    def test_stale_entry_is_kept_for_grace(self):
+        namespace = self.registry.namespace("daily", ttl=60, grace=120)
+        namespace.set("key", "report")
+
+        self.now += 90
+        self.assertIsNone(namespace.get_entry("key"))
+        self.assertEqual(namespace.get_stale_entry("key"), ("report", 90, False))
+
+        self.now += 90
+        self.assertIsNone(namespace.get_stale_entry("key"))
+
+    def test_namespaces_do_not_share_keys(self):
+        daily = self.registry.namespace("daily", ttl=60)
+        weekly = self.registry.namespace("weekly", ttl=60)
+        daily.set("key", "day")
+        self.assertIsNone(weekly.get("key"))
+
+
+class LocalCacheBackendTests(CacheTestCase):
+
+    def test_least_recently_used_entry_is_evicted(self):
+        namespace = self.registry.namespace("items", ttl=60)
+        for key in ("a", "b", "c"):
+            namespace.set(key, key)
+        namespace.get("a")
+        namespace.set("d", "d")
+
+        self.assertIsNone(namespace.get("b"))
+        self.assertEqual([namespace.get(key) for key in ("a", "c", "d")], ["a", "c", "d"])
+        self.assertEqual(self.backend.snapshot()["evictions"], {"items": 1})
+
+    def test_entry_larger_than_limit_is_not_stored(self):
+        backend = LocalCacheBackend(max_entries=10, max_bytes=10)
+        backend.set("items", "key", "x" * 100, 60)
+        self.assertIsNone(backend.get("items", "key"))
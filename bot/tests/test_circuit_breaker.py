@@ -0,0 +1,60 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from bot.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakerRegistry, CircuitOpenError
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("bot.circuit_breaker.time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker("core", failure_threshold=2, reset_timeout=30)
+
+    def open_breaker(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_request()
+        self.assertEqual(self.breaker.rejected, 1)
+
+    def test_half_open_lets_one_probe_through(self):
+        self.open_breaker()
+        self.now += 30
+
+        self.assertTrue(self.breaker.allow_request())
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_failed_probe_reopens(self):
+        self.open_breaker()
+        self.now += 30
+        self.breaker.allow_request()
+
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertTrue(self.breaker.is_open())
+        self.assertEqual(self.breaker.opened_count, 2)
+
+    def test_registry_open_families(self):
+        registry = CircuitBreakerRegistry()
+        self.assertEqual(registry.open_families(("core", "stats")), [])
+        for _ in range(registry.get("stats").failure_threshold):
+            registry.get("stats").record_failure()
+        self.assertEqual(registry.open_families(("core", "stats")), ["stats"])
@@ -0,0 +1,158 @@
+from unittest import mock
+
+import requests
+from django.test import TestCase
+
+from bot import services
+from bot.collectors import (
+    Collector, CollectorContext, CollectorFailed, CollectorRegistry, SourceCandidate, choose_sources, run_plan,
+)
+from bot.services import collector_cache, collector_cache_key
+
+
+class CollectorFailureCacheTests(TestCase):
+    """Значения, подставленные вместо данных упавшего сборщика, не кэшируются"""
+
+    user_id = 987654321
+    period = {
+        "start": "2026-10-17T00:00:00Z",
+        "end": "2026-10-17T23:59:59Z",
+        "date_from": "2026-10-17",
+        "date_to": "2026-10-17",
+    }
+
+    def setUp(self):
+        self.cache_key = collector_cache_key("rating", self.user_id, self.period)
+        collector_cache.delete(self.cache_key)
+        self.addCleanup(collector_cache.delete, self.cache_key)
+
+    def run_rating_collector(self):
+        collectors = {"rating": (lambda: services.get_user_rating_info("token"), 0)}
+        return services.run_available_collectors(collectors, [], self.user_id, self.period)
+
+    def test_failed_rating_is_not_cached(self):
+        client = mock.Mock()
+        client.request.side_effect = requests.exceptions.ConnectionError("нет соединения")
+        with mock.patch.object(services, "get_avito_client", return_value=client):
+            results = self.run_rating_collector()
+
+        self.assertEqual(results["rating"], 0)
+        self.assertIsNone(collector_cache.get_entry(self.cache_key))
+
+    def test_rating_is_cached(self):
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {"rating": {"score": 4.8}}
+        client = mock.Mock()
+        client.request.return_value = response
+        with mock.patch.object(services, "get_avito_client", return_value=client):
+            results = self.run_rating_collector()
+
+        self.assertEqual(results["rating"], 4.8)
+        self.assertEqual(collector_cache.get(self.cache_key), 4.8)
+
+
+class FallbackCollectorTests(TestCase):
+    """Резервные сборщики запускаются, если основной завершился ошибкой"""
+
+    def run_plan(self, profile_fetch):
+        registry = CollectorRegistry([
+            Collector("profile_stats", profile_fetch, default={}),
+            Collector("total_calls", lambda ctx: 5, fallback_for="profile_stats"),
+        ])
+        unavailable = []
+        results = run_plan(
+            registry.plan(registry.names()), CollectorContext("token", 1, {}),
+            lambda tasks, unavailable: services.run_available_collectors(tasks, unavailable), unavailable,
+        )
+        return results, unavailable
+
+    def test_fallback_runs_when_primary_failed(self):
+        def profile_fetch(ctx):
+            raise CollectorFailed("Превышен лимит запросов к API статистики (429 Too Many Requests)")
+
+        results, unavailable = self.run_plan(profile_fetch)
+        self.assertEqual(results, {"profile_stats": {}, "total_calls": 5})
+        self.assertEqual(unavailable, ["profile_stats"])
+
+    def test_fallback_skipped_when_primary_succeeded(self):
+        results, unavailable = self.run_plan(lambda ctx: {"calls": 3})
+        self.assertEqual(results, {"profile_stats": {"calls": 3}})
+        self.assertEqual(unavailable, [])
+
+
+class CollectorPlanTests(TestCase):
+
+    def setUp(self):
+        self.registry = CollectorRegistry([
+            Collector("profile_stats", lambda ctx: {}, cost=2),
+            Collector("balance", lambda ctx: 0, inputs=("access_token", "user_id")),
+            Collector("items_info", lambda ctx: 0, cost=50, fallback_for="profile_stats"),
+            Collector("total_calls", lambda ctx: 0, fallback_for="profile_stats"),
+        ])
+
+    def names(self, waves):
+        return [[collector.name for collector in wave] for wave in waves]
+
+    def test_fallbacks_wait_for_planned_primary(self):
+        waves = self.registry.plan(["total_calls", "balance", "profile_stats", "items_info"])
+        self.assertEqual(self.names(waves), [["profile_stats", "balance"], ["items_info", "total_calls"]])
+
+    def test_fallback_without_primary_runs_in_first_wave(self):
+        waves = self.registry.plan(["balance", "total_calls", "total_calls"])
+        self.assertEqual(self.names(waves), [["balance", "total_calls"]])
+
+    def test_unknown_collector(self):
+        with self.assertRaises(KeyError):
+            self.registry.plan(["views"])
+
+    def test_duplicate_registration(self):
+        with self.assertRaises(ValueError):
+            self.registry.register(Collector("balance", lambda ctx: 0))
+
+    def test_unknown_inputs(self):
+        with self.assertRaises(ValueError):
+            Collector("rating", lambda ctx: 0, inputs=("access_token", "account"))
+
+    def test_point_in_time(self):
+        self.assertTrue(self.registry["balance"].point_in_time)
+        self.assertFalse(self.registry["profile_stats"].point_in_time)
+
+
+class ChooseSourcesTests(TestCase):
+
+    def chosen(self, fields, candidates):
+        chosen, missing = choose_sources(fields, candidates)
+        return {name: candidate.source for name, candidate in chosen.items()}, missing
+
+    def test_cheapest_source_per_field(self):
+        candidates = [
+            SourceCandidate("profile_stats", "api", 2, ("views", "contacts", "calls.total")),
+            SourceCandidate("profile_stats", "stored", 0, ("views", "contacts", "calls.total")),
+            SourceCandidate("balance", "api", 2, ("balance",)),
+            SourceCandidate("balance", "cache", 0, ("balance",)),
+        ]
+        self.assertEqual(
+            self.chosen({"views", "calls.total", "balance"}, candidates),
+            ({"profile_stats": "stored", "balance": "cache"}, set()),
+        )
+
+    def test_api_replaces_partial_source_of_same_collector(self):
+        candidates = [
+            SourceCandidate("profile_stats", "stored", 0, ("views",)),
+            SourceCandidate("profile_stats", "api", 2, ("views", "contacts")),
+        ]
+        self.assertEqual(self.chosen({"views", "contacts"}, candidates), ({"profile_stats": "api"}, set()))
+
+    def test_shared_source_preferred_over_several(self):
+        candidates = [
+            SourceCandidate("profile_stats", "api", 2, ("views", "contacts", "calls.total")),
+            SourceCandidate("total_calls", "api", 1, ("calls.total",)),
+            SourceCandidate("items_info", "api", 50, ("views",)),
+        ]
+        self.assertEqual(
+            self.chosen({"views", "contacts", "calls.total"}, candidates), ({"profile_stats": "api"}, set())
+        )
+
+    def test_fields_without_source(self):
+        candidates = [SourceCandidate("balance", "api", 2, ("balance",))]
+        self.assertEqual(self.chosen({"balance", "rating"}, candidates), ({"balance": "api"}, {"rating"}))
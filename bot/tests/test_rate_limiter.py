@@ -0,0 +1,76 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from bot.rate_limiter import RateLimiter, RateLimitExceeded, TokenBucket, account_key, endpoint_family
+
+
+class TokenBucketTests(SimpleTestCase):
+
+    def test_reserve_waits_for_refill(self):
+        bucket = TokenBucket(rate=1, capacity=2)
+        self.assertEqual(bucket.reserve(max_wait=5), 0)
+        self.assertEqual(bucket.reserve(max_wait=5), 0)
+        self.assertAlmostEqual(bucket.reserve(max_wait=5), 1, places=1)
+        self.assertEqual(bucket.waits, 1)
+
+    def test_reserve_rejects_long_wait(self):
+        bucket = TokenBucket(rate=1, capacity=1)
+        bucket.reserve(max_wait=5)
+        with self.assertRaises(RateLimitExceeded):
+            bucket.reserve(max_wait=0.5)
+        self.assertEqual(bucket.rejected, 1)
+
+    def test_throttle_pauses_bucket(self):
+        bucket = TokenBucket(rate=1, capacity=5)
+        bucket.throttle(10)
+        with self.assertRaises(RateLimitExceeded):
+            bucket.reserve(max_wait=5)
+
+
+class AccountKeyTests(SimpleTestCase):
+    client_id = "secret-client-id"
+    headers = {"Authorization": "Bearer token-1"}
+
+    def test_key_hides_client_id(self):
+        with mock.patch("bot.token_store.token_store.client_id_for", return_value=self.client_id):
+            key = account_key(self.headers)
+        self.assertTrue(key.startswith("client:"))
+        self.assertNotIn(self.client_id, key)
+
+    def test_unknown_token_is_hashed(self):
+        with mock.patch("bot.token_store.token_store.client_id_for", return_value=None):
+            key = account_key(self.headers)
+        self.assertTrue(key.startswith("token:"))
+        self.assertNotIn("token-1", key)
+
+    def test_no_authorization(self):
+        self.assertEqual(account_key({}), "-")
+
+
+class RateLimiterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.limiter = RateLimiter(limits={"core": (1, 1), "stats": (1, 1)}, max_wait=0, penalty=30)
+
+    def test_families(self):
+        self.assertEqual(endpoint_family("https://api.avito.ru/stats/v1/accounts/1/items"), "stats")
+        self.assertEqual(endpoint_family("https://api.avito.ru/core/v1/accounts/self"), "core")
+        self.assertIsNone(endpoint_family("https://api.avito.ru/token"))
+
+    def test_429_throttles_account_bucket(self):
+        url = "https://api.avito.ru/stats/v1/accounts/1/items"
+        with mock.patch("bot.token_store.token_store.client_id_for", return_value="client-a"):
+            self.limiter.record_response(url, {"Authorization": "Bearer a"}, 429, "5")
+            with self.assertRaises(RateLimitExceeded):
+                self.limiter.acquire(url, {"Authorization": "Bearer a"})
+        with mock.patch("bot.token_store.token_store.client_id_for", return_value="client-b"):
+            self.limiter.acquire(url, {"Authorization": "Bearer b"})
+
+    def test_summary_has_no_account_keys(self):
+        url = "https://api.avito.ru/stats/v1/accounts/1/items"
+        with mock.patch("bot.token_store.token_store.client_id_for", return_value="client-a"):
+            self.limiter.acquire(url, {"Authorization": "Bearer a"})
+        summary = self.limiter.summary()
+        self.assertEqual(summary["stats"]["accounts"], 1)
+        self.assertNotIn("client-a", str(summary))
@@ -0,0 +1,65 @@
+import datetime
+
+from django.test import TestCase
+
+from bot.models import (
+    AvitoAccount, AvitoAccountDailyStats, AvitoAccountWeeklyStats, AvitoAccountMonthlyStats, week_bounds, month_bounds,
+)
+
+
+class PeriodBoundsTests(TestCase):
+
+    def test_week_and_month(self):
+        day = datetime.date(2026, 10, 15)
+        self.assertEqual(week_bounds(day), (datetime.date(2026, 10, 12), datetime.date(2026, 10, 18)))
+        self.assertEqual(month_bounds(day), (datetime.date(2026, 10, 1), datetime.date(2026, 10, 31)))
+        self.assertEqual(AvitoAccountWeeklyStats.period_bounds(day), week_bounds(day))
+
+
+class RollupRefreshTests(TestCase):
+
+    def setUp(self):
+        self.account = AvitoAccount.objects.create(name="Тест", client_id="id", client_secret="secret")
+        self.monday = datetime.date(2026, 10, 12)
+
+    def row(self, day, **fields):
+        return AvitoAccountDailyStats(avito_account=self.account, date=day, **fields)
+
+    def week(self):
+        return AvitoAccountWeeklyStats.for_day(self.account.id, self.monday)
+
+    def test_save(self):
+        self.row(self.monday, total_calls=2).save()
+        self.row(self.monday + datetime.timedelta(days=1), total_calls=3).save()
+        self.assertEqual((self.week().total_calls, self.week().days_count), (5, 2))
+        self.assertEqual(AvitoAccountMonthlyStats.for_day(self.account.id, self.monday).total_calls, 5)
+
+    def test_bulk_create(self):
+        AvitoAccountDailyStats.objects.bulk_create([
+            self.row(self.monday, views=10),
+            self.row(self.monday + datetime.timedelta(days=2), views=5),
+        ])
+        self.assertEqual(self.week().views, 15)
+
+    def test_update(self):
+        self.row(self.monday, views=10).save()
+        AvitoAccountDailyStats.objects.filter(avito_account=self.account).update(views=7)
+        self.assertEqual(self.week().views, 7)
+
+    def test_update_moving_day_refreshes_both_periods(self):
+        self.row(self.monday, views=10).save()
+        AvitoAccountDailyStats.objects.filter(avito_account=self.account).update(date=self.monday - datetime.timedelta(days=1))
+        self.assertIsNone(self.week())
+        self.assertEqual(AvitoAccountWeeklyStats.for_day(self.account.id, self.monday - datetime.timedelta(days=1)).views, 10)
+
+    def test_queryset_delete(self):
+        self.row(self.monday, views=10).save()
+        self.row(self.monday + datetime.timedelta(days=1), views=5).save()
+        AvitoAccountDailyStats.objects.filter(date__lt=self.monday + datetime.timedelta(days=1)).delete()
+        self.assertEqual((self.week().views, self.week().days_count), (5, 1))
+
+    def test_delete_last_day_removes_rollup(self):
+        self.row(self.monday, views=10).save()
+        AvitoAccountDailyStats.objects.get(avito_account=self.account).delete()
+        self.assertIsNone(self.week())
+        self.assertIsNone(AvitoAccountMonthlyStats.for_day(self.account.id, self.monday))
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from bot.single_flight import SingleFlight
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def setUp(self):
+        self.flight = SingleFlight("Тест")
+
+    def run_concurrently(self, func, count=4):
+        """Вызывает flight.do(func) из count потоков, пока первый вызов не завершен"""
+        results = []
+        errors = []
+
+        def call():
+            try:
+                results.append(self.flight.do("key", func))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads, results, errors
+
+    def wait_for_callers(self, count):
+        """Ждет, пока все count вызовов войдут в do"""
+        while True:
+            snapshot = self.flight.snapshot()
+            if snapshot["executed"] + snapshot["coalesced"] >= count:
+                return
+            time.sleep(0.001)
+
+    def test_concurrent_calls_share_one_execution(self):
+        release = threading.Event()
+        calls = []
+
+        def func():
+            calls.append(1)
+            release.wait(5)
+            return "report"
+
+        threads, results, errors = self.run_concurrently(func)
+        self.wait_for_callers(len(threads))
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual((len(calls), results, errors), (1, ["report"] * 4, []))
+        self.assertEqual(self.flight.snapshot(), {"in_flight": 0, "executed": 1, "coalesced": 3})
+
+    def test_error_reaches_every_caller(self):
+        release = threading.Event()
+
+        def func():
+            release.wait(5)
+            raise ValueError("нет данных")
+
+        threads, results, errors = self.run_concurrently(func, count=2)
+        self.wait_for_callers(len(threads))
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(results, [])
+        self.assertEqual([str(error) for error in errors], ["нет данных"] * 2)
+
+    def test_key_is_released_after_completion(self):
+        self.assertEqual(self.flight.do("key", lambda: 1), 1)
+        self.assertEqual(self.flight.do("key", lambda: 2), 2)
+
+    def test_async_calls_share_one_task(self):
+        calls = []
+
+        async def func():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "report"
+
+        async def main():
+            return await asyncio.gather(*(self.flight.do_async("key", func) for _ in range(3)))
+
+        self.assertEqual(asyncio.run(main()), ["report"] * 3)
+        self.assertEqual(len(calls), 1)
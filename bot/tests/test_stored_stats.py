@@ -0,0 +1,43 @@
+import datetime
+
+from django.test import TestCase
+
+from bot.models import AvitoAccount, AvitoAccountDailyStats
+from bot.stored_stats import day_windows, stored_period
+
+
+class DayWindowsTests(TestCase):
+
+    def test_splits_gaps_and_long_runs(self):
+        day = datetime.date(2026, 10, 1)
+        days = [day, day + datetime.timedelta(days=1), day + datetime.timedelta(days=2), day + datetime.timedelta(days=5)]
+        self.assertEqual(day_windows(days, 2), [
+            (day, day + datetime.timedelta(days=1)),
+            (day + datetime.timedelta(days=2), day + datetime.timedelta(days=2)),
+            (day + datetime.timedelta(days=5), day + datetime.timedelta(days=5)),
+        ])
+
+
+class StoredPeriodTests(TestCase):
+
+    def setUp(self):
+        self.account = AvitoAccount.objects.create(name="Тест", client_id="id", client_secret="secret", avito_user_id=42)
+        self.first_day = datetime.date(2026, 10, 1)
+        self.last_day = datetime.date(2026, 10, 3)
+
+    def store(self, day, complete, **fields):
+        AvitoAccountDailyStats.objects.create(avito_account=self.account, date=day, complete=complete, **fields)
+
+    def test_only_complete_rows_are_used(self):
+        self.store(self.first_day, True, total_calls=3, views=10)
+        self.store(self.first_day + datetime.timedelta(days=1), False, total_calls=0, views=0)
+
+        stored = stored_period(42, self.first_day, self.last_day)
+
+        self.assertEqual(stored.days, [self.first_day])
+        self.assertEqual(stored.totals["total_calls"], 3)
+        self.assertEqual(stored.missing, [(self.first_day + datetime.timedelta(days=1), self.last_day)])
+
+    def test_no_complete_rows(self):
+        self.store(self.first_day, False)
+        self.assertIsNone(stored_period(42, self.first_day, self.last_day))
@@ -0,0 +1,140 @@
+import datetime
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from bot.avito_client import walk_pages
+from bot.chat_index import ChatsPages
+from bot.models import AvitoChat, AvitoSyncState
+from bot.sync_state import begin_paged_sync, extend_synced_range, get_synced_range, missing_ranges, sync_plan
+
+BASE = datetime.datetime(2026, 10, 1, tzinfo=datetime.timezone.utc)
+
+
+def at(hour):
+    return BASE + datetime.timedelta(hours=hour)
+
+
+def chat(index, hours=0):
+    """Чат с последним сообщением index минут назад от BASE + hours"""
+    return {'id': index, 'lastMessageTime': int((BASE + datetime.timedelta(hours=hours, minutes=-index)).timestamp())}
+
+
+class ChatsApi:
+    """Список чатов API: страницы по offset, ошибка на странице fail_at"""
+
+    def __init__(self, chats):
+        self.chats = chats
+        self.fail_at = None
+        self.offsets = []
+
+    def request(self, method, url, params=None, **kwargs):
+        offset = params['offset']
+        self.offsets.append(offset)
+        if offset == self.fail_at:
+            raise ConnectionError("нет соединения")
+        response = mock.Mock()
+        response.json.return_value = {'chats': self.chats[offset:offset + 100]}
+        return response
+
+
+@override_settings(AVITO_CHATS_MAX_PAGES=10)
+class PagedSyncTests(TestCase):
+
+    def setUp(self):
+        self.api = ChatsApi([chat(index) for index in range(250)])
+        patcher = mock.patch("bot.avito_client.get_avito_client", return_value=self.api)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sync(self):
+        return walk_pages(ChatsPages("token", 1))
+
+    def state(self):
+        return AvitoSyncState.objects.values_list('synced_to', 'resume_offset', 'resume_mark').get(source='chats')
+
+    def test_complete_pass_moves_mark_to_newest(self):
+        self.assertEqual(self.sync(), 250)
+        self.assertEqual(self.state(), (BASE, 0, None))
+
+    def test_interrupted_pass_resumes_from_offset(self):
+        self.api.fail_at = 200
+        with self.assertRaises(ConnectionError):
+            self.sync()
+        self.assertEqual(self.state(), (None, 200, BASE))
+
+        self.api.fail_at = None
+        self.api.offsets.clear()
+        self.assertEqual(self.sync(), 50)
+        self.assertEqual(self.api.offsets, [200])
+        self.assertEqual(self.state(), (BASE, 0, None))
+        self.assertEqual(AvitoChat.objects.count(), 250)
+
+    def test_next_pass_stops_at_mark(self):
+        self.sync()
+        self.api.chats.insert(0, chat(1000, hours=20))
+        self.api.offsets.clear()
+
+        # Новый чат и чат на самой отметке: отметка включительная
+        self.assertEqual(self.sync(), 2)
+        self.assertEqual(self.api.offsets, [0])
+        self.assertEqual(begin_paged_sync(1, 'chats').mark, BASE + datetime.timedelta(hours=20, minutes=-1000))
+
+    @override_settings(AVITO_CHATS_MAX_PAGES=1)
+    def test_page_limit_leaves_pass_unfinished(self):
+        self.assertEqual(self.sync(), 100)
+        self.assertEqual(self.state(), (None, 100, BASE))
+
+
+class MissingRangesTests(TestCase):
+
+    def test_nothing_synced(self):
+        self.assertEqual(missing_ranges(None, None, at(0), at(5)), [(at(0), at(5))])
+
+    def test_inside_synced_range(self):
+        self.assertEqual(missing_ranges(at(0), at(10), at(2), at(5)), [])
+
+    def test_both_sides_missing(self):
+        self.assertEqual(
+            missing_ranges(at(2), at(5), at(0), at(10)),
+            [(at(0), at(2)), (at(5), at(10))],
+        )
+
+    def test_disjoint_range_is_loaded_whole(self):
+        self.assertEqual(missing_ranges(at(0), at(2), at(5), at(10)), [(at(5), at(10))])
+
+
+@override_settings(AVITO_SYNC_LAG=600)
+class ExtendSyncedRangeTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch("bot.sync_state.timezone.now", return_value=at(100))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def synced(self):
+        return get_synced_range(1, 'calls')
+
+    def test_overlapping_ranges_merge(self):
+        extend_synced_range(1, 'calls', at(5), at(10))
+        extend_synced_range(1, 'calls', at(0), at(5))
+        extend_synced_range(1, 'calls', at(8), at(20))
+        self.assertEqual(self.synced(), (at(0), at(20)))
+
+    def test_recent_lag_is_not_marked_synced(self):
+        extend_synced_range(1, 'calls', at(90), at(100))
+        self.assertEqual(self.synced(), (at(90), at(100) - datetime.timedelta(seconds=600)))
+
+    def test_disjoint_ranges_keep_the_newer(self):
+        extend_synced_range(1, 'calls', at(50), at(60))
+        extend_synced_range(1, 'calls', at(0), at(10))
+        self.assertEqual(self.synced(), (at(50), at(60)))
+        extend_synced_range(1, 'calls', at(70), at(80))
+        self.assertEqual(self.synced(), (at(70), at(80)))
+
+    def test_plan_skips_synced_part_and_future(self):
+        extend_synced_range(1, 'calls', at(0), at(50))
+        self.assertEqual(
+            sync_plan(1, 'calls', at(10).strftime("%Y-%m-%dT%H:%M:%SZ"), at(200).strftime("%Y-%m-%dT%H:%M:%SZ")),
+            [(at(50), at(100))],
+        )
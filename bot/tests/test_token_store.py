@@ -0,0 +1,49 @@
+import datetime
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from bot.models import AvitoAccount
+from bot.token_store import TokenStore
+
+
+class TokenStoreTests(TestCase):
+
+    def setUp(self):
+        self.account = AvitoAccount.objects.create(name="Тест", client_id="id", client_secret="secret")
+        self.store = TokenStore(refresh_margin=60)
+
+    def stored_token(self):
+        self.account.refresh_from_db()
+        return self.account.access_token
+
+    def test_new_token_is_saved(self):
+        with mock.patch("bot.token_store.request_access_token", return_value=("new", 3600)) as request:
+            self.assertEqual(self.store.get_token("id", "secret"), "new")
+            self.assertEqual(self.store.get_token("id", "secret"), "new")
+        self.assertEqual(request.call_count, 1)
+        self.assertEqual(self.stored_token(), "new")
+
+    def test_token_saved_by_another_process_wins(self):
+        def other_process_refreshes(client_id, client_secret):
+            AvitoAccount.objects.filter(id=self.account.id).update(
+                access_token="other", access_token_expires_at=timezone.now() + datetime.timedelta(hours=1)
+            )
+            return "mine", 3600
+
+        with mock.patch("bot.token_store.request_access_token", side_effect=other_process_refreshes):
+            self.assertEqual(self.store.get_token("id", "secret"), "other")
+        self.assertEqual(self.stored_token(), "other")
+
+    def test_second_rejection_keeps_renewed_token(self):
+        with mock.patch("bot.token_store.request_access_token", side_effect=[("old", 3600), ("renewed", 3600)]) as request:
+            self.store.get_token("id", "secret")
+            self.assertEqual(self.store.renew_rejected("old"), "renewed")
+            # Второй ответ 401 на тот же токен пришел после обновления
+            self.assertEqual(self.store.renew_rejected("old"), "renewed")
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(self.stored_token(), "renewed")
+
+    def test_unknown_token_is_not_renewed(self):
+        self.assertIsNone(self.store.renew_rejected("foreign"))
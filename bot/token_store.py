@@ -0,0 +1,182 @@
+import datetime
+import logging
+import threading
+
+from django.conf import settings
+from django.utils import timezone
+
+from bot.avito_client import get_avito_client
+from bot.models import AvitoAccount
+
+logger = logging.getLogger(__name__)
+
+TOKEN_URL = 'https://api.avito.ru/token'
+
+
+def request_access_token(client_id, client_secret):
+    """
+    Запрашивает новый токен у API Авито
+
+    Returns:
+        tuple: (access_token, expires_in в секундах) или (None, 0) в случае ошибки
+    """
+    auth_data = {
+        'grant_type': 'client_credentials',
+        'client_id': client_id,
+        'client_secret': client_secret
+    }
+
+    try:
+        # Повтор запроса токена безопасен: он лишь выдает новый токен
+        response = get_avito_client().post(TOKEN_URL, data=auth_data, idempotent=True)
+        response.raise_for_status()
+        result = response.json()
+    except Exception as e:
+        logger.error(f"Ошибка при получении токена доступа для {client_id}: {e}")
+        return None, 0
+
+    return result.get('access_token'), int(result.get('expires_in') or 0)
+
+
+class TokenStore:
+    """
+    Кэш OAuth-токенов Авито по client_id.
+
+    Токены хранятся в памяти процесса и в полях AvitoAccount, поэтому cron и
+    воркеры вебхука используют один токен. Обновление выполняется заранее, за
+    refresh_margin секунд до истечения. Параллельные обновления одного токена
+    в процессе сериализуются блокировкой. Между процессами токен записывается
+    сравнением с прочитанным (compare-and-set): процесс, который обновил токен
+    позже другого, берет уже сохраненный токен. Запрос к API выполняется вне
+    транзакции, чтобы не держать блокировку строки на время запроса.
+    """
+
+    def __init__(self, refresh_margin=None):
+        self.refresh_margin = datetime.timedelta(
+            seconds=refresh_margin if refresh_margin is not None else settings.AVITO_TOKEN_REFRESH_MARGIN
+        )
+        self._tokens = {}
+        # Последний отклоненный токен клиента: (токен, client_secret)
+        self._rejected = {}
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock_for(self, client_id):
+        with self._locks_guard:
+            return self._locks.setdefault(client_id, threading.Lock())
+
+    def _is_fresh(self, expires_at):
+        return expires_at is not None and expires_at - self.refresh_margin > timezone.now()
+
+    def _from_memory(self, client_id, client_secret):
+        cached = self._tokens.get(client_id)
+        if cached:
+            token, expires_at, secret = cached
+            if secret == client_secret and self._is_fresh(expires_at):
+                return token
+        return None
+
+    def _stored(self, client_id, client_secret):
+        """Сохраненные токен и время его истечения или None, если аккаунта нет"""
+        return AvitoAccount.objects.filter(client_id=client_id, client_secret=client_secret).order_by('id').values_list(
+            'access_token', 'access_token_expires_at'
+        ).first()
+
+    def _use_stored(self, client_id, client_secret, stored):
+        token, expires_at = stored
+        self._tokens[client_id] = (token, expires_at, client_secret)
+        return token
+
+    def get_token(self, client_id, client_secret):
+        """Возвращает действующий токен, при необходимости обновляя его"""
+        token = self._from_memory(client_id, client_secret)
+        if token:
+            return token
+
+        with self._lock_for(client_id):
+            # Пока ждали блокировку, токен мог обновить другой поток
+            token = self._from_memory(client_id, client_secret)
+            if token:
+                return token
+
+            stored = self._stored(client_id, client_secret)
+            if stored and stored[0] and self._is_fresh(stored[1]):
+                logger.info(f"Использование сохраненного токена для {client_id}")
+                return self._use_stored(client_id, client_secret, stored)
+
+            token, expires_in = request_access_token(client_id, client_secret)
+            if not token:
+                return None
+            expires_at = timezone.now() + datetime.timedelta(seconds=expires_in)
+
+            if stored:
+                # Записываем, только если сохраненный токен не сменился, пока шел запрос
+                updated = AvitoAccount.objects.filter(
+                    client_id=client_id, client_secret=client_secret, access_token=stored[0]
+                ).update(access_token=token, access_token_expires_at=expires_at)
+                if not updated:
+                    current = self._stored(client_id, client_secret)
+                    if current and current[0] and self._is_fresh(current[1]):
+                        logger.info(f"Токен для {client_id} уже обновлен другим процессом")
+                        return self._use_stored(client_id, client_secret, current)
+
+            self._tokens[client_id] = (token, expires_at, client_secret)
+            logger.info(f"Получен новый токен для {client_id}, действует до {expires_at}")
+            return token
+
+    def client_id_for(self, token):
+        """client_id, которому выдан токен, если токен есть в памяти процесса"""
+        for client_id, (cached_token, expires_at, secret) in list(self._tokens.items()):
+            if cached_token == token:
+                return client_id
+        return None
+
+    def invalidate(self, client_id, token=None):
+        """
+        Сбрасывает сохраненный токен, например после ответа 401
+
+        Если передан token, сбрасывается только он: токен, уже полученный
+        взамен другим потоком или процессом, остается.
+        """
+        cached = self._tokens.get(client_id)
+        if cached and (token is None or cached[0] == token):
+            self._tokens.pop(client_id, None)
+        accounts = AvitoAccount.objects.filter(client_id=client_id)
+        if token is not None:
+            accounts = accounts.filter(access_token=token)
+        accounts.update(access_token=None, access_token_expires_at=None)
+
+    def renew_rejected(self, token):
+        """
+        Новый токен взамен отклоненного API (ответ 401)
+
+        Одновременные ответы 401 на один токен сбрасывают его один раз,
+        остальные получают уже обновленный токен.
+
+        Returns:
+            str: Новый токен или None, если токен выдан не в этом процессе или обновить его не удалось
+        """
+        owner = None
+        for client_id, (cached_token, expires_at, secret) in list(self._tokens.items()):
+            if cached_token == token:
+                owner = client_id, secret
+                break
+        else:
+            for client_id, (rejected_token, secret) in list(self._rejected.items()):
+                if rejected_token == token:
+                    owner = client_id, secret
+                    break
+        if owner is None:
+            return None
+
+        client_id, secret = owner
+        with self._lock_for(client_id):
+            cached = self._tokens.get(client_id)
+            if cached and cached[0] == token:
+                logger.warning(f"Токен {client_id} отклонен API, запрашиваем новый")
+                self._rejected[client_id] = (token, secret)
+                self.invalidate(client_id, token)
+        return self.get_token(client_id, secret)
+
+
+token_store = TokenStore()
@@ -11,6 +11,11 @@ from telebot.apihelper import ApiTelegramException
 from telebot.types import Update
 
 from bot import bot, logger
+from bot.avito_client import get_avito_client
+from bot.cache import avito_cache
+from bot.circuit_breaker import circuit_breakers
+from bot.rate_limiter import rate_limiter
+from bot.single_flight import statistics_flight
 import telebot
 
 
@@ -24,7 +29,14 @@ def set_webhook(request: HttpRequest) -> JsonResponse:
 
 @require_GET
 def status(request: HttpRequest) -> JsonResponse:
-    return JsonResponse({"message": "OK"}, status=200)
+    return JsonResponse({
+        "message": "OK",
+        "avito_connections": get_avito_client().get_connection_stats(),
+        "avito_rate_limits": rate_limiter.summary(),
+        "avito_circuit_breakers": circuit_breakers.snapshot(),
+        "avito_single_flight": statistics_flight.snapshot(),
+        "avito_cache": avito_cache.snapshot(),
+    }, status=200)
 
 
 @csrf_exempt
@@ -105,6 +117,12 @@ def historical_stats_wrapper(call):
             elif period == "30d":
                 days = 30
                 period_name = "30 дней"
+            elif period == "90d":
+                days = 90
+                period_name = "90 дней"
+            elif period == "365d":
+                days = 365
+                period_name = "365 дней"
             else:
                 days = 7
                 period_name = "7 дней"
@@ -194,6 +212,14 @@ def stats_command(message):
                 text="За 30 дней", 
                 callback_data=f"stats_30d_acc_{account_id}"
             ))
+            markup.add(telebot.types.InlineKeyboardButton(
+                text="За 90 дней", 
+                callback_data=f"stats_90d_acc_{account_id}"
+            ))
+            markup.add(telebot.types.InlineKeyboardButton(
+                text="За 365 дней", 
+                callback_data=f"stats_365d_acc_{account_id}"
+            ))
             
             bot.send_message(
                 chat_id=chat_id,
@@ -250,6 +276,14 @@ def select_account_for_stats(call):
                 text="За 30 дней", 
                 callback_data=f"stats_30d_acc_{account_id}"
             ))
+            markup.add(telebot.types.InlineKeyboardButton(
+                text="За 90 дней", 
+                callback_data=f"stats_90d_acc_{account_id}"
+            ))
+            markup.add(telebot.types.InlineKeyboardButton(
+                text="За 365 дней", 
+                callback_data=f"stats_365d_acc_{account_id}"
+            ))
             
             bot.edit_message_text(
                 chat_id=chat_id,
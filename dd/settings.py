@@ -29,6 +29,62 @@ OWNER_ID = os.getenv('OWNER_ID')
 BOT_NAME = os.getenv("BOT_NAME")
 HOOK = os.getenv('HOOK')
 
+# HTTP-клиент API Авито: размер пула keep-alive соединений и таймауты (секунды)
+AVITO_POOL_CONNECTIONS = int(os.getenv('AVITO_POOL_CONNECTIONS', 4))
+AVITO_POOL_MAXSIZE = int(os.getenv('AVITO_POOL_MAXSIZE', 20))
+AVITO_CONNECT_TIMEOUT = float(os.getenv('AVITO_CONNECT_TIMEOUT', 5))
+AVITO_READ_TIMEOUT = float(os.getenv('AVITO_READ_TIMEOUT', 30))
+# За сколько секунд до истечения обновлять OAuth-токен Авито
+AVITO_TOKEN_REFRESH_MARGIN = int(os.getenv('AVITO_TOKEN_REFRESH_MARGIN', 300))
+# Параллельный сбор статистики: число потоков и таймаут одного сборщика (секунды)
+AVITO_COLLECTOR_WORKERS = int(os.getenv('AVITO_COLLECTOR_WORKERS', 8))
+AVITO_COLLECTOR_TIMEOUT = float(os.getenv('AVITO_COLLECTOR_TIMEOUT', 60))
+# Лимиты запросов к API Авито на аккаунт: группа методов -> (запросов в секунду, размер пачки)
+AVITO_RATE_LIMITS = {
+    'stats': (1, 3),
+    'messenger': (5, 10),
+    'calltracking': (2, 5),
+    'cpa': (2, 5),
+    'core': (10, 20),
+}
+# Сколько секунд запрос может ждать лимит и пауза после 429 без Retry-After
+AVITO_RATE_LIMIT_MAX_WAIT = float(os.getenv('AVITO_RATE_LIMIT_MAX_WAIT', 30))
+AVITO_RATE_LIMIT_PENALTY = float(os.getenv('AVITO_RATE_LIMIT_PENALTY', 30))
+# Повторы запросов к API Авито: число попыток, базовая и максимальная задержка (секунды)
+AVITO_RETRY_ATTEMPTS = int(os.getenv('AVITO_RETRY_ATTEMPTS', 4))
+AVITO_RETRY_BACKOFF = float(os.getenv('AVITO_RETRY_BACKOFF', 0.5))
+AVITO_RETRY_MAX_BACKOFF = float(os.getenv('AVITO_RETRY_MAX_BACKOFF', 10))
+# Сколько секунд отчет может потратить на повторы запросов
+AVITO_REPORT_TIME_BUDGET = float(os.getenv('AVITO_REPORT_TIME_BUDGET', 45))
+# Предохранитель групп методов API Авито: ошибок подряд до отключения и пауза до пробного запроса (секунды)
+AVITO_BREAKER_FAILURES = int(os.getenv('AVITO_BREAKER_FAILURES', 5))
+AVITO_BREAKER_RESET_TIMEOUT = float(os.getenv('AVITO_BREAKER_RESET_TIMEOUT', 60))
+# Проверка XL продвижения: одновременных запросов и время жизни результата по объявлению (секунды)
+AVITO_PROMOTION_WORKERS = int(os.getenv('AVITO_PROMOTION_WORKERS', 8))
+AVITO_ITEM_SERVICES_TTL = int(os.getenv('AVITO_ITEM_SERVICES_TTL', 6 * 60 * 60))
+# Список объявлений: размер страницы и сколько следующих страниц запрашивать заранее
+AVITO_ITEMS_PAGE_SIZE = int(os.getenv('AVITO_ITEMS_PAGE_SIZE', 100))
+AVITO_ITEMS_PREFETCH_PAGES = int(os.getenv('AVITO_ITEMS_PREFETCH_PAGES', 1))
+# Сколько последних секунд загрузки звонков и операций запрашивать повторно: API добавляет записи с задержкой
+AVITO_SYNC_LAG = int(os.getenv('AVITO_SYNC_LAG', 10 * 60))
+# Сколько страниц по 100 чатов просматривать за одну синхронизацию индекса чатов (остальные догрузит следующая)
+AVITO_CHATS_MAX_PAGES = int(os.getenv('AVITO_CHATS_MAX_PAGES', 10))
+# Заполнение исторической статистики: сколько дней запрашивать одним запросом с группировкой по дням
+AVITO_BACKFILL_CHUNK_DAYS = int(os.getenv('AVITO_BACKFILL_CHUNK_DAYS', 31))
+# Сколько дней хранится дневная статистика (история /stats доступна до 365 дней)
+AVITO_DAILY_STATS_RETENTION_DAYS = int(os.getenv('AVITO_DAILY_STATS_RETENTION_DAYS', 400))
+# Кэш данных API Авито: хранилище (local, django или file), ограничения кэша в памяти процесса,
+# псевдоним кэша Django и каталог файлового кэша
+AVITO_CACHE_BACKEND = os.getenv('AVITO_CACHE_BACKEND', 'local')
+AVITO_CACHE_MAX_ENTRIES = int(os.getenv('AVITO_CACHE_MAX_ENTRIES', 10000))
+AVITO_CACHE_MAX_BYTES = int(os.getenv('AVITO_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+AVITO_CACHE_DJANGO_ALIAS = os.getenv('AVITO_CACHE_DJANGO_ALIAS', 'default')
+AVITO_CACHE_DIR = os.getenv('AVITO_CACHE_DIR', str(BASE_DIR / 'avito_cache'))
+# Сколько секунд отчет считается свежим (статистика профиля, звонки и чаты обновляются раз в 15-60 минут)
+AVITO_REPORT_TTL = int(os.getenv('AVITO_REPORT_TTL', 15 * 60))
+# Сколько секунд после устаревания отчет по кнопке можно показать из кэша, обновляя его в фоне
+AVITO_REPORT_STALE_GRACE = int(os.getenv('AVITO_REPORT_STALE_GRACE', 2 * 60 * 60))
+
 # Application definition
 BOT_COMMANDS = [
     BotCommand("start", "Меню"),
@@ -80,6 +136,8 @@ if LOCAL == 'True':
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # Тестовая база создается по моделям: миграции отстают от них
+            'TEST': {'MIGRATE': False},
         }
     }
 else: